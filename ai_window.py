@@ -4,24 +4,37 @@ import signal
 import json
 import socket
 import subprocess
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import shlex
 
 # 修復編碼問題，確保 stdout 和 stderr 使用 UTF-8
 if hasattr(sys.stdout, 'reconfigure'):
 	sys.stdout.reconfigure(encoding='utf-8')
 	sys.stderr.reconfigure(encoding='utf-8')
 
-from google import genai
-from google.genai import types
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QObject, QBuffer, QIODevice, QTimer
+from PyQt6.QtCore import Qt, QThread, pyqtSignal, QObject, QBuffer, QIODevice, QTimer, QFileSystemWatcher, QProcess
 from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, 
-							 QLabel, QLineEdit, QScrollArea, QFrame, QPushButton)
-from PyQt6.QtMultimedia import QAudioSource, QAudioSink, QMediaDevices, QAudioFormat, QAudio
+							 QLabel, QLineEdit, QScrollArea, QFrame, QPushButton, QPlainTextEdit)
+from PyQt6.QtGui import QTextCursor, QTextCharFormat, QColor, QFont
 import struct
 import base64
 import asyncio
-import queue
 import random
+import time
+import math
+import unicodedata
+import re
+import urllib.parse
+import urllib.request
+import urllib.error
+import hashlib
+import codecs
+import threading
+import itertools
+import heapq
+import collections
+import concurrent.futures
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import nest_asyncio
 nest_asyncio.apply()
 
@@ -34,18 +47,271 @@ if not API_KEY.isascii():
 	print("錯誤：GEMINI_API_KEY 必須是有效的 ASCII 字符串")
 	sys.exit(1)
 
-client = genai.Client(api_key=API_KEY, http_options={'api_version': 'v1beta'})
-IPC_SOCKET = "/tmp/mpvsocket"
+IPC_SOCKET = os.environ.get("AIWINDOW_MPV_SOCKET", "/tmp/mpvsocket")
+# AIWindow 自己啟動並監看 mpv；已有 mpv 在 IPC_SOCKET 上回應時直接沿用
+MPV_COMMAND = shlex.split(os.environ.get("AIWINDOW_MPV_COMMAND", f"mpv --idle --fs --input-ipc-server={IPC_SOCKET}"))
+MPV_READY_TIMEOUT = 10 # 啟動後多久內沒完成 IPC 握手就視為卡住並重啟
+MPV_RESTART_BACKOFF = (0.2, 30) # mpv 異常結束後重啟的等待秒數 (初始值, 上限)，每次加倍
+LIVE_WARM_SECONDS = 300 # 對話結束後 (或泡泡顯示時) 保留 Gemini Live 連線的秒數
+AUDIO_FRAME_MS = 40 # 上行音訊每個 frame 的長度 (例如 20/40/100 ms)
+PLAYLIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "play.lst")
+SEARCH_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_cache.json")
+STREAM_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stream_cache.json")
+MEDIA_CACHE_DIR = os.environ.get("AIWINDOW_MEDIA_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "media_cache")) # 收藏影片的本機快取
+MEDIA_CACHE_BYTES = int(float(os.environ.get("AIWINDOW_MEDIA_CACHE_GB", "20")) * (1 << 30)) # 快取容量上限，0 為停用
+MEDIA_CACHE_DOWNLOADS = 1 # 同時下載的影片數 (避免佔滿上行頻寬)
+RESOLVE_TIMEOUT = 20 # 單次 YouTube 搜尋/解析的逾時秒數
+YTDLP_SOCKET_TIMEOUT = 10 # yt-dlp 每次網路讀寫的逾時秒數，卡住的解析不會永遠佔住 Resolver worker
+SCENE_MATCH_THRESHOLD = 0.6 # 換景關鍵字被收藏標題涵蓋的比例 (0~1) 達到此值就直接播放收藏，不搜尋 YouTube
+SCENE_INDEX_DELAY = 2000 # 收藏標題解析好後，最多等幾毫秒再一次重建場景索引 (期間的更新合併處理)
+STREAM_FORMAT = "bestvideo[height<=1080][vcodec^=avc]+bestaudio/best[height<=1080]"
+VAD_EXPLICIT_ACTIVITY = False # True: 關閉 Live API 的自動語音偵測，改由本地 VAD 送 activity start/end
+LAN_PORT = 9997 # 換行分隔 JSON 指令
+HTTP_PORT = 9998 # HTTP 指令 (send2mpv) 與 /metrics
+COMMAND_ACK_TIMEOUT = 5 # 遠端指令等待 mpv 回覆的秒數
+PLAYERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "players.json") # 其他 mpv / AI Window 節點與群組
+PLAYER_CONNECT_TIMEOUT = 2 # 連線其他 AI Window 節點的逾時秒數
+MAX_REQUEST_BYTES = 1 << 20 # 單一指令訊息 / HTTP 標頭與內容的上限
+LIVE_RECORD_PATH = os.environ.get("AIWINDOW_LIVE_RECORD") # 把 Live 對話錄製到此檔案
+LIVE_REPLAY_PATH = os.environ.get("AIWINDOW_LIVE_REPLAY") # 以錄製檔取代 Gemini Live 連線
+LIVE_REPLAY_SPEED = float(os.environ.get("AIWINDOW_LIVE_REPLAY_SPEED", "1")) # 重播倍速，0 為不等待
+METRICS_SAMPLES = 500 # 每個延遲直方圖保留的最近樣本數
+TRANSCRIPT_FPS = 30 # 逐字稿最多每秒重繪幾次 (串流片段累積後一次附加)
+TRANSCRIPT_MAX_BLOCKS = 200 # 逐字稿保留的行數上限
+STARTUP_PROBE = os.environ.get("AIWINDOW_STARTUP_PROBE") == "1" # 印出啟動各階段後自動結束 (benchmarks/bench_startup.py)
+
+# google.genai (import 約 0.6 秒) 與 PyQt6.QtMultimedia 都在第一次需要時才載入，
+# 視窗可以先顯示；genai 在 LiveSession thread 載入，音訊裝置在第一次繪製視窗後才開啟
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+	"""第一次呼叫時 import google.genai 並建立共用的 client。"""
+	global _client
+	with _client_lock:
+		if _client is None:
+			from google import genai
+			_client = genai.Client(api_key=API_KEY, http_options={'api_version': 'v1beta'})
+		return _client
+
+class LatencyMetrics:
+	"""各階段的時間戳記與延遲統計 (thread-safe)。
+
+	mark() 記下某個階段最近一次發生的時間，observe()/span() 把延遲放進以名稱
+	與 labels 區分的直方圖 (保留最近 METRICS_SAMPLES 筆，計算 p50/p95)。
+	其他元件的統計 (jitter buffer、搜尋快取、VAD) 以 add_gauges() 註冊，
+	在輸出時才讀取。GET /metrics 以 Prometheus 文字或 JSON 輸出。
+	"""
+	QUANTILES = (0.5, 0.95)
+
+	def __init__(self, max_samples=METRICS_SAMPLES, clock=time.monotonic):
+		self.clock = clock
+		self.max_samples = max_samples
+		self.lock = threading.Lock()
+		self.marks = {}      # 階段名稱 -> 最近一次的時間
+		self.histograms = {} # (name, labels) -> {"samples", "count", "sum"}
+		self.gauges = {}     # prefix -> 回傳 dict 的函式
+
+	def mark(self, name, t=None):
+		with self.lock:
+			self.marks[name] = self.clock() if t is None else t
+
+	def last(self, name):
+		with self.lock:
+			return self.marks.get(name)
+
+	def clear(self, name):
+		with self.lock:
+			return self.marks.pop(name, None)
+
+	def observe(self, name, seconds, **labels):
+		key = (name, tuple(sorted(labels.items())))
+		with self.lock:
+			h = self.histograms.get(key)
+			if h is None:
+				h = self.histograms[key] = {"samples": collections.deque(maxlen=self.max_samples), "count": 0, "sum": 0.0}
+			h["samples"].append(seconds)
+			h["count"] += 1
+			h["sum"] += seconds
+
+	def span(self, name, start_mark, end=None, **labels):
+		"""記錄從 start_mark 到 end (預設現在) 的延遲；start_mark 不存在時回傳 None。"""
+		start = self.last(start_mark)
+		if start is None:
+			return None
+		seconds = (self.clock() if end is None else end) - start
+		self.observe(name, seconds, **labels)
+		return seconds
+
+	def quantile(self, name, q, **labels):
+		with self.lock:
+			h = self.histograms.get((name, tuple(sorted(labels.items()))))
+			samples = sorted(h["samples"]) if h else []
+		if not samples:
+			return None
+		return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+	def add_gauges(self, prefix, provider):
+		self.gauges[prefix] = provider
+
+	def snapshot(self):
+		with self.lock:
+			hists = [(name, labels, sorted(h["samples"]), h["count"], h["sum"]) for (name, labels), h in sorted(self.histograms.items())]
+		histograms = []
+		for name, labels, samples, count, total in hists:
+			entry = {"name": name, "labels": dict(labels), "count": count, "sum": round(total, 6)}
+			for q in self.QUANTILES:
+				entry[f"p{int(q * 100)}"] = samples[min(len(samples) - 1, int(q * len(samples)))] if samples else None
+			entry["max"] = samples[-1] if samples else None
+			histograms.append(entry)
+		gauges = {}
+		for prefix, provider in list(self.gauges.items()):
+			try:
+				for key, value in provider().items():
+					if isinstance(value, (int, float)) and not isinstance(value, bool):
+						gauges[f"{prefix}_{key}"] = value
+			except Exception as e:
+				print(f"Metrics provider {prefix} error: {e}")
+		return {"histograms": histograms, "gauges": gauges}
+
+	def prometheus(self):
+		snap = self.snapshot()
+		lines = []
+		seen = set()
+		for h in snap["histograms"]:
+			name = f"aiwindow_{h['name']}"
+			if name not in seen:
+				seen.add(name)
+				lines.append(f"# TYPE {name} summary")
+			labels = ",".join(f'{k}="{v}"' for k, v in h["labels"].items())
+			for q in self.QUANTILES:
+				value = h[f"p{int(q * 100)}"]
+				if value is not None:
+					qlabels = f'{labels},quantile="{q}"' if labels else f'quantile="{q}"'
+					lines.append(f"{name}{{{qlabels}}} {value:.6f}")
+			suffix = f"{{{labels}}}" if labels else ""
+			lines.append(f"{name}_sum{suffix} {h['sum']:.6f}")
+			lines.append(f"{name}_count{suffix} {h['count']}")
+		for key, value in sorted(snap["gauges"].items()):
+			lines.append(f"# TYPE aiwindow_{key} gauge")
+			lines.append(f"aiwindow_{key} {value}")
+		return "\n".join(lines) + "\n"
+
+metrics = LatencyMetrics()
+
+class AudioFramer:
+	"""把任意大小的 PCM 片段切成固定時長的 frame。
+
+	資料複製進預先配置的 frame buffer，滿了才輸出一個完整 frame；
+	每次 feed 的成本只和輸入長度有關，不會有 bytes 串接的平方成本。
+	"""
+	def __init__(self, frame_bytes):
+		self.frame = bytearray(frame_bytes)
+		self.view = memoryview(self.frame)
+		self.fill = 0
+
+	def feed(self, data):
+		"""回傳這次湊滿的 frame list (可能為空)。"""
+		frames = []
+		src = memoryview(data).cast('B')
+		pos = 0
+		size = len(self.frame)
+		while pos < len(src):
+			n = min(size - self.fill, len(src) - pos)
+			self.view[self.fill:self.fill + n] = src[pos:pos + n]
+			self.fill += n
+			pos += n
+			if self.fill == size:
+				frames.append(bytes(self.frame))
+				self.fill = 0
+		return frames
+
+	def reset(self):
+		self.fill = 0
+
+class VoiceActivityDetector:
+	"""以能量與過零率判斷語音的本地 VAD，靜音 frame 不送上 Gemini。
+
+	偵測到語音時連同前 padding_ms 的 frame 一起送出，語音結束後再延續 hangover_ms；
+	process() 回傳要送出的項目：bytes 為音訊 frame，ACTIVITY_START / ACTIVITY_END
+	標記語音段落的開始與結束。
+	"""
+	ACTIVITY_START = "activity_start"
+	ACTIVITY_END = "activity_end"
+
+	def __init__(self, frame_ms=AUDIO_FRAME_MS, padding_ms=200, hangover_ms=600, margin_db=10.0, min_db=-55.0):
+		self.padding = collections.deque(maxlen=max(1, padding_ms // frame_ms))
+		self.hangover_frames = max(1, hangover_ms // frame_ms)
+		self.margin_db = margin_db
+		self.min_db = min_db
+		self.noise_db = None
+		self.hangover = 0
+		self.active = False
+		self.total_frames = 0
+		self.sent_frames = 0
+
+	def is_speech(self, frame):
+		samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+		if samples.size < 2:
+			return False
+		db = 10.0 * np.log10(float(np.dot(samples, samples)) / samples.size / (32768.0 ** 2) + 1e-12)
+		zcr = np.count_nonzero(np.signbit(samples[1:]) != np.signbit(samples[:-1])) / samples.size
+		if self.noise_db is None:
+			self.noise_db = db
+		threshold = max(self.noise_db + self.margin_db, self.min_db)
+		# 有聲段靠能量；s、f 這類氣音能量低但過零率高
+		speech = db >= threshold or (db >= threshold - self.margin_db / 2 and zcr >= 0.25)
+		# 底噪追蹤：往下立即跟上，往上在靜音時較快、說話時極慢
+		if db < self.noise_db:
+			self.noise_db = db
+		else:
+			self.noise_db += (db - self.noise_db) * (0.002 if speech else 0.05)
+		return speech
+
+	def process(self, frame):
+		self.total_frames += 1
+		out = []
+		if self.is_speech(frame):
+			if not self.active:
+				self.active = True
+				out.append(self.ACTIVITY_START)
+				out.extend(self.padding)
+				self.padding.clear()
+			self.hangover = self.hangover_frames
+			out.append(frame)
+		elif self.active:
+			out.append(frame)
+			self.hangover -= 1
+			if self.hangover <= 0:
+				self.active = False
+				out.append(self.ACTIVITY_END)
+		else:
+			self.padding.append(frame)
+		self.sent_frames += sum(1 for item in out if isinstance(item, bytes))
+		return out
+
+	def suppressed_ratio(self):
+		if self.total_frames == 0:
+			return 0.0
+		return 1.0 - self.sent_frames / self.total_frames
 
 class AudioRecorder(QObject):
-	audio_data_ready = pyqtSignal(bytes)
+	"""以裝置原生格式錄音，轉成 LiveSession 需要的 16kHz mono Int16 固定長度 frame。
 
-	def __init__(self):
+	許多 USB 會議攝影機只提供 44.1/48kHz 立體聲；直接要求 16kHz 會失敗或交給 OS 做
+	低品質轉換，因此改用 preferredFormat() 開啟，再由 AudioConverter 降混與重新取樣。
+	"""
+	audio_data_ready = pyqtSignal(bytes) # 每次一個固定長度 (AUDIO_FRAME_MS) 的 frame
+	MAX_CAPTURE_RATE = 48000 # 高於此取樣率時改要求 48kHz，限制轉換的 CPU 成本
+
+	def __init__(self, frame_ms=AUDIO_FRAME_MS):
 		super().__init__()
+		from PyQt6.QtMultimedia import QAudioSource, QMediaDevices, QAudioFormat
 		self.format = QAudioFormat()
 		self.format.setSampleRate(16000)
 		self.format.setChannelCount(1)
 		self.format.setSampleFormat(QAudioFormat.SampleFormat.Int16)
+		self.framer = AudioFramer(self.format.bytesForDuration(frame_ms * 1000))
 		
 		# Auto-select best device
 		target_device = QMediaDevices.defaultAudioInput()
@@ -65,11 +331,27 @@ class AudioRecorder(QObject):
 		else:
 			print(f"\nDEBUG: Using Audio Input: {target_device.description()}")
 
-		self.source = QAudioSource(target_device, self.format)
+		self.capture_format = self.format
+		self.converter = None
+		if not target_device.isNull():
+			capture = target_device.preferredFormat()
+			if capture.sampleRate() > self.MAX_CAPTURE_RATE:
+				lower = QAudioFormat(capture)
+				lower.setSampleRate(self.MAX_CAPTURE_RATE)
+				if target_device.isFormatSupported(lower):
+					capture = lower
+			if capture.sampleFormat() != QAudioFormat.SampleFormat.Unknown:
+				self.capture_format = capture
+		if (self.capture_format.sampleRate(), self.capture_format.channelCount(), self.capture_format.sampleFormat()) != (16000, 1, QAudioFormat.SampleFormat.Int16):
+			self.converter = AudioConverter(self.capture_format.sampleRate(), self.capture_format.channelCount(), sample_format_name(self.capture_format), 16000, 1, "int16")
+			print(f"\nDEBUG: Capturing {self.capture_format.sampleRate()}Hz {self.capture_format.channelCount()}ch {sample_format_name(self.capture_format)}, converting to 16000Hz 1ch int16")
+
+		self.source = QAudioSource(target_device, self.capture_format)
 		self.io_device = None
 		self.log_timer = 0
 	
 	def start(self):
+		from PyQt6.QtMultimedia import QAudio
 		print("\nDEBUG: Starting AudioRecorder...")
 		self.io_device = self.source.start()
 		if self.source.error() != QAudio.Error.NoError:
@@ -82,6 +364,9 @@ class AudioRecorder(QObject):
 		if self.io_device:
 			self.io_device.readyRead.disconnect(self.read_data)
 		self.io_device = None
+		self.framer.reset()
+		if self.converter:
+			self.converter.reset()
 
 	def read_data(self):
 		if self.io_device:
@@ -90,11 +375,343 @@ class AudioRecorder(QObject):
 				self.log_timer += 1
 #                if self.log_timer % 20 == 0: # Log every ~20 chunks (approx 2 sec)
 #                    print(f"\nDEBUG: Audio capturing... ({data.size()} bytes)")
-				self.audio_data_ready.emit(data.data())
+				pcm = data.data()
+				if self.converter:
+					pcm = self.converter.process(pcm)
+				for frame in self.framer.feed(pcm):
+					self.audio_data_ready.emit(frame)
+
+class RingBuffer:
+	"""固定容量的 byte 環形緩衝區。
+
+	read_pos / write_pos 是單調遞增的位元組計數，實際位置取 capacity 的餘數；
+	寫入直接複製進預先配置好的 bytearray，不會搬動已緩衝的資料。
+	單一 producer (write) 與單一 consumer (read/skip) 可在不同 thread 無鎖使用：
+	write 先複製資料才前進 write_pos，read 只讀 write_pos 之前已寫好的部分。
+	"""
+	def __init__(self, capacity):
+		self.capacity = capacity
+		self.buf = bytearray(capacity)
+		self.view = memoryview(self.buf)
+		self.read_pos = 0
+		self.write_pos = 0
+
+	def __len__(self):
+		return self.write_pos - self.read_pos
+
+	def free(self):
+		return self.capacity - len(self)
+
+	def write(self, data):
+		"""寫入最多 free() 個位元組，回傳實際寫入量。"""
+		src = memoryview(data).cast('B')
+		n = min(len(src), self.free())
+		start = self.write_pos % self.capacity
+		first = min(n, self.capacity - start)
+		self.view[start:start + first] = src[:first]
+		if n > first:
+			self.view[:n - first] = src[first:n]
+		self.write_pos += n
+		return n
+
+	def read(self, n):
+		n = min(n, len(self))
+		start = self.read_pos % self.capacity
+		first = min(n, self.capacity - start)
+		if n > first:
+			data = b"".join((self.view[start:], self.view[:n - first]))
+		else:
+			data = bytes(self.view[start:start + n])
+		self.read_pos += n
+		return data
+
+	def skip(self, n):
+		n = min(n, len(self))
+		self.read_pos += n
+		return n
+
+	def clear(self):
+		self.read_pos = self.write_pos
+
+class JitterBuffer(QIODevice):
+	"""AudioPlayer 用的拉取式 (pull mode) jitter buffer。
+
+	QAudioSink 直接呼叫 readData 取資料，不需要 timer 推送。目標深度依 Gemini
+	音訊片段的到達抖動自動調整：每段發話先累積到目標深度才開始播放，播空後重新累積。
+	片段比發話開頭以來的到達時間表更晚時，或是發話中途播空 (underrun) 時，目標立即拉高到
+	min_target + 遲到量 / 空檔 x MARGIN，之後以 JITTER_HALF_LIFE 緩慢衰減，下一段發話便不再斷音。
+	發話中途播空後只需重新累積 min_target + 空檔 (resume) 就繼續播放，不必等到完整目標深度。
+	underruns / overruns / depth 以計數器公開，方便在首音延遲與斷音之間取捨。
+
+	push / clear 由 LiveSession thread (producer) 直接呼叫，readData 由 sink (consumer)
+	呼叫，兩邊透過 RingBuffer 交換資料，不經過 Qt event queue 也不需要鎖：
+	write_pos 只由 producer 前進，read_pos 只由 consumer 前進。滿了就丟掉新資料；
+	clear 只記下 flush_pos，由 consumer 下一次讀取時跳過。
+	"""
+	SPURT_GAP = 1.0 # 超過此秒數沒有新音訊，視為新的一段發話
+	JITTER_HALF_LIFE = 60.0 # 抖動估計衰減一半所需的秒數
+	MARGIN = 1.5 # 目標深度 = min_target + 觀察到的遲到量 x MARGIN
+
+	def __init__(self, bytes_per_sec, frame_bytes, capacity_sec=5.0, min_target=0.06, max_target=1.0, clock=time.monotonic, parent=None):
+		super().__init__(parent)
+		self.bytes_per_sec = bytes_per_sec
+		self.frame_bytes = frame_bytes
+		self.ring = RingBuffer(self._align(int(bytes_per_sec * capacity_sec)))
+		self.flush_pos = 0 # consumer 讀到此位置之前的資料都要丟掉 (插話)
+		self.clock = clock
+		self.min_target = min_target
+		self.max_target = max_target
+		self.target = min_target
+		self.jitter = 0.0          # 片段遲到時間的峰值估計 (秒)
+		self.jitter_at = None      # 上次更新 jitter 的時間 (衰減用)
+		self.resume = min_target   # 發話中途播空後，重新累積到此深度就繼續播放
+		self.started = False       # 這段發話是否已開始播放
+		self.deadline = None       # 發話開頭 + 已收到的音訊長度：下一個片段準時到達的時間
+		self.last_arrival = None
+		self.starved_at = None
+		self.playing = False
+		self.underruns = 0
+		self.overruns = 0
+		self.dropped_bytes = 0
+		self.interrupts = 0
+		self.flushed_bytes = 0
+
+	def _align(self, n):
+		return n - n % self.frame_bytes
+
+	@property
+	def depth(self):
+		return len(self.ring) / self.bytes_per_sec
+
+	def push(self, data):
+		"""接收一段下行音訊 (producer)，更新抖動估計並寫入 ring buffer。"""
+		now = self.clock()
+		duration = len(data) / self.bytes_per_sec
+		self.decay(now)
+		new_spurt = self.deadline is None or now - self.last_arrival > self.SPURT_GAP
+		if new_spurt:
+			self.deadline = now
+			self.started = False
+		else:
+			# 相對發話開頭的時間表遲到多少，開頭就要多緩衝多少；峰值立即拉高、之後緩慢衰減
+			self.jitter = max(self.jitter, now - self.deadline)
+		self.deadline += duration
+		self.last_arrival = now
+
+		if self.starved_at is not None and not new_spurt:
+			# 發話中途播空：接下來要能撐過同樣長的空檔
+			gap = now - self.starved_at
+			self.underruns += 1
+			self.jitter = max(self.jitter, gap)
+			self.resume = min(self.max_target, self.min_target + gap)
+		self.starved_at = None
+		self.target = min(self.max_target, self.min_target + self.jitter * self.MARGIN)
+
+		was_empty = len(self.ring) == 0
+		written = self.ring.write(data)
+		if written < len(data):
+			# 超過容量 (約 5 秒)：只有 consumer 能丟舊資料，producer 丟掉放不下的新資料
+			self.overruns += 1
+			self.dropped_bytes += len(data) - written
+		if was_empty:
+			# 只在由空轉為有資料時喚醒 sink，不必每個片段都發事件
+			self.readyRead.emit()
+
+	def decay(self, now):
+		if self.jitter_at is not None:
+			self.jitter *= 0.5 ** ((now - self.jitter_at) / self.JITTER_HALF_LIFE)
+		self.jitter_at = now
+
+	def mark_starved(self):
+		"""音效卡已把資料播完 (sink 進入 IdleState)。"""
+		if self.starved_at is None:
+			self.starved_at = self.clock()
+
+	def clear(self):
+		"""丟掉尚未播放的音訊 (使用者插話)，下一段發話重新累積。回傳丟掉的 bytes 數。
+
+		由 producer 呼叫：只記下目前的 write_pos，consumer 下次 readData 時跳過，
+		之後 push 的新音訊不受影響。
+		"""
+		self.flush_pos = self.ring.write_pos
+		dropped = self.flush_pos - self.ring.read_pos
+		self.deadline = None
+		self.started = False
+		self.starved_at = None
+		self.interrupts += 1
+		self.flushed_bytes += dropped
+		return dropped
+
+	def stats(self):
+		return {
+			"depth_ms": round(self.depth * 1000),
+			"target_ms": round(self.target * 1000),
+			"jitter_ms": round(self.jitter * 1000),
+			"underruns": self.underruns,
+			"overruns": self.overruns,
+			"dropped_ms": round(self.dropped_bytes / self.bytes_per_sec * 1000),
+			"interrupts": self.interrupts,
+			"flushed_ms": round(self.flushed_bytes / self.bytes_per_sec * 1000),
+		}
+
+	def isSequential(self):
+		return True
+
+	def bytesAvailable(self):
+		return len(self.ring) + super().bytesAvailable()
+
+	def readData(self, maxlen):
+		now = self.clock()
+		flush_pos = self.flush_pos
+		if flush_pos > self.ring.read_pos:
+			self.ring.skip(flush_pos - self.ring.read_pos)
+			self.playing = False
+		available = len(self.ring)
+		if not self.playing:
+			# 累積到目標深度，或發話已結束 (一段時間沒有新片段) 才開始播放
+			if available == 0:
+				if self.starved_at is None:
+					self.starved_at = now # 發話還沒結束的話，下一個片段抵達時記為 underrun
+				return b""
+			threshold = self.resume if self.started else self.target
+			if available < threshold * self.bytes_per_sec and now - self.last_arrival < threshold:
+				return b""
+			self.playing = True
+			self.started = True
+		data = self.ring.read(self._align(min(maxlen, available)))
+		if len(self.ring) == 0:
+			self.playing = False
+		return data
+
+	def writeData(self, data):
+		return -1
+
+class AudioConverter:
+	"""串流式取樣率 / 聲道 / 取樣格式轉換 (NumPy)。
+
+	以有理數比例 L/M 的 polyphase windowed-sinc 濾波器重新取樣，整段 chunk 一次
+	向量化計算；濾波器歷史與相位跨 chunk 保存，片段邊界不會有雜音。
+	格式以字串表示："uint8"、"int16"、"int32"、"float32"。
+	"""
+	DTYPES = {"uint8": np.uint8, "int16": np.int16, "int32": np.int32, "float32": np.float32}
+	DENSE_PHASES = 8 # L 不超過此值時每個輸入視窗一次算出所有相位
+
+	def __init__(self, in_rate, in_channels, in_format, out_rate, out_channels, out_format, taps=32, kaiser_beta=8.0):
+		self.in_rate = in_rate
+		self.in_channels = in_channels
+		self.in_format = in_format
+		self.out_rate = out_rate
+		self.out_channels = out_channels
+		self.out_format = out_format
+		self.in_frame = np.dtype(self.DTYPES[in_format]).itemsize * in_channels
+		g = math.gcd(in_rate, out_rate)
+		self.up = out_rate // g   # L
+		self.down = in_rate // g  # M
+		self.taps = taps
+		# 重新取樣前先把聲道數降到需要的數量，單聲道升到立體聲則在最後複製
+		self.work_channels = min(in_channels, out_channels)
+		if self.up != self.down:
+			# 原型濾波器在 L 倍取樣率下設計，截止頻率取兩邊 Nyquist 的較小者
+			length = taps * self.up
+			cutoff = 0.5 * min(1.0, self.up / self.down) / self.up * 0.95
+			n = np.arange(length) - (length - 1) / 2
+			h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, kaiser_beta) * self.up
+			# phases[phase, j] = h[phase + (taps - 1 - j) * L]，對應輸入視窗的第 j 個樣本
+			self.phases = h.reshape(taps, self.up)[::-1].T.astype(np.float32).copy()
+		self.reset()
+
+	def reset(self):
+		"""清掉跨 chunk 的狀態 (例如打斷播放之後)。"""
+		self.remainder = b""
+		self.history = np.zeros((self.taps - 1, self.work_channels), dtype=np.float32)
+		self.position = (self.taps - 1) * self.up # 下一個輸出在 (history + chunk) 中的位置，單位 1/L 輸入樣本
+
+	def to_float(self, samples):
+		if self.in_format == "int16":
+			return samples.astype(np.float32) / 32768.0
+		if self.in_format == "int32":
+			return (samples / 2147483648.0).astype(np.float32)
+		if self.in_format == "uint8":
+			return (samples.astype(np.float32) - 128.0) / 128.0
+		return samples.astype(np.float32, copy=False)
+
+	def from_float(self, samples):
+		if self.out_format == "float32":
+			return np.clip(samples, -1.0, 1.0).astype(np.float32)
+		if self.out_format == "int16":
+			return np.clip(np.rint(samples * 32768.0), -32768, 32767).astype(np.int16)
+		if self.out_format == "int32":
+			return np.clip(np.rint(samples.astype(np.float64) * 2147483648.0), -2147483648, 2147483647).astype(np.int32)
+		return np.clip(np.rint(samples * 128.0 + 128.0), 0, 255).astype(np.uint8)
+
+	def resample(self, x):
+		ext = np.concatenate((self.history, x))
+		end = len(ext) * self.up # 可計算的輸出位置上限 (不含)
+		count = max(0, -(-(end - self.position) // self.down))
+		out = np.empty((count, self.work_channels), dtype=np.float32)
+		if count:
+			u = self.position + np.arange(count) * self.down
+			start = u // self.up - (self.taps - 1) # 每個輸出所用輸入視窗的起點
+			if self.up <= self.DENSE_PHASES:
+				# 相位少 (例如 24k -> 48k)：每個視窗一次算出所有相位 (一個 BLAS 矩陣乘法)，再挑出需要的
+				for c in range(self.work_channels):
+					windows = sliding_window_view(ext[:, c], self.taps)
+					if self.down > self.up:
+						# 降取樣 (例如 48k -> 16k 錄音)：每個視窗最多用一次，先挑出需要的視窗再乘
+						out[:, c] = (windows[start] @ self.phases.T)[np.arange(count), u % self.up]
+					else:
+						out[:, c] = (windows @ self.phases.T)[start, u % self.up]
+			else:
+				# 相位多 (例如 24k -> 44.1k)：第 n 個輸出的相位只和 n mod L 有關，補齊成
+				# rows x L 個輸出後同相位排成一組，以一次 batched matmul 計算
+				rows = -(-count // self.up)
+				u = self.position + np.arange(rows * self.up) * self.down
+				start = np.minimum(u // self.up - (self.taps - 1), len(ext) - self.taps)
+				start = start.reshape(rows, self.up).T # (L, rows)
+				coeffs = self.phases[u[:self.up] % self.up][:, :, None] # (L, taps, 1)
+				for c in range(self.work_channels):
+					windows = sliding_window_view(ext[:, c], self.taps)
+					out[:, c] = np.matmul(windows[start], coeffs)[:, :, 0].T.reshape(-1)[:count]
+		consumed = len(ext) - (self.taps - 1)
+		self.history = ext[consumed:]
+		self.position += count * self.down - consumed * self.up
+		return out
+
+	def process(self, data):
+		"""轉換一段 PCM bytes，回傳輸出格式的 bytes (長度可能因取樣率而不固定)。"""
+		if self.remainder:
+			data = self.remainder + data
+		usable = len(data) - len(data) % self.in_frame
+		self.remainder = data[usable:]
+		if not usable:
+			return b""
+		samples = np.frombuffer(data, dtype=self.DTYPES[self.in_format], count=usable // self.in_frame * self.in_channels)
+		x = self.to_float(samples.reshape(-1, self.in_channels))
+		if self.work_channels < self.in_channels:
+			x = x.mean(axis=1, keepdims=True) if self.work_channels == 1 else x[:, :self.work_channels]
+		if self.up != self.down:
+			x = self.resample(x)
+		if self.out_channels > self.work_channels:
+			if self.work_channels == 1:
+				x = np.repeat(x, self.out_channels, axis=1)
+			else:
+				x = np.concatenate((x, np.zeros((len(x), self.out_channels - self.work_channels), dtype=np.float32)), axis=1)
+		return self.from_float(x).tobytes()
+
+def sample_format_name(audio_format):
+	"""QAudioFormat 的取樣格式對應到 AudioConverter 的格式字串；Unknown 等無法轉換的格式回傳 None。"""
+	from PyQt6.QtMultimedia import QAudioFormat
+	return {
+		QAudioFormat.SampleFormat.UInt8: "uint8",
+		QAudioFormat.SampleFormat.Int16: "int16",
+		QAudioFormat.SampleFormat.Int32: "int32",
+		QAudioFormat.SampleFormat.Float: "float32",
+	}.get(audio_format.sampleFormat())
 
 class AudioPlayer(QObject):
 	def __init__(self):
 		super().__init__()
+		from PyQt6.QtMultimedia import QAudioSink, QMediaDevices, QAudioFormat
 		self.format = QAudioFormat()
 		self.format.setSampleRate(24000) 
 		self.format.setChannelCount(1)
@@ -104,394 +721,2719 @@ class AudioPlayer(QObject):
 		print(f"\nDEBUG: Default Output Device: {info.description()}")
 		if not info.isFormatSupported(self.format):
 			print(f"WARNING: 24000Hz 1ch Int16 not supported. Finding nearest...")
-			self.format = info.preferredFormat()
-			print(f"\nDEBUG: Nearest format: {self.format.sampleRate()}Hz, {self.format.channelCount()}ch")
+			preferred = info.preferredFormat()
+			# 沒有輸出裝置或裝置回報 Unknown 格式時 preferredFormat 無法使用，維持 24kHz mono Int16
+			if sample_format_name(preferred) and preferred.sampleRate() > 0 and preferred.channelCount() > 0:
+				self.format = preferred
+				print(f"\nDEBUG: Nearest format: {self.format.sampleRate()}Hz, {self.format.channelCount()}ch")
+			else:
+				print("WARNING: Preferred output format unusable, keeping 24000Hz 1ch Int16")
 		else:
 			print("\nDEBUG: 24000Hz format supported!")
 
+		# 裝置不支援 Gemini 的 24kHz mono Int16 時，寫入前先轉成裝置格式
+		self.converter = None
+		if (self.format.sampleRate(), self.format.channelCount(), self.format.sampleFormat()) != (24000, 1, QAudioFormat.SampleFormat.Int16):
+			self.converter = AudioConverter(24000, 1, "int16", self.format.sampleRate(), self.format.channelCount(), sample_format_name(self.format))
+			print(f"\nDEBUG: Converting output 24000Hz 1ch int16 -> {self.format.sampleRate()}Hz {self.format.channelCount()}ch {sample_format_name(self.format)}")
+
+		# Managed Jitter Buffer: sink 以 pull mode 直接從 ring buffer 取資料
+		self.buffer = JitterBuffer(self.format.bytesForDuration(1000000), self.format.bytesPerFrame(), parent=self)
+		self.buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+
 		self.sink = QAudioSink(info, self.format)
-		self.sink.setBufferSize(48000) # Internal HW buffer size
-		self.io_device = self.sink.start()
-		
-		# Managed Jitter Buffer
-		self.queue = bytearray()
-		self.timer = QTimer()
-		self.timer.timeout.connect(self.process_queue)
-		self.timer.start(20) # Check every 20ms to push data
+		self.sink.setBufferSize(self.format.bytesForDuration(200000)) # Internal HW buffer: 200ms
+		self.sink.stateChanged.connect(self.on_state_changed)
+		self.sink.start(self.buffer)
+		self._log_tick = 0
 		
 	def play(self, audio_data: bytes):
-		# Accumulate incoming audio blocks
-		self.queue.extend(audio_data)
-		
-		# Latency Capping: If the queue is too long (> 5 seconds)
-		# 24000 samples * 2 bytes = 48000 bytes per second
-		# 48000 * 5 = 240000 bytes
-		if len(self.queue) > 240000:
-			# We are falling dangerously behind. Trim the queue to 1.0s of the latest audio 
-			# to stay relatively in sync without being totally broken.
-			trim_size = len(self.queue) - 48000 
-			self.queue = self.queue[trim_size:]
-			print(f"\nDEBUG: Audio Latency Spike! Trimmed {trim_size} bytes to catch up.")
-
-	def process_queue(self):
-		if not self.io_device or not self.io_device.isOpen():
-			return
-			
-		# Check how much the hardware buffer can take
-		bytes_free = self.sink.bytesFree()
-		if bytes_free > 4096 and len(self.queue) > 0: # Write in chunks of at least 4k if possible
-			# Write as much as possible, up to what we have in queue
-			to_write = min(bytes_free, len(self.queue))
-			written = self.io_device.write(self.queue[:to_write])
-			if written > 0:
-				self.queue = self.queue[written:]
-		
+		"""由 LiveSession thread 直接呼叫 (producer)：轉換格式後寫入 jitter buffer。"""
+		if self.converter:
+			audio_data = self.converter.process(audio_data)
+		self.buffer.push(audio_data)
+
 		# Periodic Debug
-		if len(self.queue) > 0 and not hasattr(self, "_log_tick"): self._log_tick = 0
-		if len(self.queue) > 0:
-			self._log_tick += 1
-			if self._log_tick % 100 == 0: # Every ~2 seconds of playback effort
-				print(f"\nDEBUG: Buffer level: {len(self.queue)/48000:.2f}s")
+		self._log_tick += 1
+		if self._log_tick % 100 == 0:
+			print(f"\nDEBUG: Jitter buffer: {self.buffer.stats()}")
+
+	def flush(self):
+		"""由 LiveSession thread 呼叫 (producer)：使用者插話，丟掉 jitter buffer 裡尚未播放的語音。"""
+		if self.converter:
+			self.converter.reset()
+		return self.buffer.clear()
+
+	def interrupt(self):
+		"""GUI thread：插話後再清掉 sink 硬體緩衝裡的舊語音 (jitter buffer 已由 flush 清空)。"""
+		queued = max(0, self.sink.bufferSize() - self.sink.bytesFree())
+		# reset() 清掉音效卡緩衝並停止 sink，再以 pull mode 重新開始
+		self.sink.reset()
+		self.sink.start(self.buffer)
+		latency = metrics.span("barge_in_seconds", "interrupted")
+		print(f"\nDEBUG: Barge-in: dropped {queued / self.buffer.bytes_per_sec * 1000:.0f}ms of sink buffer" + (f" in {latency * 1000:.1f}ms" if latency is not None else ""))
+
+	def on_state_changed(self, state):
+		from PyQt6.QtMultimedia import QAudio
+		if state == QAudio.State.IdleState:
+			self.buffer.mark_starved()
+
+	def stats(self):
+		return self.buffer.stats()
+
+class LiveRecording:
+	"""Live 對話的錄製檔 (AIWINDOW_LIVE_RECORD)。
+
+	每筆紀錄為 struct "<dBI" (開始錄製後的秒數、種類、長度) 加上內容：
+	上行麥克風 PCM 與下行音訊直接存 raw bytes，其他伺服器訊息 (轉錄、tool_call、
+	turn_complete...) 存成 JSON，activate/standby 也會記錄，重播時據此切換狀態。
+	"""
+	MAGIC = b"AIWLIVE1"
+	RECORD = struct.Struct("<dBI")
+	UP_AUDIO, DOWN_AUDIO, DOWN_MESSAGE, ACTIVATE, STANDBY = range(1, 6)
+
+	def __init__(self, path, clock=time.monotonic):
+		self.path = path
+		self.clock = clock
+		self.lock = threading.Lock()
+		self.file = open(path, 'wb')
+		self.file.write(self.MAGIC)
+		self.start = clock()
+		print(f"DEBUG: Recording Live session to {path}")
+
+	def write(self, kind, payload=b""):
+		with self.lock:
+			if self.file is None:
+				return
+			self.file.write(self.RECORD.pack(self.clock() - self.start, kind, len(payload)))
+			self.file.write(payload)
+			if kind not in (self.UP_AUDIO, self.DOWN_AUDIO):
+				self.file.flush()
+
+	def record_message(self, response):
+		content = response.server_content
+		parts = content.model_turn.parts if content and content.model_turn else None
+		if parts and all(p.inline_data and not p.text for p in parts) and not (
+				content.input_transcription or content.output_transcription or content.turn_complete or content.interrupted):
+			# 純音訊訊息 (絕大多數) 只存 PCM
+			for part in parts:
+				self.write(self.DOWN_AUDIO, part.inline_data.data)
+		else:
+			self.write(self.DOWN_MESSAGE, response.model_dump_json(exclude_none=True).encode('utf-8'))
+
+	def close(self):
+		with self.lock:
+			if self.file:
+				self.file.close()
+				self.file = None
+
+	@classmethod
+	def read(cls, path):
+		"""依序產生 (秒數, 種類, 內容)。"""
+		with open(path, 'rb') as f:
+			if f.read(len(cls.MAGIC)) != cls.MAGIC:
+				raise ValueError(f"{path} is not a Live recording")
+			while True:
+				header = f.read(cls.RECORD.size)
+				if len(header) < cls.RECORD.size:
+					return
+				ts, kind, length = cls.RECORD.unpack(header)
+				yield ts, kind, f.read(length)
+
+class ReplaySession:
+	"""重播錄製檔的假 Live 連線，給 LiveSession 的 receiver 使用。
+
+	下行訊息依原本的時間 (除以 speed；speed <= 0 則不等待) 交給 receive()，
+	上行麥克風 PCM 重新送進 add_audio_input，activate/standby 依紀錄切換。
+	送出的內容 (音訊、tool response) 只計數，不會傳到任何地方。
+	"""
+	def __init__(self, live, path, speed, client=None):
+		self.live = live
+		self.path = path
+		self.speed = speed
+		self.client = client
+		self.messages = asyncio.Queue()
+		self.player = None
+		self.sent_audio = 0
+		self.tool_responses = 0
+
+	async def __aenter__(self):
+		self.player = asyncio.ensure_future(self.play())
+		return self
+
+	async def __aexit__(self, *exc):
+		self.player.cancel()
+		return False
+
+	async def play(self):
+		from google.genai import types
+		if self.path is None:
+			return
+		start = time.monotonic()
+		if self.client:
+			self.client.started_at = start
+		count = 0
+		for ts, kind, payload in LiveRecording.read(self.path):
+			if self.speed > 0:
+				delay = start + ts / self.speed - time.monotonic()
+				if delay > 0:
+					await asyncio.sleep(delay)
+			count += 1
+			if kind == LiveRecording.UP_AUDIO:
+				self.live.add_audio_input(payload)
+			elif kind == LiveRecording.DOWN_AUDIO:
+				part = types.Part(inline_data=types.Blob(data=payload, mime_type="audio/pcm;rate=24000"))
+				self.messages.put_nowait(types.LiveServerMessage(server_content=types.LiveServerContent(model_turn=types.Content(role="model", parts=[part]))))
+			elif kind == LiveRecording.DOWN_MESSAGE:
+				self.messages.put_nowait(types.LiveServerMessage.model_validate_json(payload))
+			elif kind == LiveRecording.ACTIVATE:
+				self.live.activate()
+			elif kind == LiveRecording.STANDBY:
+				self.live.standby()
+			if self.speed <= 0:
+				await asyncio.sleep(0) # 讓 receiver 跟上
+		print(f"\nDEBUG: Replay of {self.path} finished ({count} records)")
+		self.live.replay_finished.emit()
+
+	async def send_client_content(self, **kwargs):
+		pass
+
+	async def send_realtime_input(self, audio=None, **kwargs):
+		if audio is not None:
+			self.sent_audio += 1
+
+	async def send_tool_response(self, *args, **kwargs):
+		self.tool_responses += 1
+
+	async def receive(self):
+		while True:
+			response = await self.messages.get()
+			yield response
+			if response.server_content and response.server_content.turn_complete:
+				return
+
+class ReplayClient:
+	"""取代 genai.Client (client.aio.live.connect)：第一次連線時重播錄製檔，之後的重連是空連線。"""
+	def __init__(self, owner, path, speed=1.0):
+		self.owner = owner
+		self.path = path
+		self.speed = speed
+		self.played = False
+		self.started_at = None # 重播開始的 time.monotonic()
+		self.aio = self.live = self
+
+	def connect(self, model=None, config=None):
+		path = None if self.played else self.path
+		self.played = True
+		return ReplaySession(self.owner, path, self.speed, self)
 
 class LiveSession(QThread):
+	"""Gemini Live 連線管理。
+
+	整個程式只有一個 LiveSession thread：泡泡顯示時先建好連線 (warm)，按下麥克風
+	只需 activate()，不必重新握手；結束對話後連線再保留 LIVE_WARM_SECONDS 秒。
+	連線中斷或收到 go_away 時以 session resumption handle 退避重連，延續原本的對話，
+	不必重送系統指令。每次按下麥克風到第一段助理語音的延遲都會記錄下來。
+	record_path 會把對話錄製成 LiveRecording；replay_path 則以錄製檔取代真正的連線。
+	"""
 	finished = pyqtSignal()
 	text_received = pyqtSignal(str)
 	audio_received = pyqtSignal(bytes)
 	status_changed = pyqtSignal(str)
 	on_exec_cmd = pyqtSignal(str)
-	def __init__(self, current_volume=100):
+	input_transcript = pyqtSignal(str) # 使用者語音的即時轉錄片段
+	output_transcript = pyqtSignal(str) # 助理語音的即時轉錄片段
+	turn_completed = pyqtSignal()
+	interrupted = pyqtSignal() # 使用者插話，伺服器已停止這一輪回覆 (audio_output 已先 flush)
+	replay_finished = pyqtSignal()
+	def __init__(self, current_volume=100, record_path=LIVE_RECORD_PATH, replay_path=LIVE_REPLAY_PATH, replay_speed=LIVE_REPLAY_SPEED):
 		super().__init__()
-		self.input_queue = queue.Queue()
-		self.running = False
+		# 上行音訊 frame 以 asyncio.Queue 交給 sender，None 代表結束
+		self.audio_queue = asyncio.Queue()
+		self.pending_audio = collections.deque() # event loop 尚未啟動前收到的 frame
+		self.vad = VoiceActivityDetector()
+		self.loop = None
+		self.state_event = None # active / warm 狀態改變時喚醒 event loop
+		self.session = None
+		self.running = True # stop() 之後為 False (在 run() 開始前呼叫 stop() 也不會卡住)
+		self.active = False # 對話中 (麥克風開啟)；False 時為待命，連線保留到 warm_until
+		self.warm_until = time.monotonic() + LIVE_WARM_SECONDS
+		self.bootstrapped = False # 目前的對話脈絡是否已送過 (或正在送) 系統指令
+		self.greet_pending = False # 這次開麥克風還沒問候 (連線中按下時由 run_connection 補上)
+		self.resume_handle = None
+		self.click_time = None
+		self.click_warm = False
+		self.awaiting_upstream = False # 對話開始後還沒送出第一個上行 frame
 		self.model = "gemini-2.5-flash-native-audio-preview-12-2025"
-		self.client = genai.Client(api_key=API_KEY, http_options={'api_version': 'v1beta'})
+		self.client = None # 第一次連線前才在本 thread 以 get_client() 建立
+		if replay_path:
+			print(f"DEBUG: Replaying Live session from {replay_path} at {replay_speed}x")
+			self.client = ReplayClient(self, replay_path, replay_speed)
+		self.recording = LiveRecording(record_path) if record_path else None
 		self.current_volume = current_volume
+		# 下行音訊直接寫進 AudioPlayer 的 ring buffer (play / flush)，不經過 Qt event queue；
+		# audio_received 仍會發出給其他觀察者，沒有 queued 連接時不會喚醒 GUI thread
+		self.audio_output = None
 
 	def add_audio_input(self, data):
-		self.input_queue.put(data)
+		if self.recording:
+			self.recording.write(LiveRecording.UP_AUDIO, data)
+		# 只有語音 (含前後 padding) 與段落標記會進入上行佇列
+		for item in self.vad.process(data):
+			loop = self.loop
+			if loop is None:
+				self.pending_audio.append(item)
+			else:
+				loop.call_soon_threadsafe(self.audio_queue.put_nowait, item)
+
+	def _notify(self, callback=None):
+		loop = self.loop
+		if loop is None:
+			return
+		def wake():
+			self.state_event.set()
+			if callback:
+				callback()
+		try:
+			loop.call_soon_threadsafe(wake)
+		except RuntimeError:
+			pass # event loop 已關閉
+
+	def activate(self, current_volume=None):
+		"""開始一段對話 (使用者按下麥克風)。"""
+		if current_volume is not None:
+			self.current_volume = current_volume
+		self.vad = VoiceActivityDetector()
+		self.click_time = time.monotonic()
+		self.click_warm = self.session is not None
+		self.awaiting_upstream = True
+		metrics.mark("mic_start", self.click_time)
+		if self.recording:
+			self.recording.write(LiveRecording.ACTIVATE)
+		self.active = True
+		self.greet_pending = True
+		self._notify(lambda: asyncio.ensure_future(self.greet()))
+
+	def standby(self):
+		"""結束對話但保留連線，LIVE_WARM_SECONDS 秒內再次對話不必重新連線。"""
+		if self.active:
+			print(f"\nDEBUG: VAD suppressed {self.vad.suppressed_ratio():.1%} of {self.vad.total_frames} upstream frames")
+		self.active = False
+		self.click_time = None
+		self.warm_until = time.monotonic() + LIVE_WARM_SECONDS
+		if self.recording:
+			self.recording.write(LiveRecording.STANDBY)
+		self._notify()
+
+	def prewarm(self):
+		"""延長待命時間 (例如泡泡重新顯示時)，需要時建立連線。"""
+		self.warm_until = max(self.warm_until, time.monotonic() + LIVE_WARM_SECONDS)
+		self._notify()
 
 	def stop(self):
 		self.running = False
+		loop = self.loop
+		if loop is not None:
+			try:
+				# 喚醒正在等待 frame 的 sender 與等待狀態的主迴圈
+				loop.call_soon_threadsafe(self.audio_queue.put_nowait, None)
+				self._notify()
+			except RuntimeError:
+				pass # event loop 已關閉
+
+	def wants_connection(self):
+		return self.running and (self.active or time.monotonic() < self.warm_until)
 		
 	def run(self):
-		self.running = True
+		if self.client is None and self.running:
+			self.client = get_client()
 		asyncio.run(self.aio_run())
+		if self.recording:
+			self.recording.close()
 		self.finished.emit()
 
 	async def aio_run(self):
-		self.status_changed.emit("正在連接 Gemini Live...")
-		try:
-			config = {
-				"response_modalities": ["AUDIO"],
-				"tools": [
-					{
-						'function_declarations': [
-							{
-								'name': 'change_scene',
-								'description': '切換窗景，指定搜尋關鍵字。',
-								'parameters': {
-									'type': 'OBJECT',
-									'properties': {
-										'keyword': {
-											'type': 'STRING',
-											'description': "搜尋關鍵字，例如 '瑞士'、'雨聲'、'爵士樂'"
-										}
-									},
-									'required': ['keyword']
-								}
-							},
-							{
-								'name': 'direct_youtube_search',
-								'description': '播放影片或聽音樂，指定搜尋關鍵字。',
-								'parameters': {
-									'type': 'OBJECT',
-									'properties': {
-										'keyword': {
-											'type': 'STRING',
-											'description': "搜尋關鍵字，例如 '古典吉他'、'鋼琴獨奏'、'爵士樂'"
-										}
-									},
-									'required': ['keyword']
-								}
-							},
-							{
-								'name': 'set_volume',
-								'description': '調整窗景背景音量。',
-								'parameters': {
-									'type': 'OBJECT',
-									'properties': {
-										'volume': {
-											'type': 'INTEGER',
-											'description': '音量大小 (0-100)'
-										}
-									},
-									'required': ['volume']
-								}
-							},
-							{
-								'name': 'quit_talk',
-								'description': '結束對話。',
-								'parameters': {
-									'type': 'OBJECT',
-									'properties': {}
-								}
+		self.loop = asyncio.get_running_loop()
+		self.state_event = asyncio.Event()
+		while self.pending_audio:
+			self.audio_queue.put_nowait(self.pending_audio.popleft())
+		backoff = 1.0
+		while self.running:
+			if not self.wants_connection():
+				# 待命時間已過：不保留連線，等下一次 activate / prewarm
+				self.state_event.clear()
+				await self.state_event.wait()
+				continue
+			try:
+				await self.run_connection()
+				backoff = 1.0
+				continue
+			except Exception as e:
+				if not self.running:
+					break
+				print(f"Live Session Error: {e}")
+				if self.active:
+					self.status_changed.emit(f"連線錯誤: {e}，{backoff:.0f} 秒後重新連線...")
+				if self.resume_handle:
+					# handle 可能已失效，下一次改用全新的對話
+					self.resume_handle = None
+			# 退避後重連；stop() 會立即喚醒
+			self.state_event.clear()
+			try:
+				await asyncio.wait_for(self.state_event.wait(), backoff)
+			except asyncio.TimeoutError:
+				pass
+			backoff = min(backoff * 2, 30.0)
+		print("\nDEBUG: Live session closed gracefully.")
+
+	def build_config(self):
+		config = {
+			"response_modalities": ["AUDIO"],
+			"tools": [
+				{
+					'function_declarations': [
+						{
+							'name': 'change_scene',
+							'description': '切換窗景，指定搜尋關鍵字。',
+							'parameters': {
+								'type': 'OBJECT',
+								'properties': {
+									'keyword': {
+										'type': 'STRING',
+										'description': "搜尋關鍵字，例如 '瑞士'、'雨聲'、'爵士樂'"
+									}
+								},
+								'required': ['keyword']
 							}
-						]
-					},
-					{"google_search": {}}
-				],
-				"input_audio_transcription": {},
-				"output_audio_transcription": {}
-			}
-			async with self.client.aio.live.connect(model=self.model, config=config) as session:
+						},
+						{
+							'name': 'direct_youtube_search',
+							'description': '播放影片或聽音樂，指定搜尋關鍵字。',
+							'parameters': {
+								'type': 'OBJECT',
+								'properties': {
+									'keyword': {
+										'type': 'STRING',
+										'description': "搜尋關鍵字，例如 '古典吉他'、'鋼琴獨奏'、'爵士樂'"
+									}
+								},
+								'required': ['keyword']
+							}
+						},
+						{
+							'name': 'set_volume',
+							'description': '調整窗景背景音量。',
+							'parameters': {
+								'type': 'OBJECT',
+								'properties': {
+									'volume': {
+										'type': 'INTEGER',
+										'description': '音量大小 (0-100)'
+									}
+								},
+								'required': ['volume']
+							}
+						},
+						{
+							'name': 'quit_talk',
+							'description': '結束對話。',
+							'parameters': {
+								'type': 'OBJECT',
+								'properties': {}
+							}
+						}
+					]
+				},
+				{"google_search": {}}
+			],
+			"input_audio_transcription": {},
+			"output_audio_transcription": {}
+		}
+		if VAD_EXPLICIT_ACTIVITY:
+			config["realtime_input_config"] = {"automatic_activity_detection": {"disabled": True}}
+		# 帶上 handle 則延續先前的對話脈絡
+		config["session_resumption"] = {"handle": self.resume_handle}
+		return config
+
+	async def bootstrap(self, session):
+		from google.genai import types
+		# Send initial instruction as the first turn to bypass config issues
+		instruction_text = (
+			"SYSTEM INSTRUCTION: 你是一位會使用工具的視窗助理。"
+			"當使用者想要改變窗景,你必須回覆表示處理中,並呼叫change_scene工具切換窗景。"
+			"當使用者說要聽音樂或看甚麼特定影片時,你呼叫direct_youtube_search工具,並根據使用者的描述來決定搜尋關鍵字。"
+			"當使用者要求調整音量時,請呼叫set_volume工具來調整音量。"
+			f"目前背景窗景的音量是 {self.current_volume}%。如果使用者說調大一點或調小一點，請根據此數值調整。"
+			"當使用者要進行其他跟窗景無關的搜尋時, 例如股票或天氣時, 請直接調用google search獲取資料, 並用溫暖且具描述性語音回覆。"
+			"當使用者表示沒有要進行對話了,例如沒事或掰掰等,你就呼叫quit_talk工具,結束對話。"
+			"請全程使用繁體中文。\n"
+			"Now, please say something like '你好, 甚麼事呢?'"
+		)
+		# 送出前就標記，等待期間排進來的 greet() 不會再送一次系統指令
+		self.bootstrapped = True
+		try:
+			await session.send_client_content(
+				turns=types.Content(
+					role="user",
+					parts=[types.Part(text=instruction_text)]
+				),
+				turn_complete=True
+			)
+		except BaseException:
+			self.bootstrapped = False
+			raise
+
+	async def greet(self):
+		"""對話開始：尚未送過系統指令就送指令，否則這次開麥克風還沒問候時請助理簡短問候。"""
+		from google.genai import types
+		session = self.session
+		if session is None or not self.active:
+			return # 連線建立後 run_connection 會再呼叫
+		# 先清掉再 await，同一次開麥克風只問候一次
+		pending, self.greet_pending = self.greet_pending, False
+		try:
+			if not self.bootstrapped:
 				self.status_changed.emit("連線成功！正在叫醒助理...")
-				
-				# Send initial instruction as the first turn to bypass config issues
-				instruction_text = (
-					"SYSTEM INSTRUCTION: 你是一位會使用工具的視窗助理。"
-					"當使用者想要改變窗景,你必須回覆表示處理中,並呼叫change_scene工具切換窗景。"
-					"當使用者說要聽音樂或看甚麼特定影片時,你呼叫direct_youtube_search工具,並根據使用者的描述來決定搜尋關鍵字。"
-					"當使用者要求調整音量時,請呼叫set_volume工具來調整音量。"
-					f"目前背景窗景的音量是 {self.current_volume}%。如果使用者說調大一點或調小一點，請根據此數值調整。"
-					"當使用者要進行其他跟窗景無關的搜尋時, 例如股票或天氣時, 請直接調用google search獲取資料, 並用溫暖且具描述性語音回覆。"
-					"當使用者表示沒有要進行對話了,例如沒事或掰掰等,你就呼叫quit_talk工具,結束對話。"
-					"請全程使用繁體中文。\n"
-					"Now, please say something like '你好, 甚麼事呢?'"
-				)
+				await self.bootstrap(session)
+			elif pending:
 				await session.send_client_content(
 					turns=types.Content(
 						role="user",
-						parts=[types.Part(text=instruction_text)]
+						parts=[types.Part(text=f"(使用者再次開啟了麥克風，目前背景窗景的音量是 {self.current_volume}%。請簡短地問候，例如 '你好, 甚麼事呢?')")]
 					),
 					turn_complete=True
 				)
-				
-				async def sender():
-					buffer = b""
-					while self.running:
-						try:
-							# Non-blocking get from queue
-							try:
-								data = self.input_queue.get_nowait()
-								buffer += data
-							except queue.Empty:
-								# If queue is empty but we have meaningful leftover, send it
-								if len(buffer) > 0:
-									await session.send_realtime_input(audio={"data": buffer, "mime_type": "audio/pcm;rate=16000"})
-									buffer = b""
-								await asyncio.sleep(0.01)
-								continue
-							
-							# Send only when we have enough data (simulating ~128ms chunk)
-							# 16000 * 2 bytes * 0.128 ~ 4096 bytes
-							if len(buffer) >= 4096:
-								await session.send_realtime_input(audio={"data": buffer, "mime_type": "audio/pcm;rate=16000"})
-								buffer = b"" # Clear buffer
-								
-						except Exception as e:
-							print(f"Send Error: {e}")
-							break
-					print("\nDEBUG: Sender loop finished.")
-				
-				async def receiver():
-					isFirst = True
+		except Exception as e:
+			print(f"Greet Error: {e}")
+
+	async def run_connection(self):
+		from google.genai import types
+		if self.active:
+			self.status_changed.emit("正在連接 Gemini Live...")
+		resuming = self.resume_handle is not None
+		async with self.client.aio.live.connect(model=self.model, config=self.build_config()) as session:
+			print(f"\nDEBUG: Live connected ({'resumed' if resuming else 'new'} session)")
+			if not resuming:
+				self.bootstrapped = False
+			# 丟掉前一條連線留下的結束標記，保留尚未送出的音訊
+			leftover = []
+			while not self.audio_queue.empty():
+				item = self.audio_queue.get_nowait()
+				if item is not None:
+					leftover.append(item)
+			for item in leftover:
+				self.audio_queue.put_nowait(item)
+			self.session = session
+			if self.active:
+				# 連線 (或延續連線) 期間按下的麥克風在這裡補上系統指令或問候
+				await self.greet()
+			
+			async def sender():
+				while self.running:
+					# 等待下一個固定長度的 frame，沒有資料時不佔用 CPU
+					data = await self.audio_queue.get()
+					if data is None:
+						break
 					try:
-						while self.running:
-							async for response in session.receive():
-								if not self.running: break
-								if response.server_content:
-									model_turn = response.server_content.model_turn
-									if model_turn:
-										for part in model_turn.parts:
-											if part.text:
-												# Ensure we're only emitting text that is clearly model output
-												print(f"\nDEBUG: Received Model Text Chunks: {part.text}")
-												self.text_received.emit(part.text)
-											if part.inline_data:
-												if isFirst:
-													isFirst = False
-													self.status_changed.emit("助理來了...")
-												self.audio_received.emit(part.inline_data.data)
-												continue
-								#print(f"\nDEBUG: Received Response: {response}")
-								if response.tool_call:
-									f_responses = []
-									for fc in response.tool_call.function_calls:
-										print(f"\nDEBUG: Tool Call Received: {fc.name} with {fc.args}")
-										if fc.name == "change_scene":
-											keyword = fc.args.get("keyword")
-											if keyword:
-												#self.change_scene(keyword)
-												self.on_exec_cmd.emit(f"change_scene:[[{keyword}]]")
-												#self.emit(keyword)
-										elif fc.name == "direct_youtube_search":
-											keyword = fc.args.get("keyword")
-											if keyword:
-												#self.direct_youtube_search(keyword)
-												self.on_exec_cmd.emit(f"direct_youtube_search:[[{keyword}]]")
-										elif fc.name == "set_volume":
-											vol = fc.args.get("volume")
-											if vol is not None:
-												self.current_volume = int(vol)
-												#self.set_volume(self.current_volume)
-												self.on_exec_cmd.emit(f"set_volume:[[{self.current_volume}]]")
-										elif fc.name == "quit_talk":
-											self.on_exec_cmd.emit("quit_talk")
-											self.stop() # Stop the session loop
-											# We can also break here, but stop() will signal both loops to end gracefully
-											#break
-										f_responses.append(
-											types.FunctionResponse(
-												name=fc.name,
-												id=fc.id,
-												response={"status": "success"}
-											)
+						if data == VoiceActivityDetector.ACTIVITY_START:
+							if VAD_EXPLICIT_ACTIVITY:
+								await session.send_realtime_input(activity_start=types.ActivityStart())
+						elif data == VoiceActivityDetector.ACTIVITY_END:
+							metrics.mark("speech_end")
+							if VAD_EXPLICIT_ACTIVITY:
+								await session.send_realtime_input(activity_end=types.ActivityEnd())
+							else:
+								# 音訊暫停，讓伺服器端 VAD 立刻結束這段發話
+								await session.send_realtime_input(audio_stream_end=True)
+						else:
+							await session.send_realtime_input(audio={"data": data, "mime_type": "audio/pcm;rate=16000"})
+							if self.awaiting_upstream:
+								self.awaiting_upstream = False
+								metrics.span("mic_to_first_upstream_frame_seconds", "mic_start")
+					except Exception as e:
+						print(f"Send Error: {e}")
+						break
+				print("\nDEBUG: Sender loop finished.")
+			
+			async def receiver():
+				try:
+					while self.running:
+						async for response in session.receive():
+							if not self.running: break
+							if self.recording:
+								self.recording.record_message(response)
+							if response.session_resumption_update:
+								update = response.session_resumption_update
+								if update.resumable and update.new_handle:
+									self.resume_handle = update.new_handle
+							if response.go_away:
+								# 伺服器即將關閉連線：結束這條連線，由 aio_run 以 handle 重連
+								print(f"\nDEBUG: Live go_away received, time left {response.go_away.time_left}")
+								return
+							if response.server_content:
+								if response.server_content.interrupted:
+									# 在本 thread 直接清空 jitter buffer，sink 下一次讀取就不會再拿到舊語音；
+									# 音效卡硬體緩衝則由 GUI thread 收到 interrupted 後重設
+									metrics.mark("interrupted")
+									print("\nDEBUG: Live interrupted (barge-in)")
+									if self.audio_output:
+										self.audio_output.flush()
+									self.interrupted.emit()
+								transcription = response.server_content.input_transcription
+								if transcription and transcription.text:
+									self.input_transcript.emit(transcription.text)
+								transcription = response.server_content.output_transcription
+								if transcription and transcription.text and self.active:
+									self.output_transcript.emit(transcription.text)
+								if response.server_content.turn_complete:
+									self.turn_completed.emit()
+								model_turn = response.server_content.model_turn
+								if model_turn:
+									for part in model_turn.parts:
+										if part.text:
+											# Ensure we're only emitting text that is clearly model output
+											print(f"\nDEBUG: Received Model Text Chunks: {part.text}")
+											self.text_received.emit(part.text)
+										if part.inline_data:
+											if not self.active:
+												continue # 待命中：不播放殘留的語音
+											if self.click_time is not None:
+												latency = time.monotonic() - self.click_time
+												self.click_time = None
+												metrics.observe("mic_to_first_audio_seconds", latency, connection="warm" if self.click_warm else "cold")
+												print(f"\nDEBUG: Mic click to first audio: {latency:.2f}s ({'warm' if self.click_warm else 'cold'} connection)")
+												self.status_changed.emit("助理來了...")
+											if self.audio_output:
+												self.audio_output.play(part.inline_data.data)
+											self.audio_received.emit(part.inline_data.data)
+											continue
+							#print(f"\nDEBUG: Received Response: {response}")
+							if response.tool_call:
+								f_responses = []
+								metrics.mark("tool_call")
+								metrics.span("speech_end_to_tool_call_seconds", "speech_end")
+								for fc in response.tool_call.function_calls:
+									print(f"\nDEBUG: Tool Call Received: {fc.name} with {fc.args}")
+									if not self.active:
+										pass # 待命中不執行，只回覆工具結果
+									elif fc.name == "change_scene":
+										keyword = fc.args.get("keyword")
+										if keyword:
+											#self.change_scene(keyword)
+											self.on_exec_cmd.emit(f"change_scene:[[{keyword}]]")
+											#self.emit(keyword)
+									elif fc.name == "direct_youtube_search":
+										keyword = fc.args.get("keyword")
+										if keyword:
+											#self.direct_youtube_search(keyword)
+											self.on_exec_cmd.emit(f"direct_youtube_search:[[{keyword}]]")
+									elif fc.name == "set_volume":
+										vol = fc.args.get("volume")
+										if vol is not None:
+											self.current_volume = int(vol)
+											#self.set_volume(self.current_volume)
+											self.on_exec_cmd.emit(f"set_volume:[[{self.current_volume}]]")
+									elif fc.name == "quit_talk":
+										# 結束對話但保留連線，由 UI 切回待命
+										self.on_exec_cmd.emit("quit_talk")
+									f_responses.append(
+										types.FunctionResponse(
+											name=fc.name,
+											id=fc.id,
+											response={"status": "success"}
 										)
+									)
 
-									if f_responses:
-										# Use the explicit tool response API instead of the deprecated session.send
-										await session.send_tool_response(
-											types.LiveClientToolResponse(function_responses=f_responses)
-										)
-					except Exception as e:
-						if self.running: # Only log if it wasn't a planned stop
-							print(f"Receive Error: {e}")
-					print("\nDEBUG: Receiver loop finished.")
+								if f_responses:
+									# Use the explicit tool response API instead of the deprecated session.send
+									await session.send_tool_response(
+										types.LiveClientToolResponse(function_responses=f_responses)
+									)
+				except Exception as e:
+					if self.running: # Only log if it wasn't a planned stop
+						print(f"Receive Error: {e}")
+				print("\nDEBUG: Receiver loop finished.")
+
+			async def warm_timer():
+				# 待命超過 LIVE_WARM_SECONDS 就結束這條連線
+				while self.wants_connection():
+					timeout = None if self.active else self.warm_until - time.monotonic()
+					self.state_event.clear()
+					try:
+						await asyncio.wait_for(self.state_event.wait(), timeout)
+					except asyncio.TimeoutError:
+						pass
+				print("\nDEBUG: Live warm period over, closing connection.")
+
+			tasks = [asyncio.ensure_future(t) for t in (sender(), receiver(), warm_timer())]
+			try:
+				# 任一個結束 (連線中斷、go_away、待命逾時、stop) 就關閉這條連線
+				await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+			finally:
+				self.session = None
+				for task in tasks:
+					task.cancel()
+				await asyncio.gather(*tasks, return_exceptions=True)
+
+def save_json_atomic(path, data):
+	"""先寫到同目錄的暫存檔再 rename，中途當機也不會留下半個檔案。"""
+	tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+	with open(tmp, 'w', encoding='utf-8') as f:
+		json.dump(data, f, ensure_ascii=False)
+	os.replace(tmp, path)
+
+class SearchCache:
+	"""關鍵字 → 影片 URL 的 LRU 快取 (含 TTL)。
+
+	以正規化後的關鍵字為 key，內容存在 search_cache.json，重開程式後仍然有效。
+	可同時被多個 SearchWorker thread 使用。
+	"""
+	def __init__(self, path=SEARCH_CACHE_PATH, max_entries=500, ttl=7 * 24 * 3600):
+		self.path = path
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self.lock = threading.Lock()
+		self.entries = collections.OrderedDict() # key -> [url, 寫入時間]
+		self.hits = 0
+		self.misses = 0
+		self.load()
+
+	@staticmethod
+	def normalize(keyword):
+		return " ".join(unicodedata.normalize("NFKC", keyword).casefold().split())
+
+	def load(self):
+		if not os.path.exists(self.path):
+			return
+		try:
+			with open(self.path, 'r', encoding='utf-8') as f:
+				data = json.load(f)
+			now = time.time()
+			with self.lock:
+				for key, url, stamp in data.get("entries", []):
+					if now - stamp <= self.ttl:
+						self.entries[key] = [url, stamp]
+			print(f"DEBUG: Loaded {len(self.entries)} cached searches")
+		except Exception as e:
+			print(f"Error reading search cache: {e}")
+
+	def get(self, keyword):
+		key = self.normalize(keyword)
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is not None and time.time() - entry[1] > self.ttl:
+				del self.entries[key]
+				entry = None
+			if entry is None:
+				self.misses += 1
+				return None
+			self.entries.move_to_end(key)
+			self.hits += 1
+			return entry[0]
+
+	def __contains__(self, keyword):
+		"""是否有未過期的快取 (不計入命中統計)。"""
+		with self.lock:
+			entry = self.entries.get(self.normalize(keyword))
+			return entry is not None and time.time() - entry[1] <= self.ttl
+
+	def put(self, keyword, url):
+		key = self.normalize(keyword)
+		with self.lock:
+			self.entries[key] = [url, time.time()]
+			self.entries.move_to_end(key)
+			while len(self.entries) > self.max_entries:
+				self.entries.popitem(last=False)
+			snapshot = [[k, u, t] for k, (u, t) in self.entries.items()]
+			try:
+				save_json_atomic(self.path, {"entries": snapshot})
+			except Exception as e:
+				print(f"Error writing search cache: {e}")
+
+	def stats(self):
+		with self.lock:
+			total = self.hits + self.misses
+			return {
+				"entries": len(self.entries),
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": round(self.hits / total, 3) if total else 0.0,
+			}
+
+def stream_info(info, page_url):
+	"""從 yt-dlp 的 info dict 取出 mpv 可直接播放的串流網址與標題。"""
+	formats = info.get("requested_formats")
+	if formats:
+		video = formats[0]["url"]
+		audio = formats[1]["url"] if len(formats) > 1 else None
+	else:
+		video = info["url"]
+		audio = None
+	# googlevideo 網址帶有 expire 參數，沒有的話保守地當作一小時後過期
+	expire = urllib.parse.parse_qs(urllib.parse.urlparse(video).query).get("expire")
+	return {
+		"url": page_url,
+		"video": video,
+		"audio": audio,
+		"title": info.get("title"),
+		"expires": int(expire[0]) if expire else int(time.time()) + 3600,
+	}
+
+class YtDlpBackend:
+	"""在本行程內呼叫 yt_dlp 模組，extractor 只在第一次使用時載入。"""
+	def __init__(self):
+		import yt_dlp
+		self.yt_dlp = yt_dlp
+		self.local = threading.local() # YoutubeDL 不保證 thread-safe，每個 worker 各一個
+
+	def _ydl(self):
+		ydl = getattr(self.local, "ydl", None)
+		if ydl is None:
+			ydl = self.yt_dlp.YoutubeDL({"quiet": True, "no_warnings": True, "skip_download": True, "socket_timeout": YTDLP_SOCKET_TIMEOUT})
+			self.local.ydl = ydl
+		return ydl
+
+	def search(self, keyword):
+		info = self._ydl().extract_info(f"ytsearch1:{keyword}", download=False, process=False)
+		for entry in info.get("entries") or []:
+			if entry and entry.get("id"):
+				return f"https://www.youtube.com/watch?v={entry['id']}"
+		return None
+
+	def resolve(self, url):
+		ydl = getattr(self.local, "resolve_ydl", None)
+		if ydl is None:
+			ydl = self.yt_dlp.YoutubeDL({"quiet": True, "no_warnings": True, "skip_download": True, "socket_timeout": YTDLP_SOCKET_TIMEOUT, "format": STREAM_FORMAT})
+			self.local.resolve_ydl = ydl
+		return stream_info(ydl.extract_info(url, download=False), url)
+
+class SubprocessBackend:
+	"""每次查詢都執行一次 yt-dlp 指令 (沒有 yt_dlp 模組時的備援)。"""
+	def search(self, keyword):
+		# 使用 --no-warnings 避免將警告訊息當作 ID 抓取
+		cmd = ["yt-dlp", "--no-warnings", "--socket-timeout", str(YTDLP_SOCKET_TIMEOUT), "-f", "best[height<=1080][vcodec^=avc]", f"ytsearch1:{keyword}", "--get-id"]
+		# 不使用 stderr=subprocess.STDOUT，避免捕捉錯誤訊息
+		video_id = subprocess.check_output(cmd, timeout=RESOLVE_TIMEOUT).decode().strip()
+		return f"https://www.youtube.com/watch?v={video_id}" if video_id else None
+
+	def resolve(self, url):
+		cmd = ["yt-dlp", "--no-warnings", "--socket-timeout", str(YTDLP_SOCKET_TIMEOUT), "-f", STREAM_FORMAT, "-j", url]
+		return stream_info(json.loads(subprocess.check_output(cmd, timeout=RESOLVE_TIMEOUT)), url)
+
+def default_backend():
+	try:
+		return YtDlpBackend()
+	except ImportError:
+		print("DEBUG: yt_dlp module not found, falling back to yt-dlp subprocess")
+		return SubprocessBackend()
+
+class Resolver:
+	"""常駐的 YouTube 搜尋/解析服務。
+
+	請求放進佇列由固定的 worker thread 處理，backend 只建立一次，省去每次查詢的
+	直譯器啟動與 extractor 載入。每個請求回傳 Future，可 cancel；在佇列中等過
+	timeout 的請求不會再執行。backend 可替換 (例如測試用的假 backend)。
+	"""
+	def __init__(self, backend=None, workers=2):
+		self._backend = backend
+		self.backend_lock = threading.Lock()
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="resolver")
+
+	@property
+	def backend(self):
+		with self.backend_lock:
+			if self._backend is None:
+				self._backend = default_backend()
+			return self._backend
+
+	def warm_up(self):
+		"""在背景先載入 backend，第一次查詢就不用等 import。"""
+		return self.executor.submit(lambda: self.backend)
+
+	def submit(self, method, *args, timeout=RESOLVE_TIMEOUT):
+		deadline = time.monotonic() + timeout if timeout else None
+		def call():
+			if deadline is not None and time.monotonic() > deadline:
+				raise concurrent.futures.TimeoutError(f"{method} request expired in queue")
+			return getattr(self.backend, method)(*args)
+		return self.executor.submit(call)
+
+	def search(self, keyword, timeout=RESOLVE_TIMEOUT):
+		"""搜尋關鍵字，Future 結果為 YouTube 影片 URL 或 None。"""
+		return self.submit("search", keyword, timeout=timeout)
+
+	def resolve(self, url, timeout=RESOLVE_TIMEOUT):
+		"""解析影片頁面，Future 結果為 stream_info() 的 dict。"""
+		return self.submit("resolve", url, timeout=timeout)
+
+	def shutdown(self):
+		self.executor.shutdown(wait=False, cancel_futures=True)
+
+class SearchWorker(QThread):
+	finished = pyqtSignal(str) # 改回傳 URL，或者 None
+
+	def __init__(self, keyword, cache=None, resolver=None, future=None):
+		super().__init__()
+		self.keyword = keyword
+		self.cache = cache
+		self.resolver = resolver
+		self.future = future # 已在進行中的 (推測) 搜尋，有的話直接沿用
+
+	def run(self):
+		started = time.monotonic()
+		metrics.mark("search_start", started)
+		if self.cache:
+			url = self.cache.get(self.keyword)
+			if url:
+				print(f"\nDEBUG: 快取命中 {self.keyword} -> {url} {self.cache.stats()}")
+				self.record(started, "cache", "hit")
+				self.finished.emit(url)
+				return
+		print(f"\nDEBUG: 開始搜尋 {self.keyword} 的 YouTube 影片...")
+		future = self.future
+		source = "speculative" if future is not None else "resolver"
+		try:
+			if future is not None:
+				print(f"\nDEBUG: 沿用推測搜尋結果: {self.keyword}")
+				url = future.result(timeout=RESOLVE_TIMEOUT)
+			elif self.resolver:
+				future = self.resolver.search(self.keyword)
+				url = future.result(timeout=RESOLVE_TIMEOUT)
+			else:
+				url = SubprocessBackend().search(self.keyword)
+			if url:
+				print(f"\nDEBUG: 找到影片 ID: " + url)
+				if self.cache:
+					self.cache.put(self.keyword, url)
+				self.record(started, source, "found")
+				self.finished.emit(url)
+			else:
+				print(f"\nDEBUG: 沒有找到影片，關鍵字: {self.keyword}")
+				self.record(started, source, "empty")
+				self.finished.emit("")
+		except concurrent.futures.TimeoutError:
+			if future:
+				future.cancel()
+			print(f"搜尋逾時: {self.keyword}")
+			self.record(started, source, "timeout")
+			self.finished.emit("")
+		except Exception as e:
+			print(f"搜尋失敗: {e}")
+			self.record(started, source, "error")
+			self.finished.emit("")
+
+	def record(self, started, source, result):
+		now = time.monotonic()
+		metrics.mark("search_finish", now)
+		metrics.observe("search_seconds", now - started, source=source, result=result)
+
+class SceneSpeculator(QObject):
+	"""從使用者的即時語音轉錄推測場景/音樂關鍵字，在模型還在思考時就先開始搜尋。
+
+	轉錄停頓 debounce_ms 後才發出推測搜尋；工具呼叫帶著相同關鍵字抵達時，
+	take() 交出進行中的 Future，沒用到的推測一律取消。
+	resolver 應為推測專用的單一 worker Resolver：已開始的搜尋無法取消，
+	不能讓過時的推測佔住使用者搜尋的 worker；前一個推測還在執行時，新的推測等它結束再發出。
+	"""
+	SCENE_SUFFIX = " 4K window view"
+	PATTERNS = [
+		("music", re.compile(r"(?:想聽|聽一下|聽聽|聽|播放|播|放一首|放點|放|來一首|來點)(?P<kw>.+)")),
+		("scene", re.compile(r"(?:帶我去|我想去|想去|去|想看|看看|換成|換到|切換到|切到)(?P<kw>.+)")),
+		("music", re.compile(r"\b(?:play|listen to)\s+(?P<kw>.+)", re.IGNORECASE)),
+		("scene", re.compile(r"\b(?:take me to|go to|show me|switch to)\s+(?P<kw>.+)", re.IGNORECASE)),
+	]
+	FILLER = re.compile(r"(?:的風景|的窗景|的景色|的影片|的音樂|風景|窗景|好嗎|好不好|一下|可以嗎|嗎|吧|啊|呢|喔|please)$|^(?:一些|一點|一下|點|some|the|a)\s*", re.IGNORECASE)
+
+	def __init__(self, resolver, cache=None, debounce_ms=300, parent=None):
+		super().__init__(parent)
+		self.resolver = resolver
+		self.cache = cache
+		self.text = ""
+		self.speculations = {} # 正規化後的搜尋字串 -> Future
+		self.timer = QTimer(self)
+		self.timer.setSingleShot(True)
+		self.timer.setInterval(debounce_ms)
+		self.timer.timeout.connect(self.speculate)
+
+	@classmethod
+	def extract(cls, text):
+		"""回傳 (kind, keyword)；kind 為 "scene" 或 "music"，找不到時回傳 None。"""
+		clause = re.split(r"[，。！？,.!?]", text.strip())
+		clause = [c for c in clause if c.strip()]
+		if not clause:
+			return None
+		clause = clause[-1].strip()
+		# 取最早出現的意圖詞，避免「去放鬆一下」被當成「放」
+		matches = [(m.start(), kind, m) for kind, pattern in cls.PATTERNS for m in [pattern.search(clause)] if m]
+		for _, kind, m in sorted(matches, key=lambda x: x[0]):
+			keyword = m.group("kw").strip()
+			while True:
+				stripped = cls.FILLER.sub("", keyword).strip()
+				if stripped == keyword:
+					break
+				keyword = stripped
+			if len(keyword) >= 2:
+				return kind, keyword
+		return None
+
+	def feed(self, chunk):
+		self.text = (self.text + chunk)[-200:]
+		self.timer.start()
+
+	def speculate(self):
+		found = self.extract(self.text)
+		if not found:
+			return
+		kind, keyword = found
+		query = keyword + self.SCENE_SUFFIX if kind == "scene" else keyword
+		key = SearchCache.normalize(query)
+		if key in self.speculations or (self.cache and query in self.cache):
+			return
+		if any(future.running() for future in self.speculations.values()):
+			# 不排在執行中的推測後面 (工具呼叫會等它)，等它結束後再試
+			self.timer.start()
+			return
+		# 只保留最新的推測，較舊且尚未開始的請求直接取消
+		self.cancel_all()
+		print(f"DEBUG: Speculative search for '{query}'")
+		self.speculations[key] = self.resolver.search(query)
+
+	def take(self, query):
+		"""工具呼叫抵達時取回對應的推測搜尋 Future (沒有則為 None)，其餘推測取消。"""
+		self.timer.stop()
+		key = SearchCache.normalize(query)
+		future = self.speculations.pop(key, None)
+		self.cancel_all()
+		self.text = ""
+		if future is not None and future.cancelled():
+			return None
+		return future
+
+	def cancel_all(self):
+		for future in self.speculations.values():
+			future.cancel()
+		self.speculations.clear()
+
+	def reset(self):
+		self.timer.stop()
+		self.cancel_all()
+		self.text = ""
+
+class PreResolver(QObject):
+	"""在背景預先解析 play.lst 收藏的串流網址與標題。
+
+	結果存在 stream_cache.json，在網址過期前自動更新；播放時直接把解析好的
+	串流交給 mpv，省掉 mpv ytdl hook 啟動 yt-dlp 的數秒黑畫面。
+	一次只解析一個網址，避免佔滿 Resolver 而拖慢使用者的搜尋。
+	"""
+	_resolved = pyqtSignal(str, object)
+	resolved = pyqtSignal(str) # 收藏網址已解析 (MediaCache 可以開始下載)
+	TIMEOUT = RESOLVE_TIMEOUT * 3 # 排在使用者搜尋後面等 worker 的上限；執行中再多等同樣久就放棄
+
+	def __init__(self, resolver, path=STREAM_CACHE_PATH, refresh_margin=1800, parent=None):
+		super().__init__(parent)
+		self.resolver = resolver
+		self.path = path
+		self.refresh_margin = refresh_margin
+		self.urls = []
+		self.entries = {} # page url -> stream_info
+		self.origins = {} # stream url -> page url
+		self.inflight = None
+		self.retry_at = {} # 解析失敗的網址 -> 下次重試時間
+		self._resolved.connect(self.on_resolved)
+		self.load()
+		self.timer = QTimer(self)
+		self.timer.timeout.connect(self.refresh)
+		self.timer.start(10 * 60 * 1000)
+
+	def load(self):
+		if not os.path.exists(self.path):
+			return
+		try:
+			with open(self.path, 'r', encoding='utf-8') as f:
+				for info in json.load(f).get("entries", []):
+					if info["expires"] > time.time():
+						self.store(info)
+		except Exception as e:
+			print(f"Error reading stream cache: {e}")
+
+	def store(self, info):
+		old = self.entries.get(info["url"])
+		if old:
+			self.origins.pop(old["video"], None)
+		self.entries[info["url"]] = info
+		self.origins[info["video"]] = info["url"]
+
+	def save(self):
+		try:
+			save_json_atomic(self.path, {"entries": list(self.entries.values())})
+		except Exception as e:
+			print(f"Error writing stream cache: {e}")
+
+	def set_urls(self, urls):
+		self.urls = list(urls)
+		self.refresh()
+
+	def is_fresh(self, url):
+		info = self.entries.get(url)
+		return info is not None and info["expires"] - time.time() > self.refresh_margin
+
+	def lookup(self, url):
+		"""回傳仍有效的解析結果，沒有的話回傳 None。"""
+		info = self.entries.get(url)
+		if info and info["expires"] - time.time() > 60:
+			return info
+		return None
+
+	def origin(self, stream_url):
+		"""把 mpv 回報的串流網址換回收藏清單中的影片網址。"""
+		return self.origins.get(stream_url)
+
+	def refresh(self):
+		if self.inflight:
+			return
+		now = time.time()
+		for url in self.urls:
+			if not self.is_fresh(url) and self.retry_at.get(url, 0) <= now:
+				self.inflight = url
+				future = self.resolver.resolve(url, timeout=self.TIMEOUT)
+				future.add_done_callback(lambda f, u=url: self._resolved.emit(u, f))
+				QTimer.singleShot(int(self.TIMEOUT * 2000), lambda u=url, f=future: self.expire(u, f))
+				return
+
+	def expire(self, url, future):
+		"""解析太久沒有結果：放棄這個網址，繼續處理其他收藏。"""
+		if self.inflight != url or future.done():
+			return
+		future.cancel()
+		print(f"DEBUG: Pre-resolve timed out for {url}")
+		self.inflight = None
+		self.retry_at[url] = time.time() + 3600
+		self.refresh()
+
+	def on_resolved(self, url, future):
+		current = self.inflight == url # False: expire() 已放棄，結果晚到
+		if current:
+			self.inflight = None
+		try:
+			info = future.result()
+			self.store(info)
+			self.save()
+			print(f"DEBUG: Pre-resolved {url} ({info.get('title')})")
+			self.resolved.emit(url)
+		except Exception as e:
+			print(f"DEBUG: Pre-resolve failed for {url}: {e}")
+			# 失敗的網址一小時後再試，先處理其他收藏
+			self.retry_at[url] = time.time() + 3600
+		if current:
+			self.refresh()
+
+class HttpDownloader:
+	"""以 HTTP Range 分段把串流網址下載成檔案 (googlevideo 對不分段的長連線會限速)。"""
+	CHUNK = 10 << 20
+
+	def __init__(self, timeout=30):
+		self.timeout = timeout
+
+	def fetch(self, url, dest, cancelled=lambda: False):
+		"""下載到 dest，回傳位元組數；cancelled() 為 True 時中止，內容不完整時丟出例外。"""
+		written = 0
+		with open(dest, "wb") as f:
+			while True:
+				start = written
+				request = urllib.request.Request(url, headers={"Range": f"bytes={start}-{start + self.CHUNK - 1}", "User-Agent": "Mozilla/5.0"})
+				try:
+					resp = urllib.request.urlopen(request, timeout=self.timeout)
+				except urllib.error.HTTPError as e:
+					# 總長度未知時，剛好下載到結尾後的下一段會得到 416
+					if e.code == 416 and start:
+						return written
+					raise
+				with resp:
+					total = None
+					content_range = resp.headers.get("Content-Range", "")
+					if resp.status == 206 and "/" in content_range and not content_range.endswith("*"):
+						total = int(content_range.rsplit("/", 1)[1])
+					length = resp.headers.get("Content-Length")
+					while True:
+						if cancelled():
+							raise RuntimeError("download cancelled")
+						block = resp.read(256 << 10)
+						if not block:
+							break
+						f.write(block)
+						written += len(block)
+				received = written - start
+				if length is not None and received != int(length):
+					raise RuntimeError(f"truncated download: {received} of {length} bytes")
+				# 不支援 Range 的伺服器會一次回傳整個檔案 (200)
+				if resp.status != 206:
+					return written
+				if total is not None:
+					if written >= total:
+						return written
+					if not received:
+						raise RuntimeError(f"truncated download: {written} of {total} bytes")
+				elif received < self.CHUNK:
+					# Content-Range 為 bytes a-b/*：回傳的範圍比要求的短 (或是空的) 就是結尾
+					return written
+
+class MediaCache(QObject):
+	"""收藏影片的本機檔案快取 (LRU，總容量不超過 budget 位元組)。
+
+	下載來源是 PreResolver 解析好的串流網址 (影片與音訊分開存)，由
+	MEDIA_CACHE_DOWNLOADS 個背景 thread 處理。容量還有空間時預先下載收藏；
+	播放到沒有快取的收藏時優先下載，必要時淘汰最久沒播放的影片，但只有在它
+	的播放次數比會被淘汰的影片多時才下載，避免冷門影片把熱門影片擠掉又重抓。
+	索引存在 index.json；downloader 可替換 (測試用本機 HTTP 伺服器)。
+	"""
+	_finished = pyqtSignal(str, object)
+	FILE_NAME = re.compile(r"[0-9a-f]{16}\.(video|audio)(\.part)?") # download() 的檔名
+
+	def __init__(self, streams, downloader=None, path=MEDIA_CACHE_DIR, budget=MEDIA_CACHE_BYTES, workers=MEDIA_CACHE_DOWNLOADS, parent=None):
+		super().__init__(parent)
+		self.streams = streams # lookup(url) -> stream_info，通常是 PreResolver
+		self.downloader = downloader or HttpDownloader()
+		self.path = path
+		self.budget = budget
+		self.workers = workers
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media-cache")
+		self.entries = collections.OrderedDict() # video key -> {"url", "video", "audio", "title", "bytes"}，最後面是最近播放
+		self.files = {} # 本機檔案路徑 -> 收藏網址
+		self.wanted = [] # 收藏網址，依 play.lst 順序預先下載
+		self.requested = collections.deque() # 播放時沒有快取的收藏，優先下載
+		self.inflight = set() # 下載中的 video key
+		self.retry_at = {} # 下載失敗的 video key -> 下次重試時間
+		self.skipped = set() # 預先下載後放不下或被淘汰過的 video key，播放時才再下載
+		self.plays = collections.Counter() # video key -> 播放次數 (定期減半，反映最近的熱門程度)
+		self.play_total = 0
+		self.known_bytes = {} # 下載過的 video key -> 大小，用來估計要淘汰哪些影片
+		self.size = 0 # entries 的總位元組數，由 add / remove 維護 (/metrics 從其他 thread 讀取，不走訪 entries)
+		self.closing = False
+		self.hits = 0
+		self.misses = 0
+		self.bytes_saved = 0
+		self.downloads = 0
+		self.downloaded_bytes = 0
+		self.failures = 0
+		self.evictions = 0
+		self._finished.connect(self.on_finished)
+		if self.budget > 0:
+			self.load()
+
+	def load(self):
+		os.makedirs(self.path, exist_ok=True)
+		index = os.path.join(self.path, "index.json")
+		if not os.path.exists(index) and os.listdir(self.path):
+			# AIWINDOW_MEDIA_CACHE 指到既有的資料夾：不使用，也不刪除任何檔案
+			print(f"DEBUG: Media cache disabled: {self.path} is not empty and has no index.json")
+			self.budget = 0
+			return
+		if os.path.exists(index):
+			try:
+				with open(index, 'r', encoding='utf-8') as f:
+					for entry in json.load(f).get("entries", []):
+						names = [entry["video"]] + ([entry["audio"]] if entry["audio"] else [])
+						if all(os.path.exists(os.path.join(self.path, name)) for name in names):
+							self.add(entry)
+			except Exception as e:
+				print(f"Error reading media cache index: {e}")
+		# 中斷的下載與不在索引中的快取檔案；只刪除快取自己命名的檔案
+		known = {entry[name] for entry in self.entries.values() for name in ("video", "audio") if entry[name]}
+		for name in os.listdir(self.path):
+			if self.FILE_NAME.fullmatch(name) and name not in known:
+				try:
+					os.unlink(os.path.join(self.path, name))
+				except OSError:
+					pass
+		print(f"DEBUG: Media cache: {len(self.entries)} videos, {self.size / (1 << 20):.0f} MB")
+
+	def save(self):
+		try:
+			save_json_atomic(os.path.join(self.path, "index.json"), {"entries": list(self.entries.values())})
+		except Exception as e:
+			print(f"Error writing media cache index: {e}")
+
+	def add(self, entry):
+		old = self.entries.get(video_key(entry["url"]))
+		if old is not None:
+			self.size -= old["bytes"]
+		self.entries[video_key(entry["url"])] = entry
+		self.size += entry["bytes"]
+		for name in ("video", "audio"):
+			if entry[name]:
+				self.files[os.path.join(self.path, entry[name])] = entry["url"]
+
+	def remove(self, key):
+		entry = self.entries.pop(key)
+		self.size -= entry["bytes"]
+		self.delete_files(entry)
+
+	def delete_files(self, entry):
+		for name in ("video", "audio"):
+			if entry[name]:
+				path = os.path.join(self.path, entry[name])
+				self.files.pop(path, None)
+				try:
+					os.unlink(path)
+				except OSError:
+					pass
+
+	def lookup(self, url):
+		"""回傳 {"video", "audio", "title"} (本機檔案路徑)，沒有快取時回傳 None。不影響播放次數與 LRU 順序。"""
+		if self.budget <= 0:
+			return None
+		entry = self.entries.get(video_key(url))
+		if entry is None:
+			return None
+		return {
+			"video": os.path.join(self.path, entry["video"]),
+			"audio": os.path.join(self.path, entry["audio"]) if entry["audio"] else None,
+			"title": entry["title"],
+		}
+
+	def record_play(self, url):
+		"""收藏真正被播放時呼叫 (mpv 重啟還原不算)：更新播放次數與 LRU 順序，沒有快取時排入下載。"""
+		if self.budget <= 0:
+			return
+		key = video_key(url)
+		self.plays[key] += 1
+		self.play_total += 1
+		if self.play_total > 1000:
+			self.plays = collections.Counter({k: n // 2 for k, n in self.plays.items() if n > 1})
+			self.play_total = sum(self.plays.values())
+		entry = self.entries.get(key)
+		if entry is None:
+			self.misses += 1
+			self.request(url)
+			return
+		# LRU 順序只在記憶體中更新，下載、淘汰與結束時才寫回索引
+		self.entries.move_to_end(key)
+		self.hits += 1
+		self.bytes_saved += entry["bytes"]
+
+	def origin(self, path):
+		"""把 mpv 回報的本機檔案路徑換回收藏網址。"""
+		return self.files.get(path)
+
+	def set_urls(self, urls):
+		self.wanted = list(urls)
+		self.pump()
+
+	def request(self, url):
+		if url not in self.requested:
+			self.requested.append(url)
+		self.pump()
+
+	def candidates(self):
+		"""依序回傳 (url, 是否可為此淘汰其他影片)：先是播放過的，再來是尚未下載的收藏。"""
+		for url in self.requested:
+			yield url, True
+		for url in self.wanted:
+			yield url, False
+
+	def pump(self):
+		if self.closing or self.budget <= 0:
+			return
+		now = time.time()
+		for url, may_evict in list(self.candidates()):
+			if len(self.inflight) >= self.workers:
+				return
+			key = video_key(url)
+			if key in self.entries or key in self.inflight or self.retry_at.get(key, 0) > now:
+				continue
+			if not may_evict and (key in self.skipped or self.size + self.estimate(key) > self.budget):
+				continue # 預先下載只使用剩餘空間
+			if may_evict and not self.admit(key):
+				self.requested.remove(url) # 沒有比要被淘汰的影片熱門，不值得重抓
+				continue
+			info = self.streams.lookup(url)
+			if info is None:
+				continue # 等 PreResolver 解析好再下載
+			if url in self.requested:
+				self.requested.remove(url)
+			self.inflight.add(key)
+			self.executor.submit(self.download, key, info).add_done_callback(lambda f, k=key, e=may_evict: self._finished.emit(k, (f, e)))
+
+	def estimate(self, key):
+		"""下載過就用上次的大小，否則以快取中影片的平均大小估計。"""
+		if key in self.known_bytes:
+			return self.known_bytes[key]
+		return self.size / len(self.entries) if self.entries else 0
+
+	def admit(self, key):
+		"""播放次數要比為了放下它而必須淘汰的每一部影片都多，才值得下載。"""
+		need = self.size + self.estimate(key) - self.budget
+		for victim, entry in self.entries.items():
+			if need <= 0:
+				break
+			if self.plays[key] <= self.plays[victim]:
+				return False
+			need -= entry["bytes"]
+		return True
+
+	def download(self, key, info):
+		"""在下載 thread 中執行：影片與音訊各存成一個檔案，回傳索引 entry。"""
+		stem = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+		entry = {"url": info["url"], "video": None, "audio": None, "title": info.get("title"), "bytes": 0}
+		started = time.monotonic()
+		try:
+			for name in ("video", "audio"):
+				if not info.get(name):
+					continue
+				part = os.path.join(self.path, f"{stem}.{name}.part")
+				entry["bytes"] += self.downloader.fetch(info[name], part, lambda: self.closing)
+				entry[name] = f"{stem}.{name}"
+				os.replace(part, os.path.join(self.path, entry[name]))
+		except BaseException:
+			for name in ("video", "audio"):
+				for path in (os.path.join(self.path, f"{stem}.{name}.part"), os.path.join(self.path, f"{stem}.{name}")):
+					if os.path.exists(path):
+						os.unlink(path)
+			raise
+		metrics.observe("media_download_seconds", time.monotonic() - started)
+		return entry
+
+	def on_finished(self, key, result):
+		future, may_evict = result
+		self.inflight.discard(key)
+		try:
+			entry = future.result()
+		except Exception as e:
+			if not self.closing:
+				print(f"DEBUG: Media cache download failed for {key}: {e}")
+				# 串流網址可能已過期，等 PreResolver 更新後再試
+				self.failures += 1
+				self.retry_at[key] = time.time() + 600
+			self.pump()
+			return
+		self.downloads += 1
+		self.downloaded_bytes += entry["bytes"]
+		self.known_bytes[key] = entry["bytes"]
+		if entry["bytes"] > self.budget or (not may_evict and self.size + entry["bytes"] > self.budget):
+			# 比整個快取還大，或是預先下載的影片放不下：不淘汰其他影片
+			print(f"DEBUG: {entry['url']} ({entry['bytes'] / (1 << 20):.0f} MB) does not fit in the media cache")
+			self.delete_files(entry)
+			self.skipped.add(key)
+			if entry["bytes"] > self.budget:
+				self.retry_at[key] = float("inf")
+		else:
+			self.add(entry)
+			self.skipped.discard(key)
+			if not may_evict:
+				# 預先下載的影片還沒播放過，排在最久沒播放的位置
+				self.entries.move_to_end(key, last=False)
+			while self.size > self.budget:
+				victim = next(k for k in self.entries if k != key)
+				print(f"DEBUG: Media cache evicting {self.entries[victim]['url']}")
+				self.remove(victim)
+				self.skipped.add(victim)
+				self.evictions += 1
+			print(f"DEBUG: Cached {entry['url']} ({entry['bytes'] / (1 << 20):.1f} MB), {self.size / (1 << 20):.0f}/{self.budget / (1 << 20):.0f} MB used")
+			self.save()
+		self.pump()
+
+	def shutdown(self):
+		self.closing = True
+		self.executor.shutdown(wait=False, cancel_futures=True)
+		if self.budget > 0:
+			self.save()
+
+	def stats(self):
+		total = self.hits + self.misses
+		return {
+			"entries": len(self.entries),
+			"bytes": self.size,
+			"budget_bytes": self.budget,
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_rate": round(self.hits / total, 3) if total else 0.0,
+			"bytes_saved": self.bytes_saved,
+			"downloads": self.downloads,
+			"downloaded_bytes": self.downloaded_bytes,
+			"download_failures": self.failures,
+			"evictions": self.evictions,
+			"downloading": len(self.inflight),
+		}
+
+def video_key(url):
+	"""影片的標準化 ID：youtu.be/…?si=、watch?v=、shorts/… 等 YouTube 網址都對應到同一個 key。"""
+	url = url.strip()
+	try:
+		parsed = urllib.parse.urlparse(url)
+	except ValueError:
+		return url
+	host = (parsed.hostname or "").lower()
+	if host == "youtu.be" or host == "www.youtu.be":
+		video_id = parsed.path.strip("/").split("/")[0]
+		if video_id:
+			return "yt:" + video_id
+	elif host == "youtube.com" or host.endswith(".youtube.com"):
+		v = urllib.parse.parse_qs(parsed.query).get("v")
+		if v:
+			return "yt:" + v[0]
+		parts = parsed.path.strip("/").split("/")
+		if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+			return "yt:" + parts[1]
+	return url
+
+class SceneIndex:
+	"""收藏的本機場景索引：play.lst 標題與影片標題 (media-title) 的 TF-IDF。
+
+	英文以單字與字元 trigram 切分 (jazzy 也能對到 jazz)；中文、日文假名與韓文先用
+	GLOSSARY 的詞做最長匹配，其餘以字元 unigram/bigram 切分。建索引時每個收藏
+	加上 GLOSSARY 的中英對照詞，"sapporo jazz" 也能用「札幌爵士」找到。
+	分數是查詢詞 (以 idf 加權) 被收藏標題涵蓋的比例，標題長短不影響；「倫敦下雨」
+	只對到雨景時分數會被沒對到的「倫敦」拉低。數十個收藏的查詢約幾十微秒。
+	"""
+	GLOSSARY = {
+		"雨": ["rain", "rainy"], "下雨": ["rain", "rainy"], "雨天": ["rain", "rainy"], "雪": ["snow", "snowy"], "下雪": ["snow", "snowy"],
+		"海": ["sea", "ocean"], "海邊": ["beach", "seaside"], "海灘": ["beach"], "湖": ["lake"], "河": ["river"],
+		"山": ["mountain", "mountains"], "森林": ["forest"], "瀑布": ["waterfall"], "沙漠": ["desert"], "星空": ["stars", "starry"],
+		"夜": ["night"], "夜景": ["night"], "早晨": ["morning"], "早上": ["morning"], "日落": ["sunset"], "日出": ["sunrise"],
+		"城市": ["city"], "街道": ["street"], "咖啡": ["cafe", "coffee"], "咖啡廳": ["cafe", "coffee"], "咖啡館": ["cafe", "coffee"],
+		"客廳": ["living", "room"], "陽台": ["balcony"],
+		"爵士": ["jazz"], "爵士樂": ["jazz"], "吉他": ["guitar"], "鋼琴": ["piano"], "小提琴": ["violin"], "古典": ["classical"],
+		"輕音樂": ["relaxing"], "放鬆": ["relax", "relaxing"], "靜心": ["calm"], "專注": ["focus"],
+		"溫暖": ["warm"], "安靜": ["quiet"], "人聲": ["vocal"], "西班牙": ["spanish"], "宮崎駿": ["ghibli", "miyazaki"],
+		"札幌": ["sapporo"], "東京": ["tokyo"], "京都": ["kyoto"], "大阪": ["osaka"], "北海道": ["hokkaido"], "台北": ["taipei"],
+		"倫敦": ["london"], "巴黎": ["paris"], "紐約": ["new", "york"], "瑞士": ["swiss", "switzerland"], "阿爾卑斯": ["alps"],
+		"冰島": ["iceland"], "威尼斯": ["venice"], "首爾": ["seoul"], "香港": ["hong", "kong"], "夏威夷": ["hawaii"],
+	}
+	CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+	WORD = re.compile(r"[a-z0-9]+")
+	STOPWORDS = {"4k", "hd", "the", "a", "an", "of", "and", "for", "to", "in", "on", "with", "music", "video", "playlist", "window", "view"}
+	STOPCHARS = set("的之在與和")
+	EXPANSION_WEIGHT = 0.7 # 對照詞比標題原本的詞權重低
+	LONGEST = max(len(zh) for zh in GLOSSARY)
+
+	def __init__(self, threshold=SCENE_MATCH_THRESHOLD):
+		self.threshold = threshold
+		self.urls = []
+		self.postings = {} # term -> [(doc, 文件中的權重)]
+		self.idf = {}
+		self.max_idf = 1.0 # 沒有任何收藏含有的詞
+		self.reverse = {}  # 英文字 -> 中文詞
+		for zh, words in self.GLOSSARY.items():
+			for word in words:
+				self.reverse.setdefault(word, []).append(zh)
+		self.hits = 0
+		self.misses = 0
+
+	@staticmethod
+	def normalize(text):
+		text = unicodedata.normalize("NFKC", text).casefold()
+		# 去掉拉丁字母的重音 (café -> cafe)；假名與韓文不能拆解
+		return "".join(unicodedata.normalize("NFKD", c)[0] if "\u00c0" <= c <= "\u024f" else c for c in text)
+
+	@classmethod
+	def segment(cls, run):
+		"""以 GLOSSARY 的詞做正向最長匹配，其餘連續的字留成一段。"""
+		pieces = []
+		rest = ""
+		i = 0
+		while i < len(run):
+			for size in range(min(cls.LONGEST, len(run) - i), 1, -1):
+				if run[i:i + size] in cls.GLOSSARY:
+					if rest:
+						pieces.append(rest)
+						rest = ""
+					pieces.append(run[i:i + size])
+					i += size
+					break
+			else:
+				rest += run[i]
+				i += 1
+		if rest:
+			pieces.append(rest)
+		return pieces
+
+	@classmethod
+	def terms(cls, text, weight=1.0, counts=None):
+		counts = collections.Counter() if counts is None else counts
+		text = cls.normalize(text)
+		for word in cls.WORD.findall(text):
+			if word in cls.STOPWORDS:
+				continue
+			counts["w:" + word] += weight
+			if len(word) > 3 and not word.isdigit():
+				padded = f"#{word}#"
+				for i in range(len(padded) - 2):
+					counts["g:" + padded[i:i + 3]] += weight * 0.3
+		for run in cls.CJK.findall(text):
+			for piece in cls.segment(run):
+				for i, ch in enumerate(piece):
+					if ch not in cls.STOPCHARS:
+						counts["c:" + ch] += weight * 0.5
+					if i + 1 < len(piece):
+						counts["b:" + piece[i:i + 2]] += weight
+		return counts
+
+	def document_terms(self, text):
+		"""標題的詞加上 GLOSSARY 的對照詞。"""
+		norm = self.normalize(text)
+		extra = [word for zh, words in self.GLOSSARY.items() if zh in norm for word in words]
+		for word in self.WORD.findall(norm):
+			extra.extend(self.reverse.get(word, ()))
+		counts = self.terms(text)
+		if extra:
+			self.terms(" ".join(extra), self.EXPANSION_WEIGHT, counts)
+		return counts
+
+	@staticmethod
+	def damp(tf):
+		return 1 + math.log(tf) if tf >= 1 else tf
+
+	def build(self, documents):
+		"""documents: (收藏網址, [標題...]) list；收藏或標題變動時整個重建。"""
+		docs = [self.document_terms(" ".join(t for t in titles if t)) for _, titles in documents]
+		df = collections.Counter(term for counts in docs for term in counts)
+		n = len(docs)
+		self.idf = {term: math.log((n + 1) / (count + 1)) + 1 for term, count in df.items()}
+		self.max_idf = math.log(n + 1) + 1
+		self.urls = [url for url, _ in documents]
+		self.postings = {}
+		for doc, counts in enumerate(docs):
+			for term, tf in counts.items():
+				self.postings.setdefault(term, []).append((doc, self.damp(tf)))
+
+	def search(self, text, limit=3):
+		"""回傳 [(收藏網址, 分數)]，分數為查詢被涵蓋的比例 (0~1)，高的在前。"""
+		query = {term: self.damp(tf) * self.idf.get(term, self.max_idf) for term, tf in self.terms(text).items()}
+		total = sum(w * w for w in query.values())
+		if not total:
+			return []
+		covered = collections.defaultdict(float)
+		overlap = collections.defaultdict(float) # 同分時以詞頻加權的重疊程度決定
+		for term, w in query.items():
+			for doc, dw in self.postings.get(term, ()):
+				covered[doc] += w * w
+				overlap[doc] += w * dw
+		best = heapq.nsmallest(limit, covered, key=lambda doc: (-covered[doc], -overlap[doc]))
+		return [(self.urls[doc], covered[doc] / total) for doc in best]
+
+	def match(self, text):
+		"""分數達到 threshold 的最佳收藏網址，否則為 None。"""
+		found = self.search(text, 1)
+		if found and found[0][1] >= self.threshold:
+			self.hits += 1
+			return found[0][0]
+		self.misses += 1
+		return None
+
+	def stats(self):
+		total = self.hits + self.misses
+		return {"documents": len(self.urls), "terms": len(self.idf), "hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+class PlaylistStore(QObject):
+	"""play.lst 的記憶體索引。
+
+	檔案只解析一次，以 video_key() 建立 hash index，成員查詢與隨機挑選都是 O(1)。
+	更新一律寫到暫存檔再 rename；檔案在外部被修改時由 QFileSystemWatcher 通知，
+	只是尾端新增內容時只解析新增的部分。
+	"""
+	changed = pyqtSignal()
+
+	def __init__(self, path=PLAYLIST_PATH, parent=None):
+		super().__init__(parent)
+		self.path = path
+		self.lines = []     # 檔案原始內容 (不含換行)，改寫時保留註解與空行
+		self.index = {}     # video key -> (url, title)
+		self.keys = []      # 供 O(1) 隨機挑選
+		self.signature = None
+		self.load()
+		self.watcher = QFileSystemWatcher(self)
+		self.watcher.fileChanged.connect(self.on_file_changed)
+		self.watch()
+
+	def watch(self):
+		if os.path.exists(self.path) and self.path not in self.watcher.files():
+			self.watcher.addPath(self.path)
+
+	def _stat(self):
+		try:
+			st = os.stat(self.path)
+			return (st.st_ino, st.st_size, st.st_mtime_ns)
+		except OSError:
+			return None
+
+	def _read_from(self, offset):
+		with open(self.path, 'rb') as f:
+			f.seek(offset)
+			return f.read().decode('utf-8', errors='replace')
+
+	def load(self):
+		"""完整重新解析 play.lst。"""
+		self.signature = self._stat()
+		try:
+			self.lines = self._read_from(0).splitlines() if self.signature else []
+		except Exception as e:
+			print(f"Error reading play.lst: {e}")
+			self.lines = []
+		self.index = {}
+		self.keys = []
+		self._index_lines(0)
+		print(f"DEBUG: Loaded {len(self.keys)} favorites from play.lst")
+
+	def _index_lines(self, start):
+		title = None
+		for i in range(start, len(self.lines)):
+			line = self.lines[i].strip()
+			if not line:
+				continue
+			if line.startswith('#'):
+				title = line.lstrip('#').strip()
+				continue
+			key = video_key(line)
+			if key not in self.index:
+				self.index[key] = (line, title)
+				self.keys.append(key)
+			title = None
+
+	def on_file_changed(self, path):
+		# rename 之後 watcher 會失去這個檔案，需重新加入
+		self.watch()
+		old = self.signature
+		new = self._stat()
+		if new == old:
+			return # 自己寫入造成的通知
+		if old and new and new[0] == old[0] and new[1] > old[1] and (not self.lines or self._read_from(old[1] - 1)[:1] == "\n"):
+			# 只在尾端新增了內容：只解析新增的行
+			self.signature = new
+			start = len(self.lines)
+			self.lines.extend(self._read_from(old[1]).splitlines())
+			self._index_lines(start)
+			print(f"DEBUG: play.lst appended, {len(self.keys)} favorites")
+		else:
+			self.load()
+		self.changed.emit()
+
+	def _write(self):
+		tmp = f"{self.path}.tmp"
+		with open(tmp, 'w', encoding='utf-8') as f:
+			f.write("\n".join(self.lines) + "\n")
+		os.replace(tmp, self.path)
+		self.signature = self._stat()
+		self.watch()
+
+	def __contains__(self, url):
+		return bool(url) and video_key(url) in self.index
+
+	def __len__(self):
+		return len(self.keys)
+
+	def urls(self):
+		return [self.index[key][0] for key in self.keys]
+
+	def title(self, url):
+		entry = self.index.get(video_key(url))
+		return entry[1] if entry else None
+
+	def random_url(self):
+		if not self.keys:
+			return None
+		return self.index[random.choice(self.keys)][0]
+
+	def add(self, url, title):
+		"""Add a URL and its title to play.lst."""
+		url = url.strip()
+		key = video_key(url)
+		if key in self.index:
+			return True
+		try:
+			self.lines.extend(["", f"# {title}", url])
+			self._write()
+		except Exception as e:
+			print(f"Error adding to playlist: {e}")
+			self.load()
+			return False
+		self.index[key] = (url, title)
+		self.keys.append(key)
+		self.changed.emit()
+		return True
+
+	def remove(self, url):
+		"""Remove a URL (any form of the same video) and its preceding title comment from play.lst."""
+		key = video_key(url)
+		if key not in self.index:
+			return False
+		lines = self.lines
+		to_remove = set()
+		for i, line in enumerate(lines):
+			line = line.strip()
+			if not line or line.startswith('#') or video_key(line) != key:
+				continue
+			to_remove.add(i)
+			# Check upwards for title
+			j = i - 1
+			while j >= 0 and not lines[j].strip():
+				j -= 1
+			if j >= 0 and lines[j].strip().startswith('#'):
+				# Found a title, remove it and the blank lines in between
+				for k in range(j, i):
+					to_remove.add(k)
+				# Also remove one blank line above the title if it exists
+				if j > 0 and not lines[j - 1].strip():
+					to_remove.add(j - 1)
+		try:
+			self.lines = [l for i, l in enumerate(lines) if i not in to_remove]
+			self._write()
+		except Exception as e:
+			print(f"Error removing from playlist: {e}")
+			self.load()
+			return False
+		self.index = {}
+		self.keys = []
+		self._index_lines(0)
+		self.changed.emit()
+		return True
+
+class CommandServer(QThread):
+	"""LAN (9997) 與 HTTP (9998) 指令伺服器。
+
+	單一 asyncio event loop 同時服務多條連線，不再逐一 accept/recv，也不靠逾時輪詢結束。
+	LAN 埠：一條連線可連續送多個 JSON 物件 (換行分隔)，依序各回覆一行 ack：
+	  {"command": [...]}          -> {"status": "success", "data": ...}
+	  {"commands": [[...], ...]}  -> {"status": "success", "results": [...]}
+	訊息帶 "target" (播放器、群組或其 list，見 PlayerRegistry) 時廣播到各播放器，
+	ack 改為 {"status": ..., "nodes": {播放器: 上述的單一/批次 ack}}。
+	HTTP 埠：HTTP/1.1 keep-alive，POST /mpv、POST /mpv/batch、GET /metrics。
+	直接送 JSON 而非 HTTP 請求的連線 (例如 DropToMPV.bat) 會當作 LAN 串流處理。
+	指令交給 GUI thread 執行，同一批指令一次寫入 mpv IPC，ack 帶回 mpv 的回覆。
+	"""
+	commands_received = pyqtSignal(list, object, object) # 指令 list、target，以及 GUI 端填入 mpv Future list (廣播時為 {播放器: list}) 的 Future
+	HTTP_STATUS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 411: "Length Required", 413: "Payload Too Large", 502: "Bad Gateway"}
+
+	def __init__(self, lan_port=LAN_PORT, http_port=HTTP_PORT, host='0.0.0.0', parent=None):
+		super().__init__(parent)
+		self.host = host
+		self.lan_port = lan_port
+		self.http_port = http_port
+		self.ports = {} # "lan"/"http" -> 實際綁定的埠 (port 0 時由系統分配)
+		self.running = True
+		self.loop = None
+		self.stop_event = None
+		self.ready = threading.Event()
+		self.clients = set()
+		self.json_decoder = json.JSONDecoder()
+
+	def run(self):
+		asyncio.run(self.serve())
+
+	def stop(self):
+		self.running = False
+		loop = self.loop
+		if loop is not None:
+			try:
+				loop.call_soon_threadsafe(self.stop_event.set)
+			except RuntimeError:
+				pass # event loop 已關閉
+
+	async def serve(self):
+		self.stop_event = asyncio.Event()
+		self.loop = asyncio.get_running_loop()
+		servers = []
+		for name, port, handler in (("lan", self.lan_port, self.handle_lan), ("http", self.http_port, self.handle_http)):
+			try:
+				server = await asyncio.start_server(handler, self.host, port, reuse_address=True, limit=MAX_REQUEST_BYTES)
+			except OSError as e:
+				print(f"DEBUG: {name.upper()} command server failed to start on port {port}: {e}")
+				continue
+			servers.append(server)
+			self.ports[name] = server.sockets[0].getsockname()[1]
+			print(f"DEBUG: {name.upper()} command server started on port {self.ports[name]}")
+		self.ready.set()
+		if self.running:
+			await self.stop_event.wait()
+		for server in servers:
+			server.close()
+		# 關閉仍在服務中的連線
+		for task in list(self.clients):
+			task.cancel()
+		await asyncio.gather(*self.clients, return_exceptions=True)
+		for server in servers:
+			await server.wait_closed()
+		print("DEBUG: Command server stopped.")
+
+	async def handle_lan(self, reader, writer):
+		await self.serve_client(self.lan_stream(reader, writer, b""), writer)
+
+	async def handle_http(self, reader, writer):
+		await self.serve_client(self.http_stream(reader, writer), writer)
+
+	async def serve_client(self, coro, writer):
+		task = asyncio.current_task()
+		self.clients.add(task)
+		try:
+			await coro
+		except (ConnectionError, asyncio.IncompleteReadError):
+			pass
+		except asyncio.CancelledError:
+			pass
+		except Exception as e:
+			print(f"DEBUG: Command server client error: {e}")
+		finally:
+			self.clients.discard(task)
+			writer.close()
 
-				await asyncio.gather(sender(), receiver())
-				
+	def submit(self, cmd_lists, target=None):
+		"""把指令交給 GUI thread；回傳的 Future 會被設為各指令對應的 mpv Future list。"""
+		done = concurrent.futures.Future()
+		self.commands_received.emit(cmd_lists, target, done)
+		return done
+
+	async def collect(self, done, transport):
+		"""等待 GUI 與 mpv 回覆，回傳每個指令的 ack dict。"""
+		started = time.monotonic()
+		deadline = started + COMMAND_ACK_TIMEOUT
+		try:
+			# 以 asyncio.wait 等待，逾時也不取消 mpv 端的 Future
+			finished, _ = await asyncio.wait([asyncio.wrap_future(done)], timeout=COMMAND_ACK_TIMEOUT)
+			if not finished:
+				raise TimeoutError("timeout")
+			futures = done.result()
+			# 廣播時為 {播放器: Future list}，所有播放器共用同一個期限，逾時的節點各自回報
+			nodes = futures if isinstance(futures, dict) else {None: futures}
+			wrapped = {name: [asyncio.wrap_future(f) for f in fs] for name, fs in nodes.items()}
+			pending = [f for fs in wrapped.values() for f in fs]
+			if pending:
+				await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()))
 		except Exception as e:
-			if self.running:
-				self.status_changed.emit(f"連線錯誤: {e}")
-				print(f"Live Session Error: {e}")
-			else:
-				print("\nDEBUG: Live session closed gracefully.")
+			return None, {"status": "error", "error": str(e) or type(e).__name__}
+		results = {}
+		for name, fs in wrapped.items():
+			results[name] = []
+			for f in fs:
+				if not f.done():
+					results[name].append({"status": "error", "error": "timeout"})
+				elif f.exception() is not None:
+					results[name].append({"status": "error", "error": str(f.exception())})
+				else:
+					results[name].append({"status": "success", "data": f.result()})
+		metrics.observe("remote_command_seconds", time.monotonic() - started, transport=transport)
+		return (results if isinstance(futures, dict) else results[None]), None
 
-class SearchWorker(QThread):
-	finished = pyqtSignal(str) # 改回傳 URL，或者 None
+	def parse_payload(self, payload):
+		"""回傳 (指令 list, 是否為批次)；格式錯誤時丟出 ValueError。"""
+		if isinstance(payload, dict) and "command" in payload:
+			cmd_lists, batch = [payload["command"]], False
+		elif isinstance(payload, dict) and "commands" in payload:
+			cmd_lists, batch = payload["commands"], True
+		elif isinstance(payload, list):
+			cmd_lists, batch = payload, True
+		else:
+			raise ValueError("expected {\"command\": [...]} or {\"commands\": [[...], ...]}")
+		if not isinstance(cmd_lists, list) or not all(isinstance(c, list) and c for c in cmd_lists):
+			raise ValueError("each command must be a non-empty list")
+		return cmd_lists, batch
 
-	def __init__(self, keyword):
-		super().__init__()
-		self.keyword = keyword
+	def parse_target(self, payload):
+		target = payload.get("target") if isinstance(payload, dict) else None
+		if target is not None and not (isinstance(target, str) or (isinstance(target, list) and all(isinstance(t, str) for t in target))):
+			raise ValueError("target must be a player/group name or a list of them")
+		return target
 
-	def run(self):
-		print(f"\nDEBUG: 開始搜尋 {self.keyword} 的 YouTube 影片...")
+	def reply_for(self, results, batch):
+		if batch:
+			ok = all(r["status"] == "success" for r in results)
+			return {"status": "success" if ok else "error", "results": results}
+		return results[0]
+
+	async def ack(self, payload, done, batch, transport):
+		results, error = await self.collect(done, transport)
+		if error:
+			reply = error
+		elif isinstance(results, dict):
+			nodes = {name: self.reply_for(r, batch) for name, r in results.items()}
+			ok = all(node["status"] == "success" for node in nodes.values())
+			reply = {"status": "success" if ok else "error", "nodes": nodes}
+		else:
+			reply = self.reply_for(results, batch)
+		if isinstance(payload, dict) and "id" in payload:
+			reply["id"] = payload["id"]
+		return reply
+
+	async def lan_stream(self, reader, writer, prefix):
+		acks = asyncio.Queue()
+
+		async def write_acks():
+			# 依收到的順序回覆，但後面的指令不必等前面的 ack 才送給 mpv
+			while True:
+				pending = await acks.get()
+				if pending is None:
+					break
+				writer.write(json.dumps(await pending).encode('utf-8') + b'\n')
+				await writer.drain()
+
+		def dispatch(payload):
+			try:
+				cmd_lists, batch = self.parse_payload(payload)
+				target = self.parse_target(payload)
+			except ValueError as e:
+				error = asyncio.get_running_loop().create_future()
+				error.set_result({"status": "error", "error": str(e)})
+				acks.put_nowait(error)
+				return
+			print(f"DEBUG: Received LAN commands: {cmd_lists}")
+			done = self.submit(cmd_lists, target)
+			acks.put_nowait(asyncio.ensure_future(self.ack(payload, done, batch, "lan")))
+
+		writer_task = asyncio.ensure_future(write_acks())
+		decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+		buf = decoder.decode(prefix)
 		try:
-			# 限制搜尋結果為 1 個，且加上 4K 關鍵字增加品質
-			# 使用 --no-warnings 避免將警告訊息當作 ID 抓取
-			cmd = ["yt-dlp", "--no-warnings", "-f", "best[height<=1080][vcodec^=avc]", f"ytsearch1:{self.keyword}", "--get-id"]
-			# 不使用 stderr=subprocess.STDOUT，避免捕捉錯誤訊息
-			video_id = subprocess.check_output(cmd).decode().strip()
-			if video_id:
-				print(f"\nDEBUG: 找到影片 ID: " + f"https://www.youtube.com/watch?v={video_id}")
-				self.finished.emit(f"https://www.youtube.com/watch?v={video_id}")
-			else:
-				print(f"\nDEBUG: 沒有找到影片，關鍵字: {self.keyword}")
-				self.finished.emit("")
-		except Exception as e:
-			print(f"搜尋失敗: {e}")
-			self.finished.emit("")
+			eof = False
+			while not eof:
+				data = await reader.read(65536)
+				eof = not data
+				buf += decoder.decode(data, final=eof)
+				# 一次可能收到多個、或不完整的 JSON 物件
+				while True:
+					buf = buf.lstrip()
+					if not buf:
+						break
+					try:
+						payload, end = self.json_decoder.raw_decode(buf)
+					except ValueError:
+						nl = buf.find('\n')
+						if nl < 0 and not eof and len(buf) < MAX_REQUEST_BYTES:
+							break # 等待更多資料
+						# 整行無法解析
+						line, buf = (buf, "") if nl < 0 else (buf[:nl], buf[nl + 1:])
+						print(f"DEBUG: LAN invalid message: {line[:200]!r}")
+						dispatch(None)
+						continue
+					buf = buf[end:]
+					dispatch(payload)
+			# 對方關閉寫入端：送完剩下的 ack 再關閉連線
+			acks.put_nowait(None)
+			await writer_task
+		finally:
+			writer_task.cancel()
+
+	async def http_stream(self, reader, writer):
+		first = await reader.read(1)
+		if first == b'{':
+			await self.lan_stream(reader, writer, first)
+			return
+		prefix = first
+		while self.running:
+			try:
+				head = prefix + await reader.readuntil(b"\r\n\r\n")
+			except asyncio.IncompleteReadError:
+				return # 對方關閉了 keep-alive 連線
+			except asyncio.LimitOverrunError:
+				await self.respond(writer, 413, {"status": "error", "error": "headers too large"}, False)
+				return
+			prefix = b""
+			lines = head.decode('latin-1').split("\r\n")
+			try:
+				method, target, version = lines[0].split(" ", 2)
+			except ValueError:
+				await self.respond(writer, 400, {"status": "error", "error": "bad request line"}, False)
+				return
+			headers = {}
+			for line in lines[1:]:
+				if ":" in line:
+					key, value = line.split(":", 1)
+					headers[key.strip().lower()] = value.strip()
+			connection = headers.get("connection", "").lower()
+			keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+			if "chunked" in headers.get("transfer-encoding", "").lower():
+				await self.respond(writer, 411, {"status": "error", "error": "Content-Length required"}, False)
+				return
+			try:
+				length = int(headers.get("content-length") or 0)
+				if length < 0:
+					raise ValueError(length)
+			except ValueError:
+				await self.respond(writer, 400, {"status": "error", "error": "bad Content-Length"}, False)
+				return
+			if length > MAX_REQUEST_BYTES:
+				await self.respond(writer, 413, {"status": "error", "error": "body too large"}, False)
+				return
+			body = await reader.readexactly(length) if length else b""
+			status, reply, content_type = await self.route(method, target, body)
+			await self.respond(writer, status, reply, keep_alive, content_type)
+			if not keep_alive:
+				return
+
+	async def route(self, method, target, body):
+		url = urllib.parse.urlparse(target)
+		if method == "OPTIONS":
+			return 204, None, None
+		if method == "GET" and url.path == "/metrics":
+			# 預設 Prometheus 文字格式，?format=json 則回傳 JSON
+			if urllib.parse.parse_qs(url.query).get("format") == ["json"]:
+				return 200, metrics.snapshot(), None
+			return 200, metrics.prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+		if method == "POST" and url.path in ("/mpv", "/mpv/batch"):
+			try:
+				payload = json.loads(body.decode('utf-8'))
+				cmd_lists, batch = self.parse_payload(payload)
+				target = self.parse_target(payload)
+				if batch != (url.path == "/mpv/batch"):
+					raise ValueError("use /mpv for a single command and /mpv/batch for a list")
+			except ValueError as e:
+				return 400, {"status": "error", "error": str(e)}, None
+			print(f"DEBUG: Received HTTP commands: {cmd_lists}")
+			reply = await self.ack(payload, self.submit(cmd_lists, target), batch, "http")
+			return (200 if reply["status"] == "success" else 502), reply, None
+		return 404, {"status": "error", "error": "not found"}, None
+
+	async def respond(self, writer, status, reply, keep_alive, content_type=None):
+		if reply is None:
+			body = b""
+		elif content_type:
+			body = reply.encode('utf-8')
+		else:
+			body = json.dumps(reply).encode('utf-8')
+			content_type = "application/json"
+		head = [
+			f"HTTP/1.1 {status} {self.HTTP_STATUS.get(status, '')}",
+			"Access-Control-Allow-Origin: *",
+			"Access-Control-Allow-Methods: GET, POST, OPTIONS",
+			"Access-Control-Allow-Headers: Content-Type",
+			f"Content-Length: {len(body)}",
+			f"Connection: {'keep-alive' if keep_alive else 'close'}",
+		]
+		if content_type:
+			head.append(f"Content-Type: {content_type}")
+		writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+		await writer.drain()
+
+class MPVError(Exception):
+	"""MPV 回覆了非 success 的錯誤，或 IPC 連線在回覆前中斷。"""
+	pass
+
+class MPVClient(QThread):
+	"""長駐的 MPV JSON IPC 連線。
 
-class LANListener(QThread):
-	command_received = pyqtSignal(list)
+	每個指令都帶 mpv 的 request_id 送出，可同時有多筆在途中 (pipelining)；
+	回覆透過 Future 或 callback (在 GUI thread 執行) 取得，呼叫端不必等 socket 來回。
+	指令先放進 outbox，由 writer thread 寫入 socket，慢速或卡住的對端不會卡住 GUI thread。
+	mpv 重啟時會自動重連，斷線期間送出的指令留在 outbox，連上後依序補送。
+	"""
+	event_received = pyqtSignal(dict)
+	connection_changed = pyqtSignal(bool)
+	_reply_ready = pyqtSignal(object, object)
 
-	def __init__(self, parent=None):
+	REQUEST_KEY = "request_id" # 回覆中對應請求的欄位
+
+	def __init__(self, path=IPC_SOCKET, parent=None):
 		super().__init__(parent)
+		self.path = path
 		self.running = True
+		self.sock = None
+		self.lock = threading.Lock()
+		self.outbox_ready = threading.Condition(self.lock) # outbox 有資料或連線建立時喚醒 writer
+		self.wake_event = threading.Event()   # 立即重試連線 (mpv 剛重啟或 stop)
+		self.request_ids = itertools.count(1)
+		self.pending = {}                     # request_id -> Future
+		self.outbox = collections.deque()     # (request_id, line) 等待連線後送出
+		self._reply_ready.connect(self._dispatch_reply)
 
-	def run(self):
-		server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-		server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	@property
+	def connected(self):
+		return self.sock is not None
+
+	def command(self, cmd_list, callback=None):
+		"""送出指令並立即返回 Future；callback(data) 會在 GUI thread 被呼叫，失敗時 data 為 None。"""
+		return self.commands([cmd_list], callback)[0]
+
+	def commands(self, cmd_lists, callback=None):
+		"""一次送出多筆指令 (writer thread 以單次 write 送出)，回傳對應的 Future list。"""
+		futures = []
+		with self.lock:
+			for cmd_list in cmd_lists:
+				request_id = next(self.request_ids)
+				future = concurrent.futures.Future()
+				self.pending[request_id] = future
+				futures.append(future)
+				self.outbox.append((request_id, json.dumps({"command": cmd_list, self.REQUEST_KEY: request_id}).encode('utf-8') + b'\n'))
+			self.outbox_ready.notify()
+		if callback:
+			for future in futures:
+				future.add_done_callback(lambda f: self._reply_ready.emit(callback, f))
+		return futures
+
+	def _dispatch_reply(self, callback, future):
 		try:
-			server_socket.bind(('0.0.0.0', 9997))
-			server_socket.listen(5)
-			server_socket.settimeout(1.0)
-			print("DEBUG: LAN Listener started on port 9997")
+			data = future.result()
 		except Exception as e:
-			print(f"DEBUG: LAN Listener failed to start: {e}")
-			return
+			print(f"IPC Command Error: {e}")
+			data = None
+		callback(data)
+
+	def open_socket(self):
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		try:
+			sock.connect(self.path)
+		except OSError:
+			sock.close()
+			raise
+		return sock
 
+	def reply_error(self, msg):
+		"""回覆成功時為 None，否則為錯誤訊息。"""
+		return None if msg.get("error") == "success" else msg.get("error")
+
+	def run(self):
+		threading.Thread(target=self._write_loop, name=f"ipc-writer {self.path}", daemon=True).start()
+		delay = 0.1
 		while self.running:
 			try:
-				client_conn, addr = server_socket.accept()
-				data = client_conn.recv(4096)
-				if data:
-					try:
-						msg = data.decode('utf-8').strip()
-						print(f"DEBUG: Received LAN message: {msg}")
-						payload = json.loads(msg)
-						if "command" in payload:
-							self.command_received.emit(payload["command"])
-					except Exception as e:
-						print(f"DEBUG: LAN Listener error processing message: {e}")
-				client_conn.close()
-			except socket.timeout:
+				sock = self.open_socket()
+			except OSError:
+				if self.wake_event.wait(delay):
+					# 被 wake() 叫醒：立即重試，之後從短間隔重新退避
+					self.wake_event.clear()
+					delay = 0.025
+					continue
+				delay = min(delay * 2, 2.0)
 				continue
-			except Exception as e:
-				if self.running:
-					print(f"DEBUG: LAN Listener loop error: {e}")
+			delay = 0.1
+
+			with self.lock:
+				# 斷線期間累積的指令由 writer 依序補送
+				self.sock = sock
+				self.outbox_ready.notify()
+			print(f"DEBUG: MPV IPC connected ({self.path})")
+			self.connection_changed.emit(True)
+
+			self._read_loop(sock)
+
+			with self.lock:
+				self.sock = None
+				queued = {request_id for request_id, _ in self.outbox}
+				lost = [self.pending.pop(rid) for rid in list(self.pending) if rid not in queued]
+			sock.close()
+			for future in lost:
+				future.set_exception(MPVError("mpv IPC connection lost"))
+			if self.running:
+				print(f"DEBUG: MPV IPC disconnected ({self.path}), reconnecting...")
+			self.connection_changed.emit(False)
+
+	def _write_loop(self):
+		failed = None # 寫入失敗的連線，等 reader 換成新的連線再送
+		while True:
+			with self.lock:
+				while self.running and (self.sock is None or self.sock is failed or not self.outbox):
+					self.outbox_ready.wait()
+				if not self.running:
+					return
+				sock = self.sock
+				batch = list(self.outbox)
+				self.outbox.clear()
+			try:
+				sock.sendall(b"".join(line for _, line in batch))
+			except OSError as e:
+				print(f"IPC Error: {e}")
+				failed = sock
+				with self.lock:
+					# 還沒被判定遺失的指令放回 outbox 最前面，重連後補送
+					self.outbox.extendleft(reversed([item for item in batch if item[0] in self.pending]))
+					if self.sock is sock:
+						try:
+							sock.shutdown(socket.SHUT_RDWR) # 讓 reader 結束這條連線並重連
+						except OSError:
+							pass
+
+	def _read_loop(self, sock):
+		buf = bytearray()
+		while self.running:
+			try:
+				data = sock.recv(65536)
+			except OSError:
 				break
-		server_socket.close()
-		print("DEBUG: LAN Listener stopped.")
+			if not data:
+				break
+			buf.extend(data)
+			while True:
+				nl = buf.find(b'\n')
+				if nl < 0:
+					break
+				line = bytes(buf[:nl])
+				del buf[:nl + 1]
+				if line.strip():
+					self._handle_line(line)
+
+	def _handle_line(self, line):
+		try:
+			msg = json.loads(line.decode('utf-8'))
+		except ValueError as e:
+			print(f"IPC Parse Error: {e}")
+			return
+		if "event" in msg:
+			self.event_received.emit(msg)
+			return
+		with self.lock:
+			future = self.pending.pop(msg.get(self.REQUEST_KEY), None)
+		if future is None:
+			return
+		error = self.reply_error(msg)
+		if error is None:
+			future.set_result(msg.get("data"))
+		else:
+			future.set_exception(MPVError(error))
+
+	def wake(self):
+		"""mpv 剛啟動：縮短重連等待，socket 一出現就連上。"""
+		self.wake_event.set()
 
 	def stop(self):
 		self.running = False
+		self.wake_event.set()
+		with self.lock:
+			self.outbox_ready.notify()
+			if self.sock is not None:
+				try:
+					self.sock.shutdown(socket.SHUT_RDWR)
+				except OSError:
+					pass
 
-class MPVRequestHandler(BaseHTTPRequestHandler):
-	def _set_cors_headers(self):
-		self.send_header('Access-Control-Allow-Origin', '*')
-		self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-		self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-
-	def do_OPTIONS(self):
-		self.send_response(204)
-		self._set_cors_headers()
-		self.end_headers()
-
-	def do_POST(self):
-		if self.path == '/mpv':
-			content_length = int(self.headers['Content-Length'])
-			post_data = self.rfile.read(content_length)
-			try:
-				payload = json.loads(post_data.decode('utf-8'))
-				if "command" in payload:
-					self.server.listener.command_received.emit(payload["command"])
-
-				self.send_response(200)
-				self._set_cors_headers()
-				self.send_header('Content-Type', 'application/json')
-				self.end_headers()
-				self.wfile.write(json.dumps({"status": "success"}).encode('utf-8'))
-			except Exception as e:
-				self.send_response(400)
-				self._set_cors_headers()
-				self.end_headers()
-				self.wfile.write(str(e).encode('utf-8'))
+class RemotePlayerClient(MPVClient):
+	"""另一台 AI Window 的 LAN 指令埠 (9997)，介面與 MPVClient 相同。
+
+	每個指令以 {"command": [...], "id": n} 送出，對方依序回覆帶同一個 id 的 ack，
+	因此同樣可以 pipeline；loadfile 由對方展開 (預先解析的串流、愛心狀態)。
+	"""
+	REQUEST_KEY = "id"
+
+	def __init__(self, host, port=LAN_PORT, parent=None):
+		super().__init__(f"{host}:{port}", parent)
+		self.host = host
+		self.port = port
+
+	def open_socket(self):
+		sock = socket.create_connection((self.host, self.port), timeout=PLAYER_CONNECT_TIMEOUT)
+		sock.settimeout(None)
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		return sock
+
+	def reply_error(self, msg):
+		return None if msg.get("status") == "success" else (msg.get("error") or "error")
+
+class MPVState(QObject):
+	"""以 observe_property 與事件流維護的 mpv 狀態鏡像。
+
+	path、media-title、volume、pause、idle-active 隨時保持最新，讀取不需任何 IPC；
+	狀態改變時由 mpv 主動推送並轉成 Qt 訊號。
+	"""
+	path_changed = pyqtSignal(str)
+	idle_changed = pyqtSignal(bool)
+	file_loaded = pyqtSignal()
+	end_file = pyqtSignal(str)
+	playback_restart = pyqtSignal()
+
+	OBSERVED = ["path", "media-title", "volume", "pause", "idle-active"]
+
+	def __init__(self, client, parent=None):
+		super().__init__(parent)
+		self.client = client
+		self.path = None
+		self.media_title = None
+		self.volume = None
+		self.pause = None
+		self.idle = None
+		client.connection_changed.connect(self.on_connection_changed)
+		client.event_received.connect(self.on_event)
+
+	def on_connection_changed(self, connected):
+		if connected:
+			# 每次 (重新) 連線都要重新註冊，observe_property 只對該連線有效
+			self.client.commands([["observe_property", i + 1, name] for i, name in enumerate(self.OBSERVED)])
+
+	def on_event(self, msg):
+		event = msg.get("event")
+		if event == "property-change":
+			name = msg.get("name")
+			data = msg.get("data")
+			if name == "path":
+				self.path = data
+				if data:
+					self.path_changed.emit(data)
+			elif name == "media-title":
+				self.media_title = data
+			elif name == "volume":
+				self.volume = data
+			elif name == "pause":
+				self.pause = data
+			elif name == "idle-active":
+				if data is not None and data != self.idle:
+					self.idle = data
+					self.idle_changed.emit(data)
+		elif event == "file-loaded":
+			self.file_loaded.emit()
+		elif event == "end-file":
+			self.end_file.emit(msg.get("reason") or "")
+		elif event == "playback-restart":
+			self.playback_restart.emit()
+
+class MPVSupervisor(QObject):
+	"""由 AIWindow 擁有的 mpv 子行程 (QProcess)。
+
+	IPC_SOCKET 上已有 mpv 回應時直接沿用，否則自行以 MPV_COMMAND 啟動。是否就緒以
+	IPC 握手 (get_property mpv-version 成功) 判斷，而不是 socket 檔是否存在。
+	mpv 異常結束或連線中斷時以退避時間重啟；斷線當下就把 restore() 回傳的指令
+	(音量、上一個影片) 放進 MPVClient 的待送佇列，重啟期間的新指令排在後面，一起補送。
+	"""
+	ready_changed = pyqtSignal(bool)
+
+	STABLE_SECONDS = 60 # 跑超過此秒數才結束的話，下次重啟從初始退避時間開始
+
+	def __init__(self, client, state, restore=None, command=MPV_COMMAND, path=IPC_SOCKET, parent=None):
+		super().__init__(parent)
+		self.client = client
+		self.state = state
+		self.restore = restore
+		self.command = command
+		self.path = path
+		self.process = None
+		self.started_at = None
+		self.ready = False
+		self.stopping = False
+		self.restoring = False # 還原的影片尚未載入完成，期間不觸發 idle 自動播放
+		self.crashed_at = None
+		self.backoff = MPV_RESTART_BACKOFF[0]
+		self.restarts = 0
+		self.restart_timer = QTimer(self)
+		self.restart_timer.setSingleShot(True)
+		self.restart_timer.timeout.connect(self.spawn)
+		self.ready_timer = QTimer(self)
+		self.ready_timer.setSingleShot(True)
+		self.ready_timer.setInterval(MPV_READY_TIMEOUT * 1000)
+		self.ready_timer.timeout.connect(self.on_ready_timeout)
+		client.connection_changed.connect(self.on_connection_changed)
+		state.file_loaded.connect(self.on_file_loaded)
+		state.idle_changed.connect(self.on_idle_changed)
+		state.end_file.connect(self.on_end_file)
+
+	def socket_alive(self):
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		try:
+			sock.connect(self.path)
+			return True
+		except OSError:
+			return False
+		finally:
+			sock.close()
+
+	def start(self):
+		if self.socket_alive():
+			print(f"DEBUG: Using the mpv already listening on {self.path}")
+			return
+		self.spawn()
+
+	def spawn(self):
+		if self.stopping or self.process is not None:
+			return
+		if os.path.exists(self.path) and not self.socket_alive():
+			os.unlink(self.path) # 上一個 mpv 留下的 socket 檔
+		print(f"DEBUG: Starting mpv: {' '.join(self.command)}")
+		self.process = QProcess(self)
+		self.process.setProcessChannelMode(QProcess.ProcessChannelMode.ForwardedChannels)
+		self.process.finished.connect(self.on_finished)
+		self.process.errorOccurred.connect(self.on_error)
+		self.process.setProgram(self.command[0])
+		self.process.setArguments(self.command[1:])
+		self.started_at = time.monotonic()
+		self.process.start()
+		self.ready_timer.start()
+		self.client.wake()
+
+	def on_connection_changed(self, connected):
+		if connected:
+			self.client.command(["get_property", "mpv-version"], self.on_handshake)
+			return
+		if not self.ready or self.stopping:
+			return
+		self.ready = False
+		self.crashed_at = time.monotonic()
+		self.ready_changed.emit(False)
+		commands = self.restore() if self.restore else None
+		if commands:
+			self.restoring = any(cmd[0] == "loadfile" for cmd in commands)
+			self.client.commands(commands)
+		if self.process is None:
+			# 沿用的外部 mpv 消失了：改由自己啟動
+			self.schedule_restart()
+		elif not self.stopping:
+			self.ready_timer.start() # 行程還在但 IPC 斷了：逾時仍未恢復就重啟
+
+	def on_handshake(self, version):
+		if version is None or self.ready:
+			return # 握手途中又斷線，等下一次連線
+		self.ready = True
+		self.ready_timer.stop()
+		if self.crashed_at is not None:
+			downtime = time.monotonic() - self.crashed_at
+			self.crashed_at = None
+			metrics.observe("mpv_restart_seconds", downtime)
+			print(f"DEBUG: mpv ready again after {downtime:.2f}s")
 		else:
-			self.send_response(404)
-			self.end_headers()
+			print(f"DEBUG: mpv ready ({version})")
+		self.ready_changed.emit(True)
 
-	def log_message(self, format, *args):
-		# Suppress default logging to stderr
-		pass
+	def on_ready_timeout(self):
+		if not self.ready and self.process is not None:
+			print(f"DEBUG: mpv did not answer IPC within {MPV_READY_TIMEOUT}s, killing it")
+			self.process.kill()
+
+	def on_file_loaded(self):
+		self.restoring = False
+
+	def on_idle_changed(self, idle):
+		if not idle:
+			self.restoring = False
+
+	def on_end_file(self, reason):
+		if reason == "error":
+			self.restoring = False # 還原的影片載入失敗，交回 idle 自動播放
+
+	def on_error(self, error):
+		if error == QProcess.ProcessError.FailedToStart:
+			# 啟動失敗時不會有 finished 訊號
+			print(f"DEBUG: mpv failed to start: {self.process.errorString()}")
+			self.on_finished(-1, QProcess.ExitStatus.CrashExit)
+
+	def on_finished(self, exit_code, exit_status):
+		process, self.process = self.process, None
+		if process is None:
+			return
+		process.deleteLater()
+		self.ready_timer.stop()
+		if self.stopping:
+			return
+		print(f"DEBUG: mpv exited (code {exit_code}, {exit_status.name}), restarting...")
+		if time.monotonic() - self.started_at > self.STABLE_SECONDS:
+			self.backoff = MPV_RESTART_BACKOFF[0]
+		if self.crashed_at is None:
+			self.crashed_at = time.monotonic()
+		self.schedule_restart()
 
-class HTTPListener(QThread):
-	command_received = pyqtSignal(list)
+	def schedule_restart(self):
+		if self.stopping or self.process is not None or self.restart_timer.isActive():
+			return
+		self.restarts += 1
+		self.restart_timer.start(int(self.backoff * 1000))
+		self.backoff = min(self.backoff * 2, MPV_RESTART_BACKOFF[1])
+
+	def stop(self):
+		"""程式結束：停止重啟並結束自己啟動的 mpv (沿用的外部 mpv 不動)。"""
+		self.stopping = True
+		self.restart_timer.stop()
+		self.ready_timer.stop()
+		if self.process is not None:
+			self.process.terminate()
+			if not self.process.waitForFinished(3000):
+				self.process.kill()
+				self.process.waitForFinished(1000)
+
+	def stats(self):
+		return {"ready": int(self.ready), "managed": int(self.process is not None), "restarts": self.restarts}
 
-	def __init__(self, parent=None):
+class PlayerRegistry(QObject):
+	"""所有可控制的播放器與群組，指令可同時廣播到一組播放器。
+
+	"local" 是本機由 MPVSupervisor 管理的 mpv；players.json 可再加入其他
+	IPC socket 的 mpv 與其他 AI Window 節點 (LAN 埠)，並定義群組：
+
+	  {"players": {"left": "/tmp/mpvsocket-left", "hall": "192.168.1.31:9997"},
+	   "groups": {"room": ["local", "left"]}, "default": "room"}
+
+	"all" 代表全部播放器；default 是語音換景、音量、暫停時的對象 (預設 "local")。
+	每個播放器各自有長駐連線與回覆 Future，廣播時依序寫入後就返回，各節點的
+	來回同時進行，不會一台等一台。
+	"""
+	def __init__(self, local, path=PLAYERS_PATH, parent=None):
 		super().__init__(parent)
-		self.httpd = None
+		self.path = path
+		self.players = {"local": local}
+		self.groups = {}
+		self.default = ["local"]
+		self.sent = 0
+		self.failed = 0
+		self.load()
 
-	def run(self):
-		server_address = ('0.0.0.0', 9998)
-		self.httpd = HTTPServer(server_address, MPVRequestHandler)
-		self.httpd.listener = self
-		print("DEBUG: HTTP Listener started on port 9998")
-		self.httpd.serve_forever()
+	def load(self):
+		if not os.path.exists(self.path):
+			return
+		try:
+			with open(self.path, "r", encoding="utf-8") as f:
+				config = json.load(f)
+			for name, address in config.get("players", {}).items():
+				if name not in self.players:
+					self.players[name] = self.client_for(address)
+			self.groups = {name: list(members) for name, members in config.get("groups", {}).items()}
+			if "default" in config:
+				self.default = self.resolve(config["default"])
+			print(f"DEBUG: Loaded {len(self.players)} players and {len(self.groups)} groups from {os.path.basename(self.path)}")
+		except (OSError, ValueError, AttributeError, TypeError) as e:
+			print(f"DEBUG: Failed to load {self.path}: {e}")
+
+	def client_for(self, address):
+		"""/path 為本機 mpv IPC socket，host[:port] 為另一台 AI Window 的 LAN 埠。"""
+		if address.startswith("/"):
+			return MPVClient(address, self)
+		host, sep, port = address.rpartition(":")
+		if not sep or not port.isdigit():
+			host, port = address, LAN_PORT
+		return RemotePlayerClient(host, int(port), self)
+
+	def start(self):
+		for name, client in self.players.items():
+			if name != "local":
+				client.start()
 
 	def stop(self):
-		if self.httpd:
-			self.httpd.shutdown()
+		for name, client in self.players.items():
+			if name != "local":
+				client.stop()
+		for name, client in self.players.items():
+			if name != "local":
+				client.wait()
+
+	def resolve(self, target=None):
+		"""target (播放器名稱、群組名稱、"all" 或其 list) 展開成播放器名稱 list。"""
+		if target is None:
+			return list(self.default)
+		names = []
+		for item in ([target] if isinstance(target, str) else target):
+			if item == "all":
+				members = list(self.players)
+			elif item in self.groups:
+				members = self.groups[item]
+			elif item in self.players:
+				members = [item]
+			else:
+				raise ValueError(f"unknown player or group: {item}")
+			for name in members:
+				if name not in self.players:
+					raise ValueError(f"unknown player: {name}")
+				if name not in names:
+					names.append(name)
+		return names
+
+	def broadcast(self, cmd_lists, target=None, expand=None):
+		"""把指令送給 target 的每個播放器，回傳 {播放器名稱: 每個指令的 Future list}。
+
+		expand(cmd_lists) 回傳 (mpv 指令, 每個原指令最後一筆的索引)，用來在本機展開
+		loadfile；遠端節點收到原本的指令，自行展開。未連線的播放器 (local 除外，
+		它的指令會排隊等 mpv 重啟) 立即回覆錯誤，不佔用等待時間。
+		"""
+		names = self.resolve(target)
+		expanded = None
+		sent_at = time.monotonic()
+		results = {}
+		for name in names:
+			client = self.players[name]
+			if name != "local" and not client.connected:
+				futures = []
+				for _ in cmd_lists:
+					future = concurrent.futures.Future()
+					future.set_exception(MPVError("player offline"))
+					futures.append(future)
+				self.failed += 1
+				results[name] = futures
+				continue
+			if isinstance(client, RemotePlayerClient) or expand is None:
+				futures = client.commands(cmd_lists)
+			else:
+				if expanded is None:
+					expanded = expand(cmd_lists)
+				cmds, ends = expanded
+				sent = client.commands(cmds)
+				futures = [sent[i] for i in ends]
+			if futures:
+				futures[-1].add_done_callback(lambda f, name=name: metrics.observe("player_ack_seconds", time.monotonic() - sent_at, player=name))
+			results[name] = futures
+		self.sent += 1
+		return results
+
+	def stats(self):
+		return {
+			"players": len(self.players),
+			"connected": sum(1 for client in list(self.players.values()) if client.connected),
+			"broadcasts": self.sent,
+			"offline_skips": self.failed,
+		}
+
+class TranscriptView(QPlainTextEdit):
+	"""對話逐字稿：使用者與助理的串流轉錄片段先累積，最多每秒 fps 次一次附加到文件尾端。
+
+	QPlainTextEdit 只重排新增的部分，不像 QLabel.setText 每次重排整段 rich text；
+	maximumBlockCount 限制保留的行數，長時間對話的記憶體不會持續成長。
+	"""
+	USER, ASSISTANT = "user", "assistant"
+	LABELS = {USER: ("你：", "#9fd3ff"), ASSISTANT: ("助理：", "#ffffff")}
+
+	def __init__(self, fps=TRANSCRIPT_FPS, max_blocks=TRANSCRIPT_MAX_BLOCKS, parent=None):
+		super().__init__(parent)
+		self.setReadOnly(True)
+		self.setUndoRedoEnabled(False)
+		self.setMaximumBlockCount(max_blocks)
+		self.formats = {}
+		for role, (label, color) in self.LABELS.items():
+			text_format = QTextCharFormat()
+			text_format.setForeground(QColor(color))
+			label_format = QTextCharFormat(text_format)
+			label_format.setFontWeight(QFont.Weight.Bold)
+			self.formats[role] = (label, label_format, text_format)
+		self.pending = [] # (role, text)；role 為 None 代表一輪結束
+		self.role = None # 最後一行的說話者，None 時下一個片段另起一行
+		self.chunks = 0
+		self.flushes = 0
+		self.blocks = 1 # flush 後更新；stats 由 /metrics 的 thread 呼叫，不能讀取 widget
+		self.timer = QTimer(self)
+		self.timer.setSingleShot(True)
+		self.timer.setInterval(max(1, round(1000 / fps)))
+		self.timer.timeout.connect(self.flush)
+
+	def add_user(self, text):
+		self.append_chunk(self.USER, text)
+
+	def add_assistant(self, text):
+		self.append_chunk(self.ASSISTANT, text)
+
+	def end_turn(self):
+		self.append_chunk(None, "")
+
+	def append_chunk(self, role, text):
+		self.pending.append((role, text))
+		if role:
+			self.chunks += 1
+		if not self.timer.isActive():
+			self.timer.start()
+
+	def flush(self):
+		if not self.pending:
+			return
+		pending, self.pending = self.pending, []
+		bar = self.verticalScrollBar()
+		follow = bar.value() >= bar.maximum() - 4 # 使用者往上捲動時不強制跳到底部
+		cursor = QTextCursor(self.document())
+		cursor.movePosition(QTextCursor.MoveOperation.End)
+		cursor.beginEditBlock()
+		for role, text in pending:
+			if role is None:
+				self.role = None
+				continue
+			label, label_format, text_format = self.formats[role]
+			if role != self.role:
+				if not self.document().isEmpty():
+					cursor.insertBlock()
+				cursor.insertText(label, label_format)
+				self.role = role
+			cursor.insertText(text, text_format)
+		cursor.endEditBlock()
+		self.flushes += 1
+		self.blocks = self.document().blockCount()
+		if follow:
+			bar.setValue(bar.maximum())
+
+	def stats(self):
+		return {"chunks": self.chunks, "flushes": self.flushes, "blocks": self.blocks}
 
 class AIWindow(QWidget):
 	def __init__(self):
@@ -504,33 +3446,118 @@ class AIWindow(QWidget):
 		self.is_auto_playing = False
 		self.mpv_connected = False
 		
-		self.recorder = AudioRecorder()
-		self.player = AudioPlayer()
-		self.live_session = None # Will instantiate per use
-
-		# 加入 LAN Listener
-		self.lan_listener = LANListener(self)
-		self.lan_listener.command_received.connect(self.handle_lan_command)
-		self.lan_listener.start()
-
-		# 加入 HTTP Listener
-		self.http_listener = HTTPListener(self)
-		self.http_listener.command_received.connect(self.handle_lan_command)
-		self.http_listener.start()
-
-		# 監控 MPV 狀態的 Timer
-		self.monitor_timer = QTimer(self)
-		self.monitor_timer.timeout.connect(self.monitor_mpv)
-		self.monitor_timer.start(1000)
-		
+		# 音訊裝置、Live 連線與網路服務在視窗第一次繪製後才啟動 (start_services)
+		self.recorder = None
+		self.player = None
+		self.live_session = None # 整個程式共用一條預熱的連線
+		# 泡泡顯示期間，在待命時間到期前延長，按下麥克風時連線一定是熱的
+		self.keep_warm_timer = QTimer(self)
+		self.keep_warm_timer.setInterval(LIVE_WARM_SECONDS * 1000 // 2)
+		self.keep_warm_timer.timeout.connect(self.keep_live_warm)
+		self.services_started = False
+		# 收藏清單 (play.lst) 的記憶體索引
+		self.playlist = PlaylistStore(parent=self)
+		self.playlist.changed.connect(self.on_playlist_changed)
+		# 搜尋、預先解析、影片快取與場景索引會讀檔、載入 yt_dlp 或連網，在 start_library 才建立
+		self.search_cache = None
+		self.resolver = None
+		self.speculator = None
+		self.pre_resolver = None
+		self.media_cache = None
+		self.scene_index = None
+		self.load_started = None
+
+		# 長駐的 MPV IPC 連線與狀態鏡像
+		self.mpv = MPVClient(IPC_SOCKET, self)
+		self.mpv_state = MPVState(self.mpv, self)
+		self.mpv.connection_changed.connect(self.on_mpv_connection)
+		self.mpv_state.path_changed.connect(self.on_mpv_path)
+		self.mpv_state.idle_changed.connect(self.on_mpv_idle)
+		self.mpv_state.file_loaded.connect(self.on_mpv_file_loaded)
+		self.mpv_state.playback_restart.connect(self.on_playback_restart)
+		# mpv 行程本身：啟動、就緒偵測與當機重啟
+		self.mpv_supervisor = MPVSupervisor(self.mpv, self.mpv_state, self.restore_commands, parent=self)
+		metrics.add_gauges("mpv", self.mpv_supervisor.stats)
+		# 本機 mpv 以外的播放器 (players.json)，換景、音量、暫停廣播到 default 群組
+		self.players = PlayerRegistry(self.mpv, parent=self)
+		metrics.add_gauges("players", self.players.stats)
+
+		# LAN (9997) 與 HTTP (9998) 指令伺服器
+		self.command_server = CommandServer(parent=self)
+		self.command_server.commands_received.connect(self.handle_lan_commands)
+
 		# 2. 建立 UI
 		self.initUI()
 
+	def paintEvent(self, event):
+		super().paintEvent(event)
+		if not self.services_started:
+			# 泡泡已畫出來，回到 event loop 後再啟動其餘服務
+			self.services_started = True
+			if STARTUP_PROBE:
+				print("STARTUP: window painted", flush=True)
+			QTimer.singleShot(0, self.start_services)
+
+	def start_services(self):
+		"""視窗顯示後才啟動的部分：mpv IPC、指令伺服器、Gemini Live 連線與音訊裝置。"""
+		if self.live_session:
+			return
+		self.start_library()
 		# 3. 連結訊號
-		# Note: live_session signals will be connected when created
-		# recorder data signal will also be handled dynamically
-		# 啟動時嘗試從 play.lst 隨機選一個 URL，由 MPV 播放
-		QTimer.singleShot(1000, self.play_random_from_list)
+		self.mpv_supervisor.start()
+		self.mpv.start()
+		self.players.start()
+		self.command_server.start()
+		# 預先建立 Gemini Live 連線 (genai 在 LiveSession thread 載入)，按下麥克風時不必等待握手
+		self.start_live_session(self.mpv_state.volume)
+		# 啟動時 mpv 處於 idle，連上後由 idle-active 事件從 play.lst 隨機選一個 URL 播放
+		QTimer.singleShot(0, self.init_audio)
+
+	def start_library(self):
+		"""搜尋快取、yt-dlp、收藏預先解析、影片快取與場景索引；在 start_services 最先建立。"""
+		self.search_cache = SearchCache()
+		self.resolver = Resolver(workers=3)
+		self.resolver.warm_up()
+		# 推測搜尋用自己的 worker，不佔用工具呼叫的搜尋
+		self.speculator = SceneSpeculator(Resolver(workers=1), self.search_cache, parent=self)
+		# 背景預先解析收藏清單，並量測 loadfile 到第一個畫面的時間
+		self.pre_resolver = PreResolver(self.resolver, parent=self)
+		self.pre_resolver.set_urls(self.playlist.urls())
+		# 收藏影片的本機檔案快取，串流網址解析好後在背景下載
+		self.media_cache = MediaCache(self.pre_resolver, parent=self)
+		self.media_cache.set_urls(self.playlist.urls())
+		self.pre_resolver.resolved.connect(lambda url: self.media_cache.pump())
+		# 收藏標題的本機索引，換景時先查，找到就不必搜尋 YouTube
+		self.scene_index = SceneIndex()
+		# 重建索引是 O(收藏數)；預先解析一次完成很多收藏時，合併成一次重建
+		self.scene_index_timer = QTimer(self)
+		self.scene_index_timer.setSingleShot(True)
+		self.scene_index_timer.setInterval(SCENE_INDEX_DELAY)
+		self.scene_index_timer.timeout.connect(self.rebuild_scene_index)
+		self.rebuild_scene_index()
+		self.pre_resolver.resolved.connect(self.schedule_scene_index)
+		# /metrics 輸出時一併讀取的各元件統計
+		metrics.add_gauges("search_cache", self.search_cache.stats)
+		metrics.add_gauges("media_cache", self.media_cache.stats)
+		metrics.add_gauges("scene_index", self.scene_index.stats)
+
+	def init_audio(self):
+		"""載入 QtMultimedia 並開啟錄音 / 播放裝置；第一次開麥克風前一定會完成。"""
+		if self.player:
+			return
+		self.player = AudioPlayer()
+		self.recorder = AudioRecorder()
+		metrics.add_gauges("jitter", self.player.stats)
+		if self.live_session:
+			self.connect_live_audio()
+		if STARTUP_PROBE:
+			print("STARTUP: audio ready", flush=True)
+			QTimer.singleShot(0, self.close)
+
+	def connect_live_audio(self):
+		self.live_session.audio_output = self.player
+		self.live_session.interrupted.connect(self.player.interrupt)
+		self.recorder.audio_data_ready.connect(self.live_session.add_audio_input)
 
 	def initUI(self):
 		# 視窗屬性：無邊框、最上層、透明背景
@@ -619,7 +3646,18 @@ class AIWindow(QWidget):
 			font-family: 'Segoe UI', 'Microsoft JhengHei';
 		""")
 		self.scroll.setWidget(self.label)
-		full_layout.addWidget(self.scroll)
+		full_layout.addWidget(self.scroll, 1)
+
+		# 對話逐字稿 (使用者 / 助理的語音轉錄)
+		self.transcript = TranscriptView()
+		self.transcript.setFrameShape(QFrame.Shape.NoFrame)
+		self.transcript.setStyleSheet("""
+			color: white; font-size: 16px;
+			background-color: rgba(0, 0, 0, 140);
+			border-radius: 15px; padding: 10px;
+			font-family: 'Segoe UI', 'Microsoft JhengHei';
+		""")
+		full_layout.addWidget(self.transcript, 2)
 
 		# 輸入區域
 		input_layout = QHBoxLayout()
@@ -679,7 +3717,10 @@ class AIWindow(QWidget):
 			# 如果還在語音，就關掉
 			if self.is_live:
 				self.toggle_recording()
+			self.keep_warm_timer.start()
+			self.keep_live_warm()
 		else:
+			self.keep_warm_timer.stop()
 			self.bubble_container.hide()
 			self.full_ui_widget.show()
 			self.setFixedSize(450, 550)
@@ -687,6 +3728,11 @@ class AIWindow(QWidget):
 			if not self.is_live:
 				self.toggle_recording()
 
+	def keep_live_warm(self):
+		"""泡泡顯示時保持 Live 連線預熱 (LiveSession.prewarm)。"""
+		if self.live_session and self.is_minimized and self.isVisible():
+			self.live_session.prewarm()
+
 	def toggle_recording(self):
 		if not self.is_live:
 			print("\nDEBUG: Starting new recording session...")
@@ -704,36 +3750,18 @@ class AIWindow(QWidget):
 				}
 			""")
 			
-			# Prepare for fresh session instance
-			if self.live_session:
-				print("\nDEBUG: Stopping previous session...")
-				self.live_session.stop()
-				# DO NOT wait() here! It blocks the UI thread.
-				# The thread will exit on its own once asyncio stops.
-
-			current_vol = self.get_mpv_property("volume")
+			# 沿用預熱的連線，只切換成對話狀態
+			self.start_services()
+			self.init_audio()
+			current_vol = self.mpv_state.volume
 			if current_vol is None: current_vol = 100
-			print(f"\nDEBUG: Current system volume is {current_vol}%")
-
-			self.live_session = LiveSession(current_volume=current_vol)
-#			self.live_session.text_received.connect(self.on_live_text)
-			self.live_session.audio_received.connect(self.player.play)
-			self.live_session.status_changed.connect(self.on_live_status)
-			self.live_session.on_exec_cmd.connect(self.on_exec_cmd)
-
-			# Reconnect recorder to the NEW session
-			try:
-				self.recorder.audio_data_ready.disconnect()
-			except:
-				pass
-			self.recorder.audio_data_ready.connect(self.live_session.add_audio_input)
-			
+			print(f"\nDEBUG: Current system volume is {int(current_vol)}%")
+			self.live_session.activate(int(current_vol))
 			# Use a tiny delay before starting recorder to ensure session state is ready
-			self.live_session.start()
 			QTimer.singleShot(100, self.recorder.start)
 			
 			# Pause Background Music
-			self.send_mpv_command(["set_property", "pause", True])
+			self.broadcast_mpv([["set_property", "pause", True]])
 			
 		else:
 			print("\nDEBUG: Stopping recording session...")
@@ -749,31 +3777,81 @@ class AIWindow(QWidget):
 				}
 			""")
 			self.recorder.stop()
-			if self.live_session:
-				self.live_session.stop()
-				# We don't necessarily block UI (wait) here unless needed, 
-				# but it will be cleaned up on next start or garbage collected.
+			self.speculator.reset()
+			# 連線保留 LIVE_WARM_SECONDS 秒，下次對話可立即開始
+			self.live_session.standby()
 			self.label.setText("<i>通話結束</i>")
 			
 			# Resume Background Music
-			self.send_mpv_command(["set_property", "pause", False])
+			self.broadcast_mpv([["set_property", "pause", False]])
+			# 通話期間播放已結束的話，現在補上自動播放
+			if self.mpv_state.idle:
+				self.on_mpv_idle(True)
 			
 			# 手動停止後也自動縮小
 			if not self.is_minimized:
 				self.set_minimized(True)
 
+	def start_live_session(self, current_vol):
+		"""Create the long-lived Live session; it connects right away and stays warm."""
+		if current_vol is None: current_vol = 100
+		current_vol = int(current_vol)
+
+		self.live_session = LiveSession(current_volume=current_vol)
+#		self.live_session.text_received.connect(self.on_live_text)
+		self.live_session.status_changed.connect(self.on_live_status)
+		self.live_session.on_exec_cmd.connect(self.on_exec_cmd)
+		self.live_session.input_transcript.connect(self.speculator.feed)
+		self.live_session.input_transcript.connect(self.transcript.add_user)
+		self.live_session.output_transcript.connect(self.transcript.add_assistant)
+		self.live_session.turn_completed.connect(self.transcript.end_turn)
+		metrics.add_gauges("transcript", self.transcript.stats)
+		if self.player:
+			self.connect_live_audio()
+		metrics.add_gauges("vad", lambda: {
+			"total_frames": self.live_session.vad.total_frames,
+			"sent_frames": self.live_session.vad.sent_frames,
+			"suppressed_ratio": round(self.live_session.vad.suppressed_ratio(), 3),
+		})
+		self.live_session.start()
+
+	def start_scene_search(self, keyword, scene=None):
+		"""換景 (有 scene) 時收藏裡已有相符的場景 (SceneIndex) 就直接播放，否則在背景搜尋 YouTube。"""
+		metrics.mark("scene_request")
+		started = time.monotonic()
+		url = self.scene_index.match(scene) if scene else None
+		if url:
+			self.speculator.reset() # 推測搜尋用不到了
+			now = time.monotonic()
+			metrics.mark("search_finish", now)
+			metrics.observe("search_seconds", now - started, source="scene_index", result="found")
+			print(f"DEBUG: 收藏中已有相符的場景: {scene} -> {url}")
+			self.send_to_mpv(url)
+			return
+		self.search_worker = SearchWorker(keyword, self.search_cache, self.resolver, self.speculator.take(keyword))
+		self.search_worker.finished.connect(lambda url: self.on_scene_search_finished(keyword, url))
+		self.search_worker.start()
+
+	def on_scene_search_finished(self, keyword, url):
+		if url:
+			self.send_to_mpv(url)
+		else:
+			metrics.clear("scene_request")
+			print("\nDEBUG: No URL found for keyword: " + keyword)
+
 	def on_live_status(self, status):
-		self.label.setText(f"<i>{status}</i>")
+		text = f"<i>{status}</i>"
+		if self.label.text() != text: # 相同狀態不必重排整段 rich text
+			self.label.setText(text)
 	def on_exec_cmd(self, cmd):
 		print(f"\nDEBUG: Executing command from AI: {cmd}")
 		if "change_scene:[[" in cmd and "]]" in cmd:
 			parts = cmd.split("change_scene:[[")
-			keyword = parts[1].split("]]")[0].strip() + " 4K window view"
+			scene = parts[1].split("]]")[0].strip()
+			keyword = scene + " 4K window view"
 			self.label.setText(f"{parts[0]}<br><br><b style='color:#00ff00;'>正在為您前往：{keyword}...</b>")
 			QTimer.singleShot(2000, lambda: self.set_minimized(True) if self.is_live else None)
-			self.search_worker = SearchWorker(keyword)
-			self.search_worker.finished.connect(lambda url: self.send_to_mpv(url) if url else print("\nDEBUG: No URL found for keyword: " + keyword))
-			self.search_worker.start()
+			self.start_scene_search(keyword, scene)
 			# Clear buffer to avoid repeated search
 			self.current_response_buffer = ""
 		elif "direct_youtube_search:[[" in cmd and "]]" in cmd:
@@ -781,9 +3859,8 @@ class AIWindow(QWidget):
 			keyword = parts[1].split("]]")[0].strip()
 			self.label.setText(f"{parts[0]}<br><br><b style='color:#00ff00;'>正在為您尋找：{keyword}...</b>")
 			QTimer.singleShot(2000, lambda: self.set_minimized(True) if self.is_live else None)
-			self.search_worker = SearchWorker(keyword)
-			self.search_worker.finished.connect(lambda url: self.send_to_mpv(url) if url else print("\nDEBUG: No URL found for keyword: " + keyword))
-			self.search_worker.start()
+			# 指定影片或歌曲的搜尋一定送到 YouTube，不以收藏代替
+			self.start_scene_search(keyword)
 			# Clear buffer to avoid repeated search
 			self.current_response_buffer = ""
 		elif "set_volume:[[" in cmd and "]]" in cmd:
@@ -792,7 +3869,7 @@ class AIWindow(QWidget):
 			try:
 				vol = int(vol_str)
 				vol = max(0, min(100, vol))
-				self.send_mpv_command(["set_property", "volume", vol])
+				self.broadcast_mpv([["set_property", "volume", vol]])
 				print(f"\nDEBUG: Setting volume to {vol}%")
 				self.label.setText(f"{parts[0]}<br><br><b style='color:#00cbff;'>音量已調整為 {vol}%</b>")
 				QTimer.singleShot(4000, lambda: self.set_minimized(True) if self.is_live else None)
@@ -802,8 +3879,7 @@ class AIWindow(QWidget):
 		elif "quit_talk" in cmd:
 			self.label.setText("<i>助理已結束對話，期待下次見面！</i>")
 			QTimer.singleShot(2000, lambda: self.set_minimized(True) if self.is_live else None)
-			if self.live_session:
-				self.live_session.stop()
+			# 縮小時 toggle_recording 會讓連線進入待命
 			if not self.is_minimized:
 				self.set_minimized(True)
 		else:
@@ -818,88 +3894,183 @@ class AIWindow(QWidget):
 		if self.is_minimized: self.set_minimized(False)
 		self.on_exec_cmd("direct_youtube_search:[[" + text + "]]")
 
-	def handle_lan_command(self, cmd_list):
-		"""處理來自 LAN 的指令"""
-		if cmd_list and cmd_list[0] == "loadfile":
-			url = cmd_list[1]
-			print(f"DEBUG: LAN loadfile command for URL: {url}")
-			self.send_to_mpv(url)
-		else:
-			self.send_mpv_command(cmd_list)
-
-	def monitor_mpv(self):
-		"""監控 MPV 播放狀態"""
-		# 1. 檢查路徑變化，更新愛心按鈕
-		path = self.get_mpv_property("path")
-
-		# 檢查 MPV 是否已關閉
-		if path is None:
-			# 如果連不上 IPC 且之前有連上過，且 socket 檔消失了，就結束程式
-			if self.mpv_connected and not os.path.exists(IPC_SOCKET):
-				print("DEBUG: MPV IPC socket disappeared, closing AIWindow.")
-				QApplication.quit()
+	def handle_lan_commands(self, cmd_lists, target, done):
+		"""處理來自 LAN/HTTP 的指令；整批一次寫入 mpv，done 設為各指令對應的 mpv Future。
+		有 target 時廣播到 PlayerRegistry 的播放器，done 設為 {播放器: Future list}"""
+		try:
+			self.record_plays(cmd_lists)
+			if target is not None:
+				done.set_result(self.players.broadcast(cmd_lists, target, self.expand_commands))
 				return
-		else:
-			self.mpv_connected = True
+			cmds, ends = self.expand_commands(cmd_lists)
+			futures = self.mpv.commands(cmds)
+			done.set_result([futures[i] for i in ends])
+		except Exception as e:
+			print(f"LAN command error: {e}")
+			done.set_exception(e)
+
+	def record_plays(self, cmd_lists):
+		"""使用者、AI 與自動播放載入的收藏計入 MediaCache 的播放次數；mpv 重啟還原與廣播展開不算。"""
+		for cmd_list in cmd_lists:
+			if cmd_list[0] == "loadfile" and len(cmd_list) > 1 and cmd_list[1] in self.playlist:
+				self.media_cache.record_play(cmd_list[1])
+
+	def expand_commands(self, cmd_lists):
+		"""loadfile 展開成 load_commands；回傳 (mpv 指令, 每個原指令最後一筆的索引)"""
+		cmds = []
+		ends = []
+		for cmd_list in cmd_lists:
+			if cmd_list[0] == "loadfile" and len(cmd_list) > 1:
+				url = cmd_list[1]
+				print(f"DEBUG: loadfile command for URL: {url}")
+				cmds.extend(self.load_commands(url))
+			else:
+				cmds.append(cmd_list)
+			ends.append(len(cmds) - 1)
+		return cmds, ends
+
+	def broadcast_mpv(self, cmd_lists, target=None):
+		"""送給 target (預設為 players.json 的 default 群組) 的每個播放器，不等待回覆"""
+		try:
+			nodes = self.players.broadcast(cmd_lists, target, self.expand_commands)
+		except Exception as e:
+			print(f"broadcast error: {e}")
+			return {}
+		if list(nodes) != ["local"]:
+			QTimer.singleShot(COMMAND_ACK_TIMEOUT * 1000, lambda: self.report_broadcast(cmd_lists, nodes))
+		return nodes
+
+	def report_broadcast(self, cmd_lists, nodes):
+		"""廣播逾時後，記下沒有回覆或回覆錯誤的播放器"""
+		for name, futures in nodes.items():
+			for future in futures:
+				if not future.done():
+					print(f"DEBUG: Player {name} did not ack {cmd_lists} within {COMMAND_ACK_TIMEOUT}s")
+					break
+				if future.exception() is not None:
+					print(f"DEBUG: Player {name} failed {cmd_lists}: {future.exception()}")
+					break
+
+	def on_mpv_connection(self, connected):
+		"""mpv 斷線時由 MPVSupervisor 負責重啟，這裡只記錄狀態"""
+		self.mpv_connected = connected
+
+	def restore_commands(self):
+		"""mpv 重啟後要補送的指令：還原音量與斷線前播放的影片。"""
+		cmds = []
+		if self.mpv_state.volume is not None:
+			cmds.append(["set_property", "volume", self.mpv_state.volume])
+		url = None if self.mpv_state.idle else self.current_url()
+		if url:
+			print(f"DEBUG: Restoring {url} after mpv restart")
+			cmds.extend(self.load_commands(url))
+		return cmds
+
+	def on_playlist_changed(self):
+		if self.pre_resolver is None:
+			return # start_library 會以最新的收藏建立
+		self.pre_resolver.set_urls(self.playlist.urls())
+		self.media_cache.set_urls(self.playlist.urls())
+		self.rebuild_scene_index()
+		url = self.current_url()
+		if url:
+			self.update_heart_ui(url in self.playlist)
 
+	def schedule_scene_index(self, *args):
+		# 已排定的重建不延後，持續有解析結果時也最多每 SCENE_INDEX_DELAY 重建一次
+		if not self.scene_index_timer.isActive():
+			self.scene_index_timer.start()
+
+	def rebuild_scene_index(self):
+		"""以 play.lst 的標題加上解析到的影片標題重建場景索引。"""
+		self.scene_index_timer.stop()
+		self.scene_index.build([(url, [self.playlist.title(url), self.pre_resolver.entries.get(url, {}).get("title")]) for url in self.playlist.urls()])
+
+	def current_url(self):
+		"""目前播放的影片網址；預先解析的串流會換回原本的收藏網址。"""
+		return self.origin_url(self.mpv_state.path)
+
+	def origin_url(self, path):
+		"""預先解析的串流與快取檔案都換回原本的收藏網址。"""
+		if self.pre_resolver is None:
+			return path
+		return self.pre_resolver.origin(path) or self.media_cache.origin(path) or path
+
+	def on_mpv_path(self, path):
+		"""路徑變化由 mpv 推送，更新愛心按鈕"""
+		path = self.origin_url(path)
 		if path and path != self.last_path:
 			print(f"DEBUG: Path changed to {path}, updating heart UI")
 			self.last_path = path
-			self.update_heart_ui(self.is_in_playlist(path))
+			self.update_heart_ui(path in self.playlist)
 
-		# 2. 檢查是否播放結束 (idle-active 為 True)
-		idle_active = self.get_mpv_property("idle-active")
+	def on_mpv_file_loaded(self):
+		if self.load_started:
+			metrics.span("loadfile_to_file_loaded_seconds", "loadfile", kind=self.load_started[1])
+
+	def on_playback_restart(self):
+		"""第一個畫面出現：記錄 time-to-first-frame 與語音到換景的總延遲"""
+		if not self.load_started:
+			return
+		started, kind = self.load_started
+		self.load_started = None
+		now = time.monotonic()
+		ttff = now - started
+		metrics.observe("loadfile_to_first_frame_seconds", ttff, kind=kind)
+		print(f"DEBUG: Time to first frame ({kind}): {ttff:.2f}s, median {metrics.quantile('loadfile_to_first_frame_seconds', 0.5, kind=kind):.2f}s")
+		requested = metrics.clear("scene_request")
+		if requested is not None:
+			# 由語音指令觸發的換景：從使用者說完話到第一個畫面
+			metrics.span("tool_call_to_first_frame_seconds", "tool_call", now)
+			speech_end = metrics.last("speech_end")
+			if speech_end is not None and speech_end <= requested:
+				metrics.observe("voice_to_scene_change_seconds", now - speech_end)
+				print(f"DEBUG: Voice to scene change: {now - speech_end:.2f}s, p95 {metrics.quantile('voice_to_scene_change_seconds', 0.95):.2f}s")
+
+	def on_mpv_idle(self, idle_active):
+		"""播放結束 (idle-active 變為 True) 時自動隨機播放"""
 		if idle_active is False:
 			# 正在播放中，確保 flag 為 False，這樣結束時才能觸發 auto play
 			self.is_auto_playing = False
 		elif idle_active is True:
+			if self.mpv_supervisor.restoring:
+				# 重啟後的 mpv 先回報 idle，斷線前的影片已在佇列中，不要另外隨機播放
+				return
 			if not self.is_live and not self.is_auto_playing:
 				print("DEBUG: MPV is idle, triggering auto random play")
 				self.is_auto_playing = True
 				self.play_random_from_list()
 
-	def send_mpv_command(self, cmd_list):
-		"""通用 MPV 指令發送"""
-		try:
-			json_data = json.dumps({"command": cmd_list})
-			with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
-				s.connect(IPC_SOCKET)
-				s.sendall(json_data.encode('utf-8') + b'\n')
-		except Exception as e:
-			print(f"IPC Error: {e}")
-
-	def get_mpv_property(self, property_name):
-		"""獲取 MPV 屬性值"""
-		try:
-			json_data = json.dumps({"command": ["get_property", property_name]})
-			with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
-				s.connect(IPC_SOCKET)
-				s.settimeout(0.5)
-				s.sendall(json_data.encode('utf-8') + b'\n')
-				response = s.recv(4096)
-				if response:
-					data = json.loads(response.decode().strip())
-					return data.get("data")
-		except Exception as e:
-			print(f"IPC Get Property Error: {e}")
-		return None
+	def send_to_mpv(self, url, target=None):
+		"""Load URL into the target players (default group); each mpv gets its commands in a single write."""
+		self.record_plays([["loadfile", url]])
+		self.broadcast_mpv([["loadfile", url, "replace"]], target)
 
-	def send_to_mpv(self, url):
-		"""Load URL into mpv via IPC.
-
-		Send a `stop` first, then wait a short delay before issuing `loadfile`.
-		This prevents MPV from rejecting the loadfile when called too quickly.
-		"""
-		try:
-			#self.send_mpv_command(["stop"]) # Clear previous state
-			# Schedule loadfile after a short delay to let mpv settle
-			#QTimer.singleShot(500, lambda: self.send_mpv_command(["loadfile", url, "replace"]))
-			self.send_mpv_command(["loadfile", url, "replace"])
+	def load_commands(self, url):
+		"""組出載入 url 的 mpv 指令，並記錄載入開始時間與愛心狀態。"""
+		# audio-files 與 force-media-title 是全域選項，每次載入都要重設
+		cmds = [["change-list", "audio-files", "clr", ""]]
+		# 收藏優先播放本機快取的檔案 (播放次數由 record_plays 記錄)
+		info = self.media_cache.lookup(url) if url in self.playlist else None
+		kind = "cached"
+		if not info:
+			info = self.pre_resolver.lookup(url)
+			kind = "preresolved"
+		if info:
+			# 已預先解析：直接播放串流，跳過 mpv 的 ytdl hook
+			if info["audio"]:
+				cmds.append(["change-list", "audio-files", "append", info["audio"]])
+			cmds.append(["set_property", "force-media-title", info["title"] or ""])
+			cmds.append(["loadfile", info["video"], "replace"])
+		else:
+			cmds.append(["set_property", "force-media-title", ""])
+			cmds.append(["loadfile", url, "replace"])
+		self.load_started = (time.monotonic(), kind if info else "url")
+		metrics.mark("loadfile", self.load_started[0])
 
-			# Sync heart button state
-			self.update_heart_ui(self.is_in_playlist(url))
-		except Exception as e:
-			print(f"send_to_mpv error: {e}")
+		# Sync heart button state
+		self.update_heart_ui(url in self.playlist)
+		return cmds
 
 	def update_heart_ui(self, is_favorite):
 		"""Update heart icon and color for both UI modes."""
@@ -934,132 +4105,36 @@ class AIWindow(QWidget):
 		self.bubble_heart_btn.setText(text)
 		self.bubble_heart_btn.setStyleSheet(bubble_style)
 
-	def is_in_playlist(self, url):
-		"""Check if the URL is already in play.lst."""
-		if not url: return False
-		path = os.path.join(os.path.dirname(__file__), "play.lst")
-		if not os.path.exists(path): return False
-		try:
-			with open(path, 'r', encoding='utf-8') as f:
-				for line in f:
-					line = line.strip()
-					if not line or line.startswith('#'):
-						continue
-					if line == url.strip():
-						return True
-		except Exception as e:
-			print(f"Error reading play.lst: {e}")
-		return False
-
-	def add_to_playlist(self, url, title):
-		"""Add a URL and its title to play.lst."""
-		path = os.path.join(os.path.dirname(__file__), "play.lst")
-		try:
-			with open(path, 'a', encoding='utf-8') as f:
-				f.write(f"\n# {title}\n{url}\n")
-			return True
-		except Exception as e:
-			print(f"Error adding to playlist: {e}")
-			return False
-
-	def remove_from_playlist(self, url):
-		"""Remove a URL and its preceding title comment from play.lst."""
-		path = os.path.join(os.path.dirname(__file__), "play.lst")
-		if not os.path.exists(path): return False
-		try:
-			with open(path, 'r', encoding='utf-8') as f:
-				lines = f.readlines()
-
-			target_url = url.strip()
-			to_remove = set()
-			for i, line in enumerate(lines):
-				if line.strip() == target_url:
-					to_remove.add(i)
-					# Check upwards for title
-					j = i - 1
-					while j >= 0 and not lines[j].strip():
-						j -= 1
-					if j >= 0 and lines[j].strip().startswith('#'):
-						# Found a title, remove it and the blank lines in between
-						for k in range(j, i):
-							to_remove.add(k)
-						# Also remove one blank line above the title if it exists
-						if j > 0 and not lines[j-1].strip():
-							to_remove.add(j-1)
-
-			new_lines = [l for i, l in enumerate(lines) if i not in to_remove]
-
-			with open(path, 'w', encoding='utf-8') as f:
-				f.writelines(new_lines)
-			return True
-		except Exception as e:
-			print(f"Error removing from playlist: {e}")
-			return False
-
 	def toggle_favorite(self):
 		"""Add or remove current video from favorites (play.lst)."""
-		url = self.get_mpv_property("path")
+		url = self.current_url()
 		if not url:
 			self.label.setText("<b style='color:red;'>無法取得影片資訊。</b>")
 			return
 
-		if self.is_in_playlist(url):
-			if self.remove_from_playlist(url):
+		if url in self.playlist:
+			if self.playlist.remove(url):
 				self.label.setText("<b style='color:#ffcb00;'>已從收藏清單中移除。</b>")
 				self.update_heart_ui(False)
 			else:
 				self.label.setText("<b style='color:red;'>移除失敗。</b>")
 		else:
-			title = self.get_mpv_property("media-title") or "Unknown Title"
-			if self.add_to_playlist(url, title):
+			title = self.mpv_state.media_title or "Unknown Title"
+			if self.playlist.add(url, title):
 				self.label.setText(f"<b style='color:#00ff00;'>已成功加入收藏清單！</b><br>{title}")
 				self.update_heart_ui(True)
 			else:
 				self.label.setText("<b style='color:red;'>加入收藏失敗。</b>")
 
-	def pick_random_from_list(self):
-		"""Read play.lst (same dir as this file), ignore lines starting with '#', return one random URL or None."""
-		path = os.path.join(os.path.dirname(__file__), "play.lst")
-		try:
-			with open(path, 'r', encoding='utf-8') as f:
-				lines = []
-				for ln in f:
-					lns = ln.strip()
-					if not lns:
-						continue
-					if lns.lstrip().startswith('#'):
-						continue
-					lines.append(lns)
-				if not lines:
-					return None
-				return random.choice(lines)
-		except Exception as e:
-			print(f"Error reading play.lst: {e}")
-			return None
-
 	def play_random_from_list(self):
-		url = self.pick_random_from_list()
+		url = self.playlist.random_url()
 		if url:
 			print(f"\n\nDEBUG: Selected random URL from play.lst: {url}")
-			self.send_url_when_ready(url)
+			# mpv 尚未就緒時指令會留在 MPVClient 佇列，連上後送出；自動播放只換本機的窗景
+			self.send_to_mpv(url, target="local")
 		else:
 			print("\n\nDEBUG: No URL found in play.lst")
 
-	def send_url_when_ready(self, url, tries=25, interval=200):
-		"""Poll for mpv IPC socket readiness, then send the URL."""
-		self._send_attempts = 0
-		def attempt():
-			if os.path.exists(IPC_SOCKET):
-				print("\n\nDEBUG: mpv socket ready, sending URL")
-				self.send_to_mpv(url)
-			else:
-				self._send_attempts += 1
-				if self._send_attempts < tries:
-					QTimer.singleShot(interval, attempt)
-				else:
-					print("\nDEBUG: MPV socket not ready, giving up after retries.")
-		QTimer.singleShot(500, attempt)
-
 
 
 	def on_ai_finished(self, response_text):
@@ -1071,7 +4146,7 @@ class AIWindow(QWidget):
 			self.label.setText(f"{clean_msg}<br><br><i style='color:#00ff00;'>正在為您尋找：{keyword}...</i>")
 			
 			# 使用 SearchWorker 在背景搜尋，避免 UI 卡住
-			self.search_worker = SearchWorker(keyword)
+			self.search_worker = SearchWorker(keyword, self.search_cache, self.resolver)
 			self.search_worker.finished.connect(lambda url: self.on_search_finished(url, clean_msg, keyword))
 			self.search_worker.start()
 
@@ -1094,15 +4169,21 @@ class AIWindow(QWidget):
 
 	def closeEvent(self, event):
 		print("\nDEBUG: AIWindow closing, cleaning up...")
-		if hasattr(self, 'lan_listener') and self.lan_listener:
-			self.lan_listener.stop()
-			self.lan_listener.wait()
-		if hasattr(self, 'http_listener') and self.http_listener:
-			self.http_listener.stop()
-			self.http_listener.wait()
+		if self.command_server:
+			self.command_server.stop()
+			self.command_server.wait()
 		if self.live_session:
 			self.live_session.stop()
 			self.live_session.wait()
+		if self.mpv:
+			self.mpv.stop()
+			self.mpv.wait()
+		self.mpv_supervisor.stop()
+		self.players.stop()
+		if self.resolver:
+			self.resolver.shutdown()
+			self.speculator.resolver.shutdown()
+			self.media_cache.shutdown()
 		event.accept()
 
 if __name__ == '__main__':
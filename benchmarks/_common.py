@@ -0,0 +1,135 @@
+"""Shared helpers for the offline benchmarks.
+
+The benchmarks import ai_window directly, so they need the same packages as
+the app (PyQt6, numpy, ...). No Gemini traffic is made; a placeholder API
+key is set only so that the module can be imported.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_ai_window():
+	os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+	os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+	if ROOT not in sys.path:
+		sys.path.insert(0, ROOT)
+	import ai_window
+	return ai_window
+
+
+class FakeBackend:
+	"""Resolver backend that answers instantly, to time the dispatch path only."""
+	def search(self, keyword):
+		return f"https://www.youtube.com/watch?v=fake-{len(keyword)}"
+
+
+class VirtualClock:
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+
+def playout(ai_window, arrivals, bytes_per_sec=48000, period=0.01):
+	"""Drive a JitterBuffer on a virtual clock like AudioPlayer's sink would.
+
+	arrivals is a list of (seconds, pcm bytes). Chunks more than SPURT_GAP
+	apart start a new utterance; a short read counts as a gap only while the
+	current utterance still has audio outstanding.
+	"""
+	clock = VirtualClock()
+	buf = ai_window.JitterBuffer(bytes_per_sec, 2, clock=clock)
+	buf.open(ai_window.QIODevice.OpenModeFlag.ReadOnly)
+	request = int(bytes_per_sec * period)
+	# Utterance index and the byte count up to the end of each utterance
+	groups = []
+	ends = []
+	total = 0
+	for i, (t, data) in enumerate(arrivals):
+		if i and t - arrivals[i - 1][0] > buf.SPURT_GAP:
+			ends.append(total)
+		total += len(data)
+		groups.append(len(ends))
+	ends.append(total)
+	next_arrival = 0
+	group = 0
+	group_start = arrivals[0][0] if arrivals else 0.0
+	started = False
+	first_audio = []
+	gaps = [0] * len(ends)
+	played = 0
+	short = 0
+	depth = []
+	while played < total:
+		while next_arrival < len(arrivals) and arrivals[next_arrival][0] <= clock.now:
+			if groups[next_arrival] != group:
+				group = groups[next_arrival]
+				group_start = arrivals[next_arrival][0]
+				started = False
+			buf.push(arrivals[next_arrival][1])
+			next_arrival += 1
+		data = buf.readData(request)
+		if data:
+			if not started:
+				started = True
+				first_audio.append(clock.now - group_start)
+			played += len(data)
+		if started and played < ends[group] and len(data) < request:
+			short += request - len(data)
+			gaps[group] += request - len(data)
+		depth.append(buf.depth * 1000)
+		clock.now += period
+	stats = buf.stats()
+	return {
+		"utterances": len(ends),
+		"first_audio_ms": round(max(first_audio) * 1000) if first_audio else None,
+		"gap_ms": round(short / bytes_per_sec * 1000),
+		"gap_ms_per_utterance": [round(g / bytes_per_sec * 1000) for g in gaps],
+		"mean_depth_ms": round(sum(depth) / len(depth)) if depth else 0,
+		"overruns": stats["overruns"],
+		"dropped_ms": stats["dropped_ms"],
+		"target_ms": stats["target_ms"],
+	}
+
+
+def synthetic_speech(seconds, rate=16000, seed=2):
+	"""Alternating silence and noisy 'speech' bursts, Int16 PCM."""
+	rng = np.random.default_rng(seed)
+	samples = rng.normal(0, 30, int(seconds * rate))
+	step = rate * 2
+	for start in range(step // 2, len(samples), step):
+		samples[start:start + step // 2] += rng.normal(0, 3000, min(step // 2, len(samples) - start))
+	return np.clip(samples, -32768, 32767).astype(np.int16).tobytes()
+
+
+def git_commit():
+	try:
+		return subprocess.check_output(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+	except Exception:
+		return None
+
+
+def percentiles(samples, points=(50, 95, 99)):
+	if not samples:
+		return {f"p{p}": None for p in points}
+	ordered = sorted(samples)
+	return {f"p{p}": ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+
+
+def emit(name, results, output=None):
+	"""Print one machine-readable JSON record (and optionally append it to a file)."""
+	record = {"benchmark": name, "commit": git_commit(), "time": time.time(), "results": results}
+	line = json.dumps(record, ensure_ascii=False)
+	print(line)
+	if output:
+		with open(output, "a", encoding="utf-8") as f:
+			f.write(line + "\n")
+	return record
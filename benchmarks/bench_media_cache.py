@@ -0,0 +1,214 @@
+"""MediaCache against a local HTTP stand-in for YouTube's stream servers.
+
+A ThreadingHTTPServer serves synthetic video/audio streams for --favorites
+favorites (Range requests included, optionally throttled to --uplink-mbps).
+The favorites are "played" --plays times with a Zipf-like popularity, the
+way a venue repeats the same few videos all day; between plays the cache
+is given time to finish its downloads. Reported: hit rate, bytes served
+locally, bytes fetched from the origin against streaming every play, the
+largest number of concurrent downloads seen by the server, download
+throughput, lookup cost, and whether the index survives a restart.
+"""
+import argparse
+import http.server
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import types
+
+from _common import emit, import_ai_window, percentiles
+
+ai_window = import_ai_window()
+
+from PyQt6.QtCore import QCoreApplication
+
+MB = 1 << 20
+
+
+class Origin(http.server.ThreadingHTTPServer):
+	"""Serves /<name> as `size` deterministic bytes; counts traffic and concurrency."""
+	daemon_threads = True
+
+	def __init__(self, sizes, uplink_mbps=0):
+		super().__init__(("127.0.0.1", 0), OriginHandler)
+		self.sizes = sizes
+		self.bytes_per_sec = uplink_mbps * 1e6 / 8 if uplink_mbps else 0
+		self.lock = threading.Lock()
+		self.active = {} # path -> open responses
+		self.max_concurrent = 0
+		self.bytes_served = 0
+		self.requests = 0
+
+	def url(self, name):
+		return f"http://127.0.0.1:{self.server_address[1]}/{name}"
+
+
+class OriginHandler(http.server.BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	BLOCK = b"\x5a" * (64 << 10)
+
+	def log_message(self, *args):
+		pass
+
+	def do_GET(self):
+		server = self.server
+		name = self.path.lstrip("/")
+		size = server.sizes.get(name)
+		if size is None:
+			self.send_error(404)
+			return
+		start, end = 0, size - 1
+		match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+		if match:
+			start = int(match.group(1))
+			if match.group(2):
+				end = min(end, int(match.group(2)))
+			if start >= size:
+				self.send_error(416)
+				return
+			self.send_response(206)
+			self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+		else:
+			self.send_response(200)
+		self.send_header("Content-Length", str(end - start + 1))
+		self.end_headers()
+		# Concurrency is counted per download (file), not per Range request
+		stem = name.split(".")[0]
+		with server.lock:
+			server.requests += 1
+			server.active[stem] = server.active.get(stem, 0) + 1
+			server.max_concurrent = max(server.max_concurrent, len(server.active))
+		try:
+			remaining = end - start + 1
+			started = time.monotonic()
+			sent = 0
+			while remaining > 0:
+				block = self.BLOCK[:remaining]
+				self.wfile.write(block)
+				remaining -= len(block)
+				sent += len(block)
+				if server.bytes_per_sec:
+					ahead = sent / server.bytes_per_sec - (time.monotonic() - started)
+					if ahead > 0:
+						time.sleep(ahead)
+			with server.lock:
+				server.bytes_served += sent
+		finally:
+			with server.lock:
+				server.active[stem] -= 1
+				if not server.active[stem]:
+					del server.active[stem]
+
+
+def favorites(origin, count, video_mb, seed=5):
+	rng = random.Random(seed)
+	infos = {}
+	for i in range(count):
+		video = int(video_mb * MB * rng.uniform(0.5, 1.5))
+		origin.sizes[f"fav{i}.video"] = video
+		origin.sizes[f"fav{i}.audio"] = video // 12
+		url = f"https://www.youtube.com/watch?v=fav{i}"
+		infos[url] = {"url": url, "video": origin.url(f"fav{i}.video"), "audio": origin.url(f"fav{i}.audio"), "title": f"Favorite {i}"}
+	return infos
+
+
+def play_bytes(origin, url):
+	stem = url.rsplit("=", 1)[1]
+	return origin.sizes[f"{stem}.video"] + origin.sizes[f"{stem}.audio"]
+
+
+def schedule(urls, plays, skew=1.2, seed=7):
+	rng = random.Random(seed)
+	weights = [1 / (rank + 1) ** skew for rank in range(len(urls))]
+	return rng.choices(urls, weights=weights, k=plays)
+
+
+def settle(app, cache, timeout=120):
+	deadline = time.monotonic() + timeout
+	while cache.inflight:
+		if time.monotonic() > deadline:
+			raise TimeoutError("downloads did not finish")
+		app.processEvents()
+		time.sleep(0.002)
+	app.processEvents()
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--favorites", type=int, default=12)
+	parser.add_argument("--plays", type=int, default=300)
+	parser.add_argument("--video-mb", type=float, default=8.0, help="mean video size (audio adds 1/12)")
+	parser.add_argument("--budget", type=float, default=0.4, help="cache size as a fraction of all favorites")
+	parser.add_argument("--workers", type=int, default=2, help="concurrent downloads")
+	parser.add_argument("--uplink-mbps", type=float, default=0, help="throttle the origin (0 = unlimited)")
+	parser.add_argument("--output", help="append the JSON result to this file")
+	args = parser.parse_args()
+
+	app = QCoreApplication.instance() or QCoreApplication([])
+	origin = Origin({}, args.uplink_mbps)
+	threading.Thread(target=origin.serve_forever, daemon=True).start()
+	infos = favorites(origin, args.favorites, args.video_mb)
+	total = sum(origin.sizes.values())
+	budget = int(total * args.budget)
+	streams = types.SimpleNamespace(lookup=infos.get)
+	plays = schedule(list(infos), args.plays)
+
+	with tempfile.TemporaryDirectory() as tmpdir:
+		cache = ai_window.MediaCache(streams, path=tmpdir, budget=budget, workers=args.workers)
+		started = time.monotonic()
+		cache.set_urls(list(infos))
+		settle(app, cache)
+		prefetch = {"seconds": round(time.monotonic() - started, 3), "videos": len(cache.entries), "bytes": cache.size}
+
+		lookups = []
+		streamed = 0
+		for url in plays:
+			start = time.perf_counter()
+			cache.record_play(url)
+			local = cache.lookup(url)
+			lookups.append((time.perf_counter() - start) * 1e6)
+			if local is None:
+				streamed += play_bytes(origin, url)
+			settle(app, cache)
+		stats = cache.stats()
+		played_bytes = sum(play_bytes(origin, url) for url in plays)
+		on_disk = sum(os.path.getsize(os.path.join(tmpdir, name)) for name in os.listdir(tmpdir) if name != "index.json")
+		cache.shutdown()
+
+		reopened = ai_window.MediaCache(streams, path=tmpdir, budget=budget, workers=args.workers)
+		restart = {"videos": len(reopened.entries), "bytes": reopened.size}
+		reopened.shutdown()
+
+	origin.shutdown()
+	download_seconds = sum(h["sum"] for h in ai_window.metrics.snapshot()["histograms"] if h["name"] == "media_download_seconds")
+	# Without the cache every play streams the whole video from the origin
+	origin_bytes = streamed + stats["downloaded_bytes"]
+	results = {
+		"favorites": args.favorites,
+		"plays": args.plays,
+		"budget_mb": round(budget / MB, 1),
+		"all_favorites_mb": round(total / MB, 1),
+		"prefetch": prefetch,
+		"hit_rate": stats["hit_rate"],
+		"bytes_saved_mb": round(stats["bytes_saved"] / MB, 1),
+		"origin_mb_without_cache": round(played_bytes / MB, 1),
+		"origin_mb_with_cache": round(origin_bytes / MB, 1),
+		"origin_traffic_saved": round(1 - origin_bytes / played_bytes, 3),
+		"downloads": stats["downloads"],
+		"evictions": stats["evictions"],
+		"cache_mb_on_disk": round(on_disk / MB, 1),
+		"within_budget": on_disk <= budget,
+		"max_concurrent_downloads": origin.max_concurrent,
+		"download_limit": args.workers,
+		"download_mb_per_s": round(stats["downloaded_bytes"] / MB / download_seconds, 1) if download_seconds else None,
+		"lookup_us": {k: round(v, 2) for k, v in percentiles(lookups).items()},
+		"after_restart": restart,
+	}
+	emit("media_cache", results, args.output)
+
+
+if __name__ == "__main__":
+	main()
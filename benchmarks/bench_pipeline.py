@@ -0,0 +1,758 @@
+"""Offline benchmarks for the command, audio and search paths.
+
+Uses fake_mpv (a UNIX-socket stand-in for mpv's JSON IPC) and fake_live
+(a scripted Gemini Live session), so no mpv, microphone or API key is
+needed. Sections:
+
+	mpv      MPVClient.command round trips and pipelined throughput,
+	         handle_lan_commands batches
+	lan      the same commands through CommandServer over TCP and HTTP
+	jitter   JitterBuffer (AudioPlayer's buffer) on a virtual clock with
+	         steady, jittery and stalling arrival schedules
+	framing  AudioFramer + VAD CPU per upstream frame
+	live     LiveSession against the fake Live API: sender throughput,
+	         activate-to-first-audio and tool-call dispatch overhead
+	search   SearchWorker dispatch latency for cache hits, the Resolver
+	         and speculative futures
+	bargein  server interruption received -> jitter buffer flushed and
+	         sink reset, with the GUI thread idle and busy, and how much
+	         queued speech would otherwise have kept playing
+	transport  downstream audio handoff from the session thread to the
+	         sink's buffer: a queued Qt signal per chunk vs the lock-free
+	         ring buffer, with the GUI thread idle and busy
+	fanout   PlayerRegistry broadcasts to 1/8/32 fake mpv sockets and to
+	         remote nodes (a CommandServer + fake mpv each), against
+	         sending to the same players one round trip at a time; a
+	         targeted LAN message end to end; a hung player timing out
+	supervisor  MPVSupervisor running fake_mpv as its mpv process: cold
+	         start to IPC ready, then kill -9 repeatedly and time crash ->
+	         ready and crash -> video restored, checking that commands
+	         issued while mpv was down were applied after the restart
+
+One JSON line is printed per run (see _common.emit); pass --output to
+append it to a file and compare commits.
+"""
+import argparse
+import collections
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import types
+
+from _common import FakeBackend, emit, import_ai_window, percentiles, playout, synthetic_speech
+
+ai_window = import_ai_window()
+
+from PyQt6.QtCore import QCoreApplication, QMetaObject, QObject, Qt, QTimer, pyqtSignal
+
+from fake_live import BARGE_IN_SCHEDULE, DEFAULT_SCHEDULE, SCENE_SCHEDULE, FakeLiveClient
+from fake_mpv import FakeMPV
+
+
+def summarize(samples_ms):
+	return {"n": len(samples_ms), "mean_ms": round(sum(samples_ms) / len(samples_ms), 4), **{k: round(v, 4) for k, v in percentiles(samples_ms).items()}}
+
+
+def wait_for(predicate, timeout=5.0):
+	deadline = time.monotonic() + timeout
+	while not predicate():
+		if time.monotonic() > deadline:
+			raise TimeoutError("condition not reached")
+		time.sleep(0.001)
+
+
+class Host:
+	"""The parts of AIWindow that the remote-command path touches."""
+	handle_lan_commands = ai_window.AIWindow.handle_lan_commands
+	expand_commands = ai_window.AIWindow.expand_commands
+	load_commands = ai_window.AIWindow.load_commands
+	record_plays = ai_window.AIWindow.record_plays
+
+	def __init__(self, mpv, players=None):
+		self.mpv = mpv
+		self.players = players
+		self.pre_resolver = types.SimpleNamespace(lookup=lambda url: None)
+		self.playlist = set()
+		self.load_started = None
+
+	def update_heart_ui(self, is_favorite):
+		pass
+
+
+def start_mpv(tmpdir, name="mpv.sock", reply_delay=0.0):
+	fake = FakeMPV(os.path.join(tmpdir, name), reply_delay=reply_delay).start()
+	client = ai_window.MPVClient(fake.path)
+	client.start()
+	wait_for(lambda: client.sock is not None)
+	return fake, client
+
+
+def stop_mpv(fake, client):
+	client.stop()
+	client.wait()
+	fake.stop()
+
+
+def bench_mpv(n, tmpdir):
+	fake, client = start_mpv(tmpdir)
+	host = Host(client)
+	results = {}
+
+	samples = []
+	for _ in range(n):
+		start = time.perf_counter()
+		client.command(["get_property", "volume"]).result(timeout=5)
+		samples.append((time.perf_counter() - start) * 1000)
+	results["command_roundtrip"] = summarize(samples)
+
+	start = time.perf_counter()
+	futures = [client.command(["set_property", "volume", i % 100]) for i in range(n)]
+	for future in futures:
+		future.result(timeout=5)
+	elapsed = time.perf_counter() - start
+	results["command_pipelined"] = {"n": n, "commands_per_sec": round(n / elapsed)}
+
+	for size in (1, 10):
+		batches = max(1, n // size)
+		start = time.perf_counter()
+		dones = []
+		for i in range(batches):
+			done = ai_window.concurrent.futures.Future()
+			host.handle_lan_commands([["set_property", "volume", (i + j) % 100] for j in range(size)], None, done)
+			dones.append(done)
+		for done in dones:
+			for future in done.result():
+				future.result(timeout=5)
+		elapsed = time.perf_counter() - start
+		results[f"handle_lan_commands_batch{size}"] = {"n": batches * size, "commands_per_sec": round(batches * size / elapsed)}
+
+	# loadfile expands into several mpv commands sent in one write
+	start = time.perf_counter()
+	for i in range(n // 10):
+		done = ai_window.concurrent.futures.Future()
+		host.handle_lan_commands([["loadfile", f"https://www.youtube.com/watch?v=bench{i}"]], None, done)
+		done.result()[0].result(timeout=5)
+	results["handle_lan_commands_loadfile"] = summarize_rate(n // 10, time.perf_counter() - start)
+	results["mpv_commands_seen"] = fake.commands
+	stop_mpv(fake, client)
+	return results
+
+
+def summarize_rate(n, elapsed):
+	return {"n": n, "per_sec": round(n / elapsed), "mean_ms": round(elapsed / n * 1000, 4)}
+
+
+def bench_lan(app, n, tmpdir):
+	fake, client = start_mpv(tmpdir)
+	host = Host(client)
+	server = ai_window.CommandServer(lan_port=0, http_port=0, host="127.0.0.1")
+	server.commands_received.connect(host.handle_lan_commands)
+	server.start()
+	server.ready.wait(5)
+	results = {}
+
+	def run():
+		try:
+			conn = socket.create_connection(("127.0.0.1", server.ports["lan"]))
+			reader = conn.makefile("rb")
+			samples = []
+			for i in range(n):
+				start = time.perf_counter()
+				conn.sendall(json.dumps({"command": ["set_property", "volume", i % 100]}).encode() + b"\n")
+				assert json.loads(reader.readline())["status"] == "success"
+				samples.append((time.perf_counter() - start) * 1000)
+			results["lan_roundtrip"] = summarize(samples)
+
+			# Many messages on one connection without waiting for acks
+			start = time.perf_counter()
+			conn.sendall(b"".join(json.dumps({"command": ["set_property", "volume", i % 100]}).encode() + b"\n" for i in range(n)))
+			for _ in range(n):
+				reader.readline()
+			results["lan_streamed"] = summarize_rate(n, time.perf_counter() - start)
+
+			batch = json.dumps({"commands": [["set_property", "volume", j] for j in range(10)]}).encode() + b"\n"
+			start = time.perf_counter()
+			for _ in range(n // 10):
+				conn.sendall(batch)
+				reader.readline()
+			results["lan_batch10_commands"] = summarize_rate(n // 10 * 10, time.perf_counter() - start)
+			conn.close()
+
+			http_conn = http.client.HTTPConnection("127.0.0.1", server.ports["http"])
+			samples = []
+			for i in range(n // 2):
+				start = time.perf_counter()
+				http_conn.request("POST", "/mpv", body=json.dumps({"command": ["set_property", "volume", i % 100]}))
+				http_conn.getresponse().read()
+				samples.append((time.perf_counter() - start) * 1000)
+			results["http_keepalive_roundtrip"] = summarize(samples)
+			http_conn.close()
+		finally:
+			QMetaObject.invokeMethod(app, "quit", Qt.ConnectionType.QueuedConnection)
+
+	thread = threading.Thread(target=run)
+	thread.start()
+	app.exec()
+	thread.join()
+	server.stop()
+	server.wait()
+	stop_mpv(fake, client)
+	return results
+
+
+def arrivals(kind, seconds, chunk_ms=40, seed=1):
+	"""Arrival times of downstream chunks for one utterance."""
+	rng = random.Random(seed)
+	count = int(seconds * 1000 / chunk_ms)
+	times = []
+	for i in range(count):
+		ideal = i * chunk_ms / 1000
+		if kind == "steady":
+			t = ideal
+		elif kind == "jittery":
+			t = ideal + rng.expovariate(1 / 0.05)
+		elif kind == "burst":
+			# Gemini often sends audio faster than real time in bursts
+			t = (i // 10) * 10 * chunk_ms / 1000 * 0.9
+		elif kind == "stall":
+			t = ideal + (0.4 if i > count // 2 else 0.0)
+		times.append(max(t, times[-1] if times else 0.0))
+	return times
+
+
+def bench_jitter(seconds=10.0, turns=4, pause=3.0):
+	chunk = bytes(int(48000 * 0.04))
+	results = {kind: playout(ai_window, [(t, chunk) for t in arrivals(kind, seconds)]) for kind in ("steady", "jittery", "burst", "stall")}
+	# Several turns over the same jittery link: the target learned in one turn carries over to the next
+	schedule = []
+	start = 0.0
+	for turn in range(turns):
+		times = arrivals("jittery", seconds / 2, seed=turn + 1)
+		schedule.extend((start + t, chunk) for t in times)
+		start += times[-1] + pause
+	results["jittery_turns"] = playout(ai_window, schedule)
+	return results
+
+
+def random_chunks(data, seed=3):
+	rng = random.Random(seed)
+	pos = 0
+	while pos < len(data):
+		size = rng.randrange(160, 3200, 2) # 5-100 ms at 16 kHz
+		yield data[pos:pos + size]
+		pos += size
+
+
+def bench_framing(seconds=60.0):
+	audio = synthetic_speech(seconds)
+	chunks = list(random_chunks(audio))
+	framer = ai_window.AudioFramer(int(16000 * 2 * ai_window.AUDIO_FRAME_MS / 1000))
+	vad = ai_window.VoiceActivityDetector()
+	frames = 0
+	start = time.process_time()
+	for data in chunks:
+		for frame in framer.feed(data):
+			frames += 1
+			vad.process(frame)
+	cpu = time.process_time() - start
+	return {
+		"audio_seconds": seconds,
+		"frames": frames,
+		"cpu_us_per_frame": round(cpu / frames * 1e6, 2),
+		"realtime_factor": round(seconds / cpu) if cpu else None,
+		"vad_suppressed_ratio": round(vad.suppressed_ratio(), 3),
+	}
+
+
+def bench_live(rounds=5):
+	results = {}
+	audio = synthetic_speech(30.0)
+	frame_bytes = int(16000 * 2 * ai_window.AUDIO_FRAME_MS / 1000)
+	frames = [audio[i:i + frame_bytes] for i in range(0, len(audio) - frame_bytes + 1, frame_bytes)]
+
+	fake = FakeLiveClient(schedule=DEFAULT_SCHEDULE, connect_delay=0.05)
+	session = ai_window.LiveSession()
+	session.client = fake
+	first_audio = []
+	session.audio_received.connect(lambda data: first_audio.append(time.monotonic()), Qt.ConnectionType.DirectConnection)
+	session.start()
+	wait_for(lambda: session.session is not None)
+
+	# activate -> first downstream audio, minus the scripted server delay
+	scripted = DEFAULT_SCHEDULE[0][0] + DEFAULT_SCHEDULE[1][0]
+	overhead = []
+	for _ in range(rounds):
+		first_audio.clear()
+		start = time.monotonic()
+		session.activate(50)
+		wait_for(lambda: first_audio)
+		overhead.append((first_audio[0] - start - scripted) * 1000)
+		time.sleep(1.2) # let the scripted turn finish
+	results["activate_to_first_audio_overhead"] = summarize(overhead)
+
+	# upstream: feed 30 s of audio as fast as possible through VAD and sender
+	sent_before = len(fake.upstream)
+	start = time.perf_counter()
+	for frame in frames:
+		session.add_audio_input(frame)
+	expected = session.vad.sent_frames
+	wait_for(lambda: len(fake.upstream) - sent_before >= expected, timeout=30)
+	elapsed = time.perf_counter() - start
+	results["upstream"] = {"frames_in": len(frames), "frames_sent": expected, "frames_per_sec": round(len(frames) / elapsed)}
+
+	# tool call received -> on_exec_cmd emitted
+	fake.schedule = SCENE_SCHEDULE
+	commands = []
+	session.on_exec_cmd.connect(lambda cmd: commands.append(time.monotonic()), Qt.ConnectionType.DirectConnection)
+	dispatch = []
+	for _ in range(rounds):
+		commands.clear()
+		session.activate(50)
+		wait_for(lambda: commands)
+		sent = [t for t, kind in fake.sent if kind == "tool"][-1]
+		dispatch.append((commands[0] - sent) * 1000)
+		time.sleep(0.8)
+	results["tool_call_dispatch"] = summarize(dispatch)
+	session.standby()
+	session.stop()
+	session.wait()
+	return results
+
+
+def bench_search(n, tmpdir):
+	cache = ai_window.SearchCache(os.path.join(tmpdir, "search_cache.json"))
+	resolver = ai_window.Resolver(FakeBackend())
+	resolver.warm_up().result()
+	cache.put("cached keyword", "https://www.youtube.com/watch?v=cached")
+	results = {}
+	variants = {
+		"cache_hit": lambda i: ai_window.SearchWorker("cached keyword", cache, resolver),
+		"resolver": lambda i: ai_window.SearchWorker(f"keyword {i}", None, resolver),
+		"speculative": lambda i: ai_window.SearchWorker(f"keyword {i}", None, resolver, resolver.search(f"keyword {i}")),
+	}
+	for name, make in variants.items():
+		samples = []
+		for i in range(n):
+			worker = make(i)
+			done = threading.Event()
+			worker.finished.connect(lambda url: done.set(), Qt.ConnectionType.DirectConnection)
+			start = time.perf_counter()
+			worker.start()
+			done.wait(5)
+			samples.append((time.perf_counter() - start) * 1000)
+			worker.wait()
+		results[name] = summarize(samples)
+	resolver.shutdown()
+	return results
+
+
+class FakeSink:
+	"""QAudioSink stand-in: a 200 ms hardware buffer drained by a timer."""
+	def __init__(self, buffer, period=0.01):
+		self.buffer = buffer
+		self.size = int(buffer.bytes_per_sec * 0.2)
+		self.queued = 0
+		self.request = int(buffer.bytes_per_sec * period)
+		self.stale = False # between the jitter buffer flush and the sink reset
+		self.stale_read = 0
+
+	def bufferSize(self):
+		return self.size
+
+	def bytesFree(self):
+		return self.size - self.queued
+
+	def reset(self):
+		self.queued = 0
+		self.stale = False
+
+	def start(self, device):
+		pass
+
+	def tick(self):
+		# Play one period from the hardware buffer, then refill it from the jitter buffer
+		self.queued -= min(self.queued, self.request)
+		data = self.buffer.readData(self.size - self.queued)
+		if self.stale:
+			self.stale_read += len(data)
+		self.queued += len(data)
+
+
+class PlayerHost(QObject):
+	"""AudioPlayer's play/flush/interrupt on a JitterBuffer and FakeSink, living in the GUI thread."""
+	play = ai_window.AudioPlayer.play
+	interrupt = ai_window.AudioPlayer.interrupt
+
+	def __init__(self, capacity_sec=5.0):
+		super().__init__()
+		self.buffer = ai_window.JitterBuffer(48000, 2, capacity_sec=capacity_sec, parent=self)
+		self.buffer.open(ai_window.QIODevice.OpenModeFlag.ReadOnly)
+		self.converter = None
+		self.sink = FakeSink(self.buffer)
+		self._log_tick = 0
+		self.flushes = []
+		self.resets = []
+		self.arrivals = []
+
+	def flush(self):
+		# Called from the session thread
+		queued = self.sink.queued
+		dropped = ai_window.AudioPlayer.flush(self)
+		self.sink.stale = True
+		self.flushes.append((time.monotonic(), dropped + queued))
+		return dropped
+
+	def on_interrupted(self):
+		self.interrupt()
+		self.resets.append(time.monotonic())
+
+	def on_audio(self, data):
+		self.play(data)
+		self.arrivals.append(time.monotonic())
+
+
+class Emitter(QObject):
+	audio = pyqtSignal(bytes)
+
+
+def pump(app, predicate, timeout=5.0):
+	deadline = time.monotonic() + timeout
+	while not predicate():
+		if time.monotonic() > deadline:
+			raise TimeoutError("condition not reached")
+		app.processEvents()
+		time.sleep(0.0005)
+
+
+class GuiLoad:
+	"""Timers for the sink and for simulated UI work in the GUI thread.
+
+	The UI work blocks the event loop without holding the GIL, like Qt
+	painting in C++; queued signals wait until it returns.
+	"""
+	def __init__(self, sink, busy_ms=0):
+		self.busy_ms = busy_ms
+		self.sink_timer = QTimer()
+		self.sink_timer.timeout.connect(sink.tick)
+		self.sink_timer.start(10)
+		self.load_timer = QTimer()
+		self.load_timer.timeout.connect(lambda: time.sleep(self.busy_ms / 1000))
+		self.load_timer.start(20)
+
+	def stop(self):
+		self.sink_timer.stop()
+		self.load_timer.stop()
+
+
+def bench_bargein(app, rounds=5):
+	fake = FakeLiveClient(schedule=BARGE_IN_SCHEDULE)
+	session = ai_window.LiveSession(record_path=None, replay_path=None)
+	session.client = fake
+	host = PlayerHost()
+	session.audio_output = host
+	session.interrupted.connect(host.on_interrupted)
+	load = GuiLoad(host.sink)
+	session.start()
+	pump(app, lambda: session.session is not None)
+	results = {}
+	for busy_ms in (0, 15):
+		load.busy_ms = busy_ms
+		flush = []
+		reset = []
+		stale = []
+		leaked = []
+		for _ in range(rounds):
+			host.flushes.clear()
+			host.resets.clear()
+			host.sink.stale_read = 0
+			sent_before = len(fake.sent)
+			session.activate(50)
+			pump(app, lambda: host.resets)
+			pump(app, lambda: any(kind == "turn_complete" for _, kind in fake.sent[sent_before:]))
+			app.processEvents()
+			sent = [t for t, kind in fake.sent[sent_before:] if kind == "interrupted"][0]
+			flushed_at, queued = host.flushes[0]
+			flush.append((flushed_at - sent) * 1000)
+			reset.append((host.resets[0] - sent) * 1000)
+			stale.append(queued / host.buffer.bytes_per_sec * 1000)
+			leaked.append(host.sink.stale_read / host.buffer.bytes_per_sec * 1000)
+			session.standby()
+			time.sleep(0.1)
+		results[f"gui_busy_{busy_ms}ms"] = {
+			"interrupt_to_buffer_flush": summarize(flush),
+			"interrupt_to_sink_reset": summarize(reset),
+			"stale_speech_dropped_ms": round(sum(stale) / len(stale)),
+			"read_after_flush_ms": round(max(leaked)),
+		}
+	load.stop()
+	session.stop()
+	session.wait()
+	return results
+
+
+def bench_transport(app, chunks=400, interval=0.005):
+	"""Downstream audio handoff: a queued Qt signal per chunk vs writing the ring buffer directly."""
+	chunk = bytes(int(48000 * 0.04))
+	results = {}
+	for busy_ms in (0, 15):
+		for mode in ("queued_signal", "ring"):
+			host = PlayerHost(capacity_sec=60.0)
+			emitter = Emitter()
+			emitter.audio.connect(host.on_audio)
+			load = GuiLoad(host.sink, busy_ms)
+			produced = []
+			cost = []
+			def producer():
+				for _ in range(chunks):
+					start = time.monotonic()
+					produced.append(start)
+					if mode == "ring":
+						host.play(chunk)
+						host.arrivals.append(time.monotonic())
+					else:
+						emitter.audio.emit(chunk)
+					cost.append((time.monotonic() - start) * 1e6)
+					time.sleep(interval)
+			thread = threading.Thread(target=producer)
+			thread.start()
+			pump(app, lambda: len(host.arrivals) == chunks, timeout=30)
+			thread.join()
+			load.stop()
+			handoff = [(a - p) * 1000 for p, a in zip(produced, host.arrivals)]
+			results[f"gui_busy_{busy_ms}ms"] = results.get(f"gui_busy_{busy_ms}ms", {})
+			results[f"gui_busy_{busy_ms}ms"][mode] = {
+				"producer_us_per_chunk": round(percentiles(cost)["p50"], 2),
+				"handoff_ms": {k: round(v, 3) for k, v in percentiles(handoff).items()},
+			}
+	# GUI-thread time the queued path costs per chunk (event dispatch + slot); the ring path costs none
+	host = PlayerHost(capacity_sec=600.0)
+	emitter = Emitter()
+	emitter.audio.connect(host.on_audio)
+	thread = threading.Thread(target=lambda: [emitter.audio.emit(chunk) for _ in range(5000)])
+	thread.start()
+	thread.join()
+	start = time.thread_time()
+	pump(app, lambda: len(host.arrivals) == 5000, timeout=30)
+	results["queued_signal_gui_us_per_chunk"] = round((time.thread_time() - start) / 5000 * 1e6, 2)
+	return results
+
+
+def stalled_peer(rounds=200, payload=64 << 10):
+	"""A LAN peer that accepts but never reads: commands() must still return at once."""
+	listener = socket.create_server(("127.0.0.1", 0))
+	client = ai_window.RemotePlayerClient("127.0.0.1", listener.getsockname()[1])
+	client.start()
+	peer, _ = listener.accept()
+	wait_for(lambda: client.connected)
+	filler = "x" * payload
+	samples = []
+	for _ in range(rounds):
+		start = time.perf_counter()
+		client.command(["script-message", filler])
+		samples.append((time.perf_counter() - start) * 1000)
+	result = {"queued_mb": round(rounds * payload / (1 << 20), 1), "call_ms": summarize(samples), "max_call_ms": round(max(samples), 3)}
+	client.stop()
+	client.wait()
+	peer.close()
+	listener.close()
+	return result
+
+
+def bench_fanout(app, tmpdir, sizes=(1, 8, 32), remotes=4, rounds=50, mpv_delay=0.002):
+	"""Each fake mpv takes mpv_delay to answer, like a busy player."""
+	screens = [start_mpv(tmpdir, f"screen{i}.sock", mpv_delay) for i in range(max(sizes))]
+	nodes = []
+	for i in range(remotes):
+		fake, client = start_mpv(tmpdir, f"node{i}.sock", mpv_delay)
+		host = Host(client)
+		server = ai_window.CommandServer(lan_port=0, http_port=0, host="127.0.0.1")
+		server.commands_received.connect(host.handle_lan_commands)
+		server.start()
+		server.ready.wait(5)
+		nodes.append((fake, client, server, host))
+	hung = FakeMPV(os.path.join(tmpdir, "hung.sock"), reply_delay=30).start()
+	local_fake, local = start_mpv(tmpdir, "local.sock", mpv_delay)
+
+	players = {f"screen{i}": fake.path for i, (fake, _) in enumerate(screens)}
+	players.update({f"node{i}": f"127.0.0.1:{server.ports['lan']}" for i, (_, _, server, _) in enumerate(nodes)})
+	players["hung"] = hung.path
+	groups = {f"screens{n}": [f"screen{i}" for i in range(n)] for n in sizes}
+	groups["nodes"] = [f"node{i}" for i in range(remotes)]
+	groups["room"] = ["local"] + groups["screens8"] + groups["nodes"]
+	groups["room_hung"] = groups["room"] + ["hung"]
+	config = os.path.join(tmpdir, "players.json")
+	with open(config, "w") as f:
+		json.dump({"players": players, "groups": groups}, f)
+	registry = ai_window.PlayerRegistry(local, path=config)
+	registry.start()
+	wait_for(lambda: all(client.connected for client in registry.players.values()))
+	front_host = Host(local, registry)
+	front = ai_window.CommandServer(lan_port=0, http_port=0, host="127.0.0.1")
+	front.commands_received.connect(front_host.handle_lan_commands)
+	front.start()
+	front.ready.wait(5)
+	results = {}
+
+	def compare(group):
+		names = registry.resolve(group)
+		serial = []
+		fanout = []
+		for i in range(rounds):
+			cmd = ["set_property", "volume", i % 100]
+			start = time.perf_counter()
+			for name in names:
+				registry.players[name].command(cmd).result(timeout=5)
+			serial.append((time.perf_counter() - start) * 1000)
+			start = time.perf_counter()
+			acks = registry.broadcast([cmd], group)
+			for futures in acks.values():
+				futures[0].result(timeout=5)
+			fanout.append((time.perf_counter() - start) * 1000)
+		return {"players": len(names), "serial_ms": summarize(serial), "broadcast_ms": summarize(fanout)}
+
+	def run():
+		try:
+			for n in sizes:
+				results[f"ipc_{n}"] = compare(f"screens{n}")
+			results[f"remote_{remotes}"] = compare("nodes")
+
+			conn = socket.create_connection(("127.0.0.1", front.ports["lan"]))
+			reader = conn.makefile("rb")
+			samples = []
+			for i in range(rounds):
+				start = time.perf_counter()
+				conn.sendall(json.dumps({"command": ["set_property", "volume", i % 100], "target": "room"}).encode() + b"\n")
+				ack = json.loads(reader.readline())
+				assert ack["status"] == "success", ack
+				samples.append((time.perf_counter() - start) * 1000)
+			results["lan_targeted_room"] = {"players": len(ack["nodes"]), **summarize(samples)}
+
+			timeout = ai_window.COMMAND_ACK_TIMEOUT
+			ai_window.COMMAND_ACK_TIMEOUT = 0.5
+			start = time.perf_counter()
+			conn.sendall(json.dumps({"command": ["set_property", "pause", False], "target": "room_hung"}).encode() + b"\n")
+			ack = json.loads(reader.readline())
+			ai_window.COMMAND_ACK_TIMEOUT = timeout
+			statuses = collections.Counter(node.get("error", node["status"]) for node in ack["nodes"].values())
+			results["lan_targeted_with_hung_player"] = {"ack_timeout_ms": 500, "ack_ms": round((time.perf_counter() - start) * 1000, 1), "nodes": dict(statuses)}
+			conn.close()
+		finally:
+			QMetaObject.invokeMethod(app, "quit", Qt.ConnectionType.QueuedConnection)
+
+	thread = threading.Thread(target=run)
+	thread.start()
+	app.exec()
+	thread.join()
+	results["stalled_peer"] = stalled_peer()
+	results["stats"] = registry.stats()
+	front.stop()
+	front.wait()
+	registry.stop()
+	for fake, client, server, _ in nodes:
+		server.stop()
+		server.wait()
+		stop_mpv(fake, client)
+	for fake, client in screens:
+		fake.stop()
+	stop_mpv(local_fake, local)
+	hung.stop()
+	return results
+
+
+def bench_supervisor(app, tmpdir, rounds=5):
+	path = os.path.join(tmpdir, "supervised.sock")
+	command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_mpv.py"), "--socket", path, "--load-delay", "0.05"]
+	client = ai_window.MPVClient(path)
+	state = ai_window.MPVState(client)
+
+	def restore():
+		cmds = [["set_property", "volume", state.volume]]
+		if not state.idle and state.path:
+			cmds.append(["loadfile", state.path, "replace"])
+		return cmds
+
+	supervisor = ai_window.MPVSupervisor(client, state, restore, command=command, path=path)
+	start = time.monotonic()
+	supervisor.start()
+	client.start()
+	pump(app, lambda: supervisor.ready, timeout=15)
+	results = {"cold_start_to_ready_ms": round((time.monotonic() - start) * 1000, 1)}
+	url = "https://www.youtube.com/watch?v=supervised"
+	client.command(["loadfile", url, "replace"])
+	pump(app, lambda: state.path == url and state.idle is False)
+
+	ready = []
+	restored = []
+	backoff = []
+	lost = 0
+	for i in range(rounds):
+		backoff.append(supervisor.backoff)
+		crashed = time.monotonic()
+		os.kill(supervisor.process.processId(), signal.SIGKILL)
+		pump(app, lambda: not supervisor.ready)
+		# Issued while mpv is down: must reach the restarted mpv after the restored video
+		volume = 10 + i
+		futures = [client.command(["set_property", "volume", volume]), client.command(["show-text", f"restart {i}"])]
+		pump(app, lambda: supervisor.ready, timeout=60)
+		ready.append((time.monotonic() - crashed) * 1000)
+		pump(app, lambda: state.path == url and state.idle is False and not supervisor.restoring)
+		restored.append((time.monotonic() - crashed) * 1000)
+		applied = client.command(["get_property", "volume"]).result(timeout=5)
+		lost += sum(1 for f in futures if f.exception(timeout=5) is not None) + (applied != volume)
+
+	results["kill_to_ready"] = summarize(ready)
+	results["kill_to_video_restored"] = summarize(restored)
+	results["restart_backoff_s"] = backoff
+	results["commands_lost_during_restart"] = lost
+	results["stats"] = supervisor.stats()
+	client.stop()
+	client.wait()
+	supervisor.stop()
+	return results
+
+
+SECTIONS = ("mpv", "lan", "jitter", "framing", "live", "search", "bargein", "transport", "fanout", "supervisor")
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("-n", type=int, default=1000, help="commands per mpv/lan variant")
+	parser.add_argument("--only", nargs="+", choices=SECTIONS, default=SECTIONS)
+	parser.add_argument("--output", help="append the JSON result to this file")
+	args = parser.parse_args()
+
+	app = QCoreApplication.instance() or QCoreApplication([])
+	results = {}
+	with tempfile.TemporaryDirectory() as tmpdir:
+		if "mpv" in args.only:
+			results["mpv"] = bench_mpv(args.n, tmpdir)
+		if "lan" in args.only:
+			results["lan"] = bench_lan(app, args.n, tmpdir)
+		if "jitter" in args.only:
+			results["jitter"] = bench_jitter()
+		if "framing" in args.only:
+			results["framing"] = bench_framing()
+		if "live" in args.only:
+			results["live"] = bench_live()
+		if "search" in args.only:
+			results["search"] = bench_search(max(10, args.n // 10), tmpdir)
+		if "bargein" in args.only:
+			results["bargein"] = bench_bargein(app)
+		if "transport" in args.only:
+			results["transport"] = bench_transport(app)
+		if "fanout" in args.only:
+			results["fanout"] = bench_fanout(app, tmpdir)
+		if "supervisor" in args.only:
+			results["supervisor"] = bench_supervisor(app, tmpdir)
+	emit("pipeline", results, args.output)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,113 @@
+"""Replay a recorded Live session through LiveSession as a regression run.
+
+Record a real conversation by starting the app with
+AIWINDOW_LIVE_RECORD=/path/to/session.aiwlive, then:
+
+	python bench_replay.py /path/to/session.aiwlive --speed 4
+
+The recording is fed through LiveSession's receiver and dispatch code;
+downstream audio is played out through a JitterBuffer on the recording's
+own timeline (so --speed does not distort the buffer numbers) and tool
+calls are timed against their recorded arrival. Without a real recording,
+--make-sample writes a synthetic one from the fake Live API first.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from _common import emit, import_ai_window, playout, synthetic_speech
+
+ai_window = import_ai_window()
+
+from google.genai import types
+from PyQt6.QtCore import Qt
+
+from fake_live import SCENE_SCHEDULE, FakeLiveClient
+
+
+def make_sample(path):
+	"""Record a scripted session: mic audio, a greeting and a scene change."""
+	session = ai_window.LiveSession(record_path=path, replay_path=None)
+	session.client = FakeLiveClient(schedule=SCENE_SCHEDULE)
+	session.start()
+	while session.session is None:
+		time.sleep(0.01)
+	audio = synthetic_speech(3.0)
+	frame = int(16000 * 2 * ai_window.AUDIO_FRAME_MS / 1000)
+	session.activate(50)
+	for i in range(0, len(audio) - frame + 1, frame):
+		session.add_audio_input(audio[i:i + frame])
+		time.sleep(ai_window.AUDIO_FRAME_MS / 1000)
+	time.sleep(1.0)
+	session.standby()
+	session.stop()
+	session.wait()
+
+
+def recorded_tool_calls(path):
+	times = []
+	for ts, kind, payload in ai_window.LiveRecording.read(path):
+		if kind == ai_window.LiveRecording.DOWN_MESSAGE:
+			if types.LiveServerMessage.model_validate_json(payload).tool_call:
+				times.append(ts)
+	return times
+
+
+def replay(path, speed):
+	session = ai_window.LiveSession(record_path=None, replay_path=path, replay_speed=speed)
+	audio = []
+	commands = []
+	finished = threading.Event()
+	# DirectConnection: timestamps are taken in the session thread, without a Qt event loop
+	session.audio_received.connect(lambda data: audio.append((time.monotonic(), data)), Qt.ConnectionType.DirectConnection)
+	session.on_exec_cmd.connect(lambda cmd: commands.append((time.monotonic(), cmd)), Qt.ConnectionType.DirectConnection)
+	session.replay_finished.connect(finished.set, Qt.ConnectionType.DirectConnection)
+	session.start()
+	finished.wait()
+	time.sleep(0.2) # let the receiver drain the last messages
+	# Map wall-clock timestamps back onto the recording's timeline
+	start = session.client.started_at
+	scale = speed if speed > 0 else 1.0
+	wall = time.monotonic() - start
+	session.stop()
+	session.wait()
+	return [((t - start) * scale, data) for t, data in audio], [((t - start) * scale, cmd) for t, cmd in commands], wall
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("recording", nargs="?", help="file written with AIWINDOW_LIVE_RECORD")
+	parser.add_argument("--speed", type=float, default=1.0, help="replay speed; 0 replays as fast as possible")
+	parser.add_argument("--make-sample", action="store_true", help="record a synthetic session first")
+	parser.add_argument("--output", help="append the JSON result to this file")
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as tmpdir:
+		path = args.recording
+		if args.make_sample or not path:
+			path = path or os.path.join(tmpdir, "sample.aiwlive")
+			make_sample(path)
+		audio, commands, wall = replay(path, args.speed)
+		tool_calls = recorded_tool_calls(path)
+		size = os.path.getsize(path)
+
+	results = {
+		"recording_bytes": size,
+		"speed": args.speed,
+		"wall_seconds": round(wall, 3),
+		"downstream_audio_seconds": round(sum(len(data) for _, data in audio) / 48000, 3),
+		"commands": [cmd for _, cmd in commands],
+	}
+	if audio:
+		results["playout"] = playout(ai_window, audio)
+	if args.speed > 0 and commands and tool_calls:
+		# How long after its recorded arrival each tool call reached on_exec_cmd
+		lags = [(t - recorded) * 1000 for (t, _), recorded in zip(commands, tool_calls)]
+		results["tool_call_dispatch_ms"] = [round(lag, 2) for lag in lags]
+	emit("replay", results, args.output)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,103 @@
+"""AudioConverter cost and quality for common device formats.
+
+playback: Gemini's 24 kHz mono Int16 output is converted into each output
+device format. capture: each common microphone format is converted into
+the 16 kHz mono Int16 that LiveSession sends. Input is fed in 100 ms
+chunks (plus one frame, to exercise the carried state). Reported per
+format: time per 100 ms chunk, the share of one CPU core that works out
+to in real time, and the SNR of a 1 kHz test tone, measured with an FFT
+on the converted signal.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from _common import emit, import_ai_window, percentiles
+
+ai_window = import_ai_window()
+
+OUTPUT_FORMATS = [
+	(48000, 2, "float32"),
+	(48000, 2, "int16"),
+	(48000, 1, "int16"),
+	(44100, 2, "int16"),
+	(44100, 2, "float32"),
+	(96000, 2, "int32"),
+	(32000, 2, "int16"),
+	(22050, 1, "uint8"),
+	(16000, 1, "int16"),
+	(24000, 2, "float32"),
+]
+
+CAPTURE_FORMATS = [
+	(48000, 2, "int16"),
+	(48000, 2, "float32"),
+	(48000, 1, "int16"),
+	(44100, 2, "int16"),
+	(44100, 1, "float32"),
+	(32000, 1, "int16"),
+	(16000, 2, "int16"),
+	(16000, 1, "float32"),
+]
+
+
+def tone(rate, seconds, freq=1000.0, channels=1, fmt="int16"):
+	t = np.arange(int(rate * seconds)) / rate
+	x = np.repeat((0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)[:, None], channels, axis=1)
+	return ai_window.AudioConverter(rate, channels, "float32", rate, channels, fmt).from_float(x).tobytes()
+
+
+def snr_db(samples, rate, freq=1000.0):
+	window = samples * np.hanning(len(samples))
+	power = np.abs(np.fft.rfft(window)) ** 2
+	k = int(round(freq * len(samples) / rate))
+	signal = power[k - 3:k + 4].sum()
+	return 10 * np.log10(signal / (power.sum() - signal))
+
+
+def run(in_rate, in_channels, in_format, out_rate, out_channels, out_format, source, chunk_bytes):
+	converter = ai_window.AudioConverter(in_rate, in_channels, in_format, out_rate, out_channels, out_format)
+	times = []
+	out = []
+	for i in range(0, len(source), chunk_bytes):
+		start = time.perf_counter()
+		out.append(converter.process(source[i:i + chunk_bytes]))
+		times.append((time.perf_counter() - start) * 1000)
+	return b"".join(out), times
+
+
+def measure(in_rate, in_channels, in_format, out_rate, out_channels, out_format, seconds):
+	frame = np.dtype(ai_window.AudioConverter.DTYPES[in_format]).itemsize * in_channels
+	source = tone(in_rate, seconds, channels=in_channels, fmt=in_format)
+	chunk = (in_rate // 10 + 1) * frame # 100 ms plus one frame, so chunk boundaries drift
+	out, times = run(in_rate, in_channels, in_format, out_rate, out_channels, out_format, source, chunk)
+	samples = np.frombuffer(out, dtype=ai_window.AudioConverter.DTYPES[out_format]).reshape(-1, out_channels)[:, 0].astype(np.float64)
+	if out_format == "uint8":
+		samples -= 128
+	steady = samples[len(samples) // 4:]
+	ms = percentiles(times[1:])
+	return {
+		"ms_per_100ms": {k: round(v, 4) for k, v in ms.items()},
+		"cpu_percent_p95": round(ms["p95"], 3), # ms per 100 ms of audio == % of one core
+		"snr_db": round(float(snr_db(steady, out_rate)), 1),
+		"length_error": len(samples) - int(out_rate * seconds),
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--seconds", type=float, default=10.0, help="length of the test tone")
+	parser.add_argument("--output", help="append the JSON result to this file")
+	args = parser.parse_args()
+
+	results = {"playback": {}, "capture": {}}
+	for rate, channels, fmt in OUTPUT_FORMATS:
+		results["playback"][f"{rate}_{channels}ch_{fmt}"] = measure(24000, 1, "int16", rate, channels, fmt, args.seconds)
+	for rate, channels, fmt in CAPTURE_FORMATS:
+		results["capture"][f"{rate}_{channels}ch_{fmt}"] = measure(rate, channels, fmt, 16000, 1, "int16", args.seconds)
+	emit("resample", results, args.output)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,54 @@
+"""Per-query overhead of the warm Resolver versus spawning yt-dlp.
+
+Without --network only the fixed costs are measured: process spawn plus
+interpreter/extractor startup (`yt-dlp --version`) against a round trip
+through the Resolver queue with a fake backend. With --network the same
+keywords are also searched for real through both backends.
+"""
+import argparse
+import subprocess
+import time
+
+from _common import FakeBackend, emit, import_ai_window, percentiles
+
+ai_window = import_ai_window()
+
+
+def time_calls(fn, n):
+	samples = []
+	for i in range(n):
+		start = time.perf_counter()
+		fn(i)
+		samples.append((time.perf_counter() - start) * 1000)
+	return {"n": n, "mean_ms": sum(samples) / n, **percentiles(samples)}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("-n", type=int, default=10, help="queries per variant")
+	parser.add_argument("--network", action="store_true", help="also run real YouTube searches")
+	parser.add_argument("--output", help="append the JSON result to this file")
+	args = parser.parse_args()
+
+	results = {}
+	results["subprocess_startup"] = time_calls(lambda i: subprocess.check_output(["yt-dlp", "--version"]), args.n)
+
+	resolver = ai_window.Resolver(FakeBackend())
+	results["resolver_dispatch"] = time_calls(lambda i: resolver.search(f"keyword {i}").result(), args.n * 100)
+	resolver.shutdown()
+
+	if args.network:
+		keywords = ["rainy london 4K window view", "swiss alps 4K window view", "sapporo jazz"]
+		pick = lambda i: keywords[i % len(keywords)]
+		sub = ai_window.SubprocessBackend()
+		results["subprocess_search"] = time_calls(lambda i: sub.search(pick(i)), args.n)
+		warm = ai_window.Resolver(ai_window.YtDlpBackend())
+		warm.warm_up().result()
+		results["resolver_search"] = time_calls(lambda i: warm.search(pick(i)).result(), args.n)
+		warm.shutdown()
+
+	emit("resolver", results, args.output)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,148 @@
+"""SceneIndex: how often a scene request can skip the YouTube search.
+
+The index is built over a fixed set of favorites (titles like the ones in
+play.lst). Labelled change_scene keywords are then matched against it:
+`positives` name a favorite (in Chinese, English or a mix, usually not the
+title's own wording), `negatives` ask for scenes that no favorite has and
+must still go to YouTube. Reported at SCENE_MATCH_THRESHOLD (and a few
+other thresholds): precision, recall (= share of known scenes that skip
+the remote search), false matches, time per query and build time. The
+scaled index (--scale synthetic favorites drawn from the same scene words
+as the queries) is only timed; its matches are not labelled.
+"""
+import argparse
+import random
+import time
+
+from _common import emit, import_ai_window, percentiles
+
+ai_window = import_ai_window()
+
+FAVORITES = {
+	"alex": "Alex guitar",
+	"sapporo": "sapporo jazz",
+	"ghibli": "🍀2026靜心必聽｜60分鐘宮崎駿輕音樂🎹心事清空・煩惱暫停｜午休/咖啡/日常循環播放🌿Relaxing Music",
+	"rain": "心をひたす雨音 – A Touch of Warmth on a Rainy Morning | Peaceful Piano for Focus & Calm",
+	"balcony": "[Playlist] balcony9 | 두 계절 사이의 고요한 시간  – Quiet Vocal Jazz #balcony9 #jazzplaylist #quietvocaljazz",
+	"living": "Morning Balmy Jazz Ambience To Stress Relief | Warm Living Room Jazz Music For Work, Relax & Focus",
+	"cafe": "Home Café Jazz ☕ Happy & Relax｜おうちカフェでくつろぐ、やさしいジャズ時間",
+	"andalusia": "Strings Of Andalusia / Spanish Guitar Music Fest #guitar",
+	"tears": "Tears In Heaven",
+	"lake": "Lake Louise Canada Sunrise Walk 4K",
+	"kyoto": "京都 嵐山 竹林 雪景 散步",
+	"venice": "Venice Italy Canal Boat Ride at Sunset",
+}
+
+POSITIVES = [
+	("札幌爵士", "sapporo"), ("sapporo", "sapporo"), ("札幌", "sapporo"),
+	("宮崎駿", "ghibli"), ("宮崎駿 輕音樂", "ghibli"), ("ghibli relaxing", "ghibli"),
+	("雨天鋼琴", "rain"), ("rainy piano", "rain"), ("下雨的早晨", "rain"),
+	("人聲爵士", "balcony"), ("quiet vocal jazz", "balcony"), ("balcony", "balcony"),
+	("客廳爵士", "living"), ("living room jazz", "living"),
+	("咖啡廳爵士", "cafe"), ("home cafe jazz", "cafe"),
+	("西班牙吉他", "andalusia"), ("spanish guitar", "andalusia"), ("andalusia", "andalusia"),
+	("tears in heaven", "tears"), ("alex guitar", "alex"),
+	("lake louise", "lake"), ("露易絲湖 日出", "lake"), ("canada lake sunrise", "lake"),
+	("京都雪景", "kyoto"), ("嵐山竹林", "kyoto"), ("kyoto snow", "kyoto"),
+	("威尼斯", "venice"), ("venice canal", "venice"), ("威尼斯 日落", "venice"),
+]
+
+NEGATIVES = [
+	"瑞士阿爾卑斯", "tokyo night", "東京夜景", "倫敦下雨", "rainy london", "巴黎咖啡廳",
+	"海邊", "森林", "iceland waterfall", "紐約 雪", "hawaii beach", "沙漠 星空",
+	"首爾 街道", "香港夜景", "台北 101", "new york city walk", "北海道 雪", "大阪 夜",
+	"jazzy", "小提琴", "古典音樂", "moscow metro", "夏威夷 日落", "冰島 極光",
+]
+
+SYNTHETIC_WORDS = ("rain snow night morning sunset city street beach forest lake river mountain cafe jazz piano guitar "
+	"relax focus calm warm quiet walk drive train window view tokyo kyoto paris london seoul taipei").split()
+SYNTHETIC_CJK = "雨 雪 夜景 早晨 日落 城市 街道 海邊 森林 湖 河 山 咖啡廳 爵士 鋼琴 吉他 放鬆 專注 安靜 散步 車窗 東京 巴黎 倫敦".split()
+
+
+def build(favorites):
+	index = ai_window.SceneIndex()
+	start = time.perf_counter()
+	index.build([(f"https://www.youtube.com/watch?v={key}", [title]) for key, title in favorites.items()])
+	return index, (time.perf_counter() - start) * 1000
+
+
+def synthetic(count, seed=3):
+	rng = random.Random(seed)
+	favorites = dict(FAVORITES)
+	for i in range(count - len(favorites)):
+		words = rng.sample(SYNTHETIC_WORDS, 5) + rng.sample(SYNTHETIC_CJK, 2)
+		favorites[f"syn{i}"] = " ".join(words) + f" vol.{i}"
+	return favorites
+
+
+def key_of(url):
+	return url.rsplit("=", 1)[1] if url else None
+
+
+def evaluate(index, threshold):
+	correct = wrong = missed = false = 0
+	for query, expected in POSITIVES:
+		found = index.search(query, 1)
+		if found and found[0][1] >= threshold:
+			if key_of(found[0][0]) == expected:
+				correct += 1
+			else:
+				wrong += 1
+		else:
+			missed += 1
+	for query in NEGATIVES:
+		found = index.search(query, 1)
+		if found and found[0][1] >= threshold:
+			false += 1
+	matched = correct + wrong + false
+	return {
+		"threshold": threshold,
+		"precision": round(correct / matched, 3) if matched else None,
+		"recall": round(correct / len(POSITIVES), 3),
+		"wrong_favorite": wrong,
+		"missed": missed,
+		"false_matches": false,
+	}
+
+
+def time_queries(index, rounds):
+	queries = [q for q, _ in POSITIVES] + NEGATIVES
+	times = []
+	for _ in range(rounds):
+		for query in queries:
+			start = time.perf_counter()
+			index.match(query)
+			times.append((time.perf_counter() - start) * 1e6)
+	return {k: round(v, 1) for k, v in percentiles(times, (50, 95)).items()}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--rounds", type=int, default=200, help="timing passes over all queries")
+	parser.add_argument("--scale", type=int, default=2000, help="favorites in the scaled-up index")
+	parser.add_argument("--output", help="append the JSON result to this file")
+	args = parser.parse_args()
+
+	index, build_ms = build(FAVORITES)
+	large, large_build_ms = build(synthetic(args.scale))
+	thresholds = sorted({0.4, 0.5, ai_window.SCENE_MATCH_THRESHOLD, 0.7, 0.8})
+	results = {
+		"favorites": len(FAVORITES),
+		"positives": len(POSITIVES),
+		"negatives": len(NEGATIVES),
+		"at_threshold": evaluate(index, ai_window.SCENE_MATCH_THRESHOLD),
+		"sweep": [evaluate(index, t) for t in thresholds],
+		"build_ms": round(build_ms, 2),
+		"query_us": time_queries(index, args.rounds),
+		"scaled": {
+			"favorites": args.scale,
+			"terms": len(large.idf),
+			"build_ms": round(large_build_ms, 1),
+			"query_us": time_queries(large, max(1, args.rounds // 10)),
+		},
+	}
+	emit("scene_index", results, args.output)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,123 @@
+"""Cold-start cost: module import time and time to the first painted window.
+
+Each run starts a fresh interpreter. `import` times `import ai_window`
+alone; `window` launches the app with AIWINDOW_STARTUP_PROBE=1, which
+prints a line when the bubble is first painted and when the audio
+devices are ready, then closes itself. Times are taken by this script
+when each line arrives, so interpreter start-up is included. The
+`deferred` entry shows what the modules loaded after the first paint
+(google.genai, PyQt6.QtMultimedia) cost on their own.
+
+The window runs from a copy of ai_window.py and play.lst in a temporary
+directory, so the search, stream and media caches it writes (and any
+players.json) never touch the real app directory. It gets a placeholder
+key and a proxy on a closed local port, so the warm Live connection and
+the yt-dlp pre-resolves fail at once without leaving the machine. mpv is
+benchmarks/fake_mpv.py on a private socket, never the real player or the
+one already on /tmp/mpvsocket. The command server still binds the usual
+ports 9997/9998 while the app is up. Use --platform to render on a real
+display (e.g. xcb or eglfs on the kiosk) instead of offscreen.
+"""
+import argparse
+import os
+import py_compile
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import ROOT, emit, percentiles
+
+IMPORT_SNIPPETS = {
+	"ai_window": "import ai_window",
+	"google.genai": "from google import genai; genai.Client(api_key='offline-benchmark', http_options={'api_version': 'v1beta'})",
+	"PyQt6.QtMultimedia": "import PyQt6.QtMultimedia",
+}
+
+
+OFFLINE_PROXY = "http://127.0.0.1:9" # discard port: connections are refused immediately
+
+
+def environment(platform):
+	env = dict(os.environ)
+	env["GEMINI_API_KEY"] = "offline-benchmark"
+	env["QT_QPA_PLATFORM"] = platform
+	for name in ("http_proxy", "https_proxy", "all_proxy"):
+		env[name] = env[name.upper()] = OFFLINE_PROXY
+	env.pop("no_proxy", None)
+	env.pop("NO_PROXY", None)
+	return env
+
+
+def sandbox(workdir, env):
+	"""Copy the app into workdir and point its mpv and media cache there."""
+	for name in ("ai_window.py", "play.lst"):
+		if os.path.exists(os.path.join(ROOT, name)):
+			shutil.copy(os.path.join(ROOT, name), workdir)
+	py_compile.compile(os.path.join(workdir, "ai_window.py")) # the first run should not pay for compiling the copy
+	sock = os.path.join(workdir, "mpvsocket")
+	fake_mpv = os.path.join(ROOT, "benchmarks", "fake_mpv.py")
+	return dict(env,
+		AIWINDOW_MPV_SOCKET=sock,
+		AIWINDOW_MPV_COMMAND=shlex.join([sys.executable, fake_mpv, "--socket", sock]),
+		AIWINDOW_MEDIA_CACHE=os.path.join(workdir, "media_cache"),
+	)
+
+
+def time_import(snippet, env):
+	code = f"import time; t = time.perf_counter(); {snippet}; print(time.perf_counter() - t)"
+	out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+	return float(out.stdout.strip().splitlines()[-1]) * 1000
+
+
+def time_window(env, workdir, timeout=60):
+	env = dict(env, AIWINDOW_STARTUP_PROBE="1")
+	start = time.perf_counter()
+	proc = subprocess.Popen([sys.executable, os.path.join(workdir, "ai_window.py")], cwd=workdir, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+	marks = {}
+	try:
+		for line in proc.stdout:
+			if line.startswith("STARTUP: window painted"):
+				marks["window"] = (time.perf_counter() - start) * 1000
+			elif line.startswith("STARTUP: audio ready"):
+				marks["audio"] = (time.perf_counter() - start) * 1000
+		proc.wait(timeout)
+	finally:
+		if proc.poll() is None:
+			proc.kill()
+	marks["exit"] = (time.perf_counter() - start) * 1000
+	return marks
+
+
+def summary(samples):
+	samples = [s for s in samples if s is not None]
+	if not samples:
+		return None
+	return {"mean_ms": round(sum(samples) / len(samples), 1), **{k: round(v, 1) for k, v in percentiles(samples, (50, 95)).items()}}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("-n", type=int, default=5, help="runs per measurement")
+	parser.add_argument("--platform", default="offscreen", help="QT_QPA_PLATFORM for the window runs")
+	parser.add_argument("--output", help="append the JSON result to this file")
+	args = parser.parse_args()
+
+	env = environment(args.platform)
+	results = {"import": {}, "deferred": {}}
+	for name, snippet in IMPORT_SNIPPETS.items():
+		samples = [time_import(snippet, env) for _ in range(args.n)]
+		results["import" if name == "ai_window" else "deferred"][name] = summary(samples)
+	with tempfile.TemporaryDirectory(prefix="aiwindow-startup-") as workdir:
+		app_env = sandbox(workdir, env)
+		runs = [time_window(app_env, workdir) for _ in range(args.n)]
+	results["time_to_window"] = summary([r.get("window") for r in runs])
+	results["time_to_audio_ready"] = summary([r.get("audio") for r in runs])
+	results["time_to_exit"] = summary([r["exit"] for r in runs])
+	emit("startup", results, args.output)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,159 @@
+"""Transcript rendering cost with streaming transcription chunks.
+
+Chunks arrive every --interval ms (alternating user / assistant turns)
+for --seconds, with the GUI on Qt's offscreen platform. Variants:
+
+	label        the whole transcript re-set as rich text on a QLabel per
+	             chunk (how status text is rendered)
+	per_chunk    TranscriptView flushed after every chunk
+	coalesced    TranscriptView as used by the app (TRANSCRIPT_FPS flushes)
+
+Reported per variant: GUI CPU time, paint events, event-loop lateness of
+the chunk timer (how long other work waited) and the final document size.
+A separate long run feeds many turns to show that history stays capped.
+"""
+import argparse
+import time
+
+from _common import emit, import_ai_window, percentiles
+
+ai_window = import_ai_window()
+
+from PyQt6.QtCore import QEvent, QObject, Qt, QTimer
+from PyQt6.QtWidgets import QApplication, QLabel, QScrollArea
+
+WORDS = "倫敦 今天 下雨 ， 氣溫 大約 十二 度 ， 要不要 看看 泰晤士河 的 雨景 ？".split()
+
+
+class PaintCounter(QObject):
+	def __init__(self):
+		super().__init__()
+		self.paints = 0
+
+	def eventFilter(self, obj, event):
+		if event.type() == QEvent.Type.Paint:
+			self.paints += 1
+		return False
+
+
+def chunk(i, turn_chunks=40):
+	"""(role, text) of the i-th streaming chunk."""
+	role = "user" if (i // turn_chunks) % 2 == 0 else "assistant"
+	return role, WORDS[i % len(WORDS)]
+
+
+class LabelTranscript:
+	def __init__(self):
+		self.scroll = QScrollArea()
+		self.scroll.setWidgetResizable(True)
+		self.widget = QLabel()
+		self.widget.setTextFormat(Qt.TextFormat.RichText)
+		self.widget.setWordWrap(True)
+		self.scroll.setWidget(self.widget)
+		self.scroll.resize(450, 300)
+		self.lines = []
+		self.role = None
+
+	def show(self):
+		self.scroll.show()
+
+	def paint_target(self):
+		return self.widget
+
+	def add(self, role, text):
+		if role != self.role:
+			self.lines.append(f"<b>{'你' if role == 'user' else '助理'}：</b>")
+			self.role = role
+		self.lines[-1] += text
+		self.widget.setText("<br>".join(self.lines))
+
+	def size(self):
+		return {"chars": len("<br>".join(self.lines)), "blocks": len(self.lines)}
+
+
+class ViewTranscript:
+	def __init__(self, flush_each):
+		self.widget = ai_window.TranscriptView()
+		self.widget.resize(450, 300)
+		self.flush_each = flush_each
+
+	def show(self):
+		self.widget.show()
+
+	def paint_target(self):
+		return self.widget.viewport()
+
+	def add(self, role, text):
+		self.widget.append_chunk(role, text)
+		if self.flush_each:
+			self.widget.flush()
+
+	def size(self):
+		return {"chars": self.widget.document().characterCount(), "blocks": self.widget.document().blockCount()}
+
+
+def run(app, transcript, seconds, interval_ms):
+	counter = PaintCounter()
+	transcript.paint_target().installEventFilter(counter)
+	transcript.show()
+	app.processEvents()
+	counter.paints = 0
+	ticks = []
+	count = int(seconds * 1000 / interval_ms)
+	timer = QTimer()
+	timer.setTimerType(Qt.TimerType.PreciseTimer)
+
+	def tick():
+		ticks.append(time.perf_counter())
+		role, text = chunk(len(ticks) - 1)
+		transcript.add(role, text)
+		if len(ticks) == count:
+			timer.stop()
+			QTimer.singleShot(100, app.quit)
+
+	timer.timeout.connect(tick)
+	cpu = time.process_time()
+	timer.start(interval_ms)
+	app.exec()
+	cpu = time.process_time() - cpu
+	lateness = [max(0.0, (b - a) * 1000 - interval_ms) for a, b in zip(ticks, ticks[1:])]
+	return {
+		"chunks": count,
+		"gui_cpu_ms": round(cpu * 1000),
+		"paints": counter.paints,
+		"tick_lateness_ms": {k: round(v, 2) for k, v in percentiles(lateness).items()},
+		**transcript.size(),
+	}
+
+
+def long_run(app, turns):
+	view = ai_window.TranscriptView()
+	for i in range(turns * 40):
+		view.append_chunk(*chunk(i))
+		if i % 200 == 199:
+			view.flush()
+	view.flush()
+	doc = view.document()
+	return {"chunks": turns * 40, "blocks": doc.blockCount(), "chars": doc.characterCount(), "max_blocks": ai_window.TRANSCRIPT_MAX_BLOCKS}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--seconds", type=float, default=5.0)
+	parser.add_argument("--interval", type=int, default=5, help="milliseconds between chunks")
+	parser.add_argument("--turns", type=int, default=5000, help="turns in the long run")
+	parser.add_argument("--output", help="append the JSON result to this file")
+	args = parser.parse_args()
+
+	app = QApplication.instance() or QApplication([])
+	results = {
+		"label": run(app, LabelTranscript(), args.seconds, args.interval),
+		"per_chunk": run(app, ViewTranscript(flush_each=True), args.seconds, args.interval),
+		"coalesced": run(app, ViewTranscript(flush_each=False), args.seconds, args.interval),
+		"long_run": long_run(app, args.turns),
+	}
+	emit("transcript", results, args.output)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,143 @@
+"""A scripted stand-in for the Gemini Live API.
+
+FakeLiveClient replaces `client` in LiveSession (`session.client = ...`)
+and exposes the same `aio.live.connect(model=, config=)` async context
+manager. Every user turn (the system instruction or the greeting sent on
+activate) starts the schedule: a list of (delay_seconds, kind, value)
+events, where kind is one of
+
+	"audio"   value = milliseconds of 24 kHz PCM to send as one chunk
+	"input"   value = input transcription text
+	"output"  value = output transcription text
+	"tool"    value = (function name, args dict)
+	"interrupted"  the user barged in; the server drops the rest of the turn
+	"turn_complete"
+
+Messages are real google.genai types, so they go through the same
+receiver code as production traffic. Upstream audio and tool responses
+are recorded with timestamps for the benchmarks to inspect.
+"""
+import asyncio
+import json
+import time
+import types as pytypes
+
+from google.genai import types
+
+DEFAULT_SCHEDULE = [
+	(0.30, "output", "你好, 甚麼事呢?"),
+	*[(0.04, "audio", 40) for _ in range(25)],
+	(0.0, "turn_complete", None),
+]
+
+SCENE_SCHEDULE = [
+	(0.20, "input", "我想看倫敦的雨天"),
+	(0.30, "tool", ("change_scene", {"keyword": "London rain"})),
+	(0.10, "output", "好的，正在為您切換到倫敦雨天。"),
+	*[(0.04, "audio", 40) for _ in range(10)],
+	(0.0, "turn_complete", None),
+]
+
+# The model answers in a fast burst (3 s of speech in ~0.6 s), then the user talks over it
+BARGE_IN_SCHEDULE = [
+	(0.10, "output", "倫敦今天下雨，氣溫大約十二度，"),
+	*[(0.008, "audio", 40) for _ in range(75)],
+	(0.50, "interrupted", None),
+	(0.0, "turn_complete", None),
+]
+
+
+def load_schedule(path):
+	"""Read a schedule from a JSON list of [delay, kind, value] entries."""
+	with open(path, encoding="utf-8") as f:
+		return [tuple(event) for event in json.load(f)]
+
+
+def message(kind, value):
+	if kind == "audio":
+		pcm = bytes(int(24000 * value / 1000) * 2)
+		part = types.Part(inline_data=types.Blob(data=pcm, mime_type="audio/pcm;rate=24000"))
+		return types.LiveServerMessage(server_content=types.LiveServerContent(model_turn=types.Content(role="model", parts=[part])))
+	if kind == "input":
+		return types.LiveServerMessage(server_content=types.LiveServerContent(input_transcription=types.Transcription(text=value)))
+	if kind == "output":
+		return types.LiveServerMessage(server_content=types.LiveServerContent(output_transcription=types.Transcription(text=value)))
+	if kind == "tool":
+		name, args = value
+		call = types.FunctionCall(name=name, args=args, id=f"call-{time.monotonic_ns()}")
+		return types.LiveServerMessage(tool_call=types.LiveServerToolCall(function_calls=[call]))
+	if kind == "interrupted":
+		return types.LiveServerMessage(server_content=types.LiveServerContent(interrupted=True))
+	if kind == "turn_complete":
+		return types.LiveServerMessage(server_content=types.LiveServerContent(turn_complete=True))
+	raise ValueError(f"unknown event kind {kind}")
+
+
+class FakeLiveSession:
+	def __init__(self, client):
+		self.client = client
+		self.outbox = asyncio.Queue()
+		self.tasks = []
+
+	async def send_client_content(self, turns=None, turn_complete=True):
+		self.client.turns.append((time.monotonic(), turns))
+		self.tasks.append(asyncio.ensure_future(self.play(self.client.schedule)))
+
+	async def send_realtime_input(self, audio=None, **kwargs):
+		if audio is not None:
+			self.client.upstream.append((time.monotonic(), len(audio["data"])))
+		else:
+			self.client.upstream_events.append((time.monotonic(), kwargs))
+
+	async def send_tool_response(self, response):
+		self.client.tool_responses.append((time.monotonic(), response))
+
+	async def play(self, schedule):
+		for delay, kind, value in schedule:
+			if delay:
+				await asyncio.sleep(delay)
+			self.client.sent.append((time.monotonic(), kind))
+			self.outbox.put_nowait(message(kind, value))
+
+	async def receive(self):
+		# Like the real API: one iteration per model turn
+		while True:
+			msg = await self.outbox.get()
+			yield msg
+			if msg.server_content and msg.server_content.turn_complete:
+				return
+
+
+class _Connection:
+	def __init__(self, client, config):
+		self.client = client
+		self.config = config
+		self.session = None
+
+	async def __aenter__(self):
+		if self.client.connect_delay:
+			await asyncio.sleep(self.client.connect_delay)
+		self.client.connects.append((time.monotonic(), self.config.get("session_resumption")))
+		self.session = FakeLiveSession(self.client)
+		return self.session
+
+	async def __aexit__(self, *exc):
+		for task in self.session.tasks:
+			task.cancel()
+		return False
+
+
+class FakeLiveClient:
+	def __init__(self, schedule=DEFAULT_SCHEDULE, connect_delay=0.0):
+		self.schedule = schedule
+		self.connect_delay = connect_delay
+		self.connects = []
+		self.turns = []
+		self.sent = []
+		self.upstream = []
+		self.upstream_events = []
+		self.tool_responses = []
+		self.aio = pytypes.SimpleNamespace(live=pytypes.SimpleNamespace(connect=self.connect))
+
+	def connect(self, model=None, config=None):
+		return _Connection(self, config or {})
@@ -0,0 +1,168 @@
+"""A stand-in for mpv's JSON IPC server on a UNIX socket.
+
+Speaks enough of the protocol for AIWindow: request_id replies,
+get_property/set_property, observe_property (property-change events),
+loadfile (file-loaded and playback-restart after a configurable delay),
+change-list and stop. Every command is counted so a benchmark can check
+that nothing was lost.
+
+Run standalone to point the real app at it:
+
+	python benchmarks/fake_mpv.py --socket /tmp/mpvsocket
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+
+class FakeMPV:
+	def __init__(self, path, load_delay=0.0, reply_delay=0.0):
+		self.path = path
+		self.load_delay = load_delay
+		self.reply_delay = reply_delay
+		self.properties = {"path": None, "media-title": None, "volume": 100, "pause": False, "idle-active": True, "force-media-title": "", "mpv-version": "mpv 0.0.0-fake"}
+		self.observers = {} # property -> observer ids
+		self.commands = 0
+		self.lock = threading.Lock()
+		self.clients = []
+		self.running = False
+		self.server = None
+
+	def start(self):
+		if os.path.exists(self.path):
+			os.unlink(self.path)
+		self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.server.bind(self.path)
+		self.server.listen(16)
+		self.running = True
+		threading.Thread(target=self._accept_loop, daemon=True).start()
+		return self
+
+	def stop(self):
+		self.running = False
+		try:
+			self.server.shutdown(socket.SHUT_RDWR)
+		except OSError:
+			pass
+		self.server.close()
+		with self.lock:
+			clients, self.clients = self.clients, []
+		for conn in clients:
+			try:
+				conn.shutdown(socket.SHUT_RDWR)
+			except OSError:
+				pass
+			conn.close()
+		if os.path.exists(self.path):
+			os.unlink(self.path)
+
+	def _accept_loop(self):
+		while self.running:
+			try:
+				conn, _ = self.server.accept()
+			except OSError:
+				break
+			with self.lock:
+				self.clients.append(conn)
+			threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+	def _send(self, conn, msg):
+		try:
+			conn.sendall(json.dumps(msg).encode("utf-8") + b"\n")
+		except OSError:
+			pass
+
+	def _broadcast(self, msg):
+		with self.lock:
+			clients = list(self.clients)
+		for conn in clients:
+			self._send(conn, msg)
+
+	def _set(self, name, value):
+		self.properties[name] = value
+		for observer in self.observers.get(name, ()):
+			self._broadcast({"event": "property-change", "id": observer, "name": name, "data": value})
+
+	def _serve(self, conn):
+		buf = b""
+		while self.running:
+			try:
+				data = conn.recv(65536)
+			except OSError:
+				break
+			if not data:
+				break
+			buf += data
+			*lines, buf = buf.split(b"\n")
+			replies = []
+			for line in lines:
+				if line.strip():
+					replies.append(self._handle(conn, json.loads(line)))
+			if self.reply_delay:
+				time.sleep(self.reply_delay)
+			if replies:
+				try:
+					conn.sendall(b"".join(json.dumps(r).encode("utf-8") + b"\n" for r in replies))
+				except OSError:
+					break
+		with self.lock:
+			if conn in self.clients:
+				self.clients.remove(conn)
+		conn.close()
+
+	def _handle(self, conn, msg):
+		cmd = msg.get("command") or []
+		reply = {"error": "success", "data": None}
+		with self.lock:
+			self.commands += 1
+		name = cmd[0] if cmd else None
+		if name == "get_property":
+			if cmd[1] in self.properties:
+				reply["data"] = self.properties[cmd[1]]
+			else:
+				reply["error"] = "property unavailable"
+		elif name == "set_property":
+			self._set(cmd[1], cmd[2])
+		elif name == "observe_property":
+			self.observers.setdefault(cmd[2], []).append(cmd[1])
+			self._send(conn, {"event": "property-change", "id": cmd[1], "name": cmd[2], "data": self.properties.get(cmd[2])})
+		elif name == "loadfile":
+			threading.Timer(self.load_delay, self._loaded, args=(cmd[1],)).start()
+		elif name == "stop":
+			self._set("path", None)
+			self._set("idle-active", True)
+		elif name not in ("change-list", "show-text", "cycle", "add"):
+			reply["error"] = "invalid parameter"
+		if "request_id" in msg:
+			reply["request_id"] = msg["request_id"]
+		return reply
+
+	def _loaded(self, path):
+		self._set("path", path)
+		self._set("media-title", self.properties["force-media-title"] or path)
+		self._set("idle-active", False)
+		self._broadcast({"event": "file-loaded"})
+		self._broadcast({"event": "playback-restart"})
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--socket", default="/tmp/mpvsocket")
+	parser.add_argument("--load-delay", type=float, default=0.5, help="seconds from loadfile to the first frame")
+	args = parser.parse_args()
+	mpv = FakeMPV(args.socket, load_delay=args.load_delay).start()
+	print(f"fake mpv listening on {args.socket}", file=sys.stderr)
+	try:
+		while True:
+			time.sleep(1)
+	except KeyboardInterrupt:
+		pass
+	mpv.stop()
+
+
+if __name__ == "__main__":
+	main()
@@ -13,20 +13,10 @@ export PATH=/home/weafon/.espressif/python_env/idf5.5_py3.12_env/bin/:$PATH
 export MPV_YTDL_EXE="yt-dlp"
 source ~/.my.env
 cd ~/aiwindow
-# 1. 清理舊的 Socket
-rm -f /tmp/mpvsocket
-# 2. 啟動 mpv 並開啟 IPC 功能 (背景執行)
-echo "啟動窗景播放器 (idle mode)..."
-# 啟動 mpv 空閒模式，之後由 ai_window.py 隨機選取並下達 loadfile 指令
-mpv --idle --fs --input-ipc-server=/tmp/mpvsocket &
-MPV_PID=$!
-echo "MPV PID: $MPV_PID"
+# mpv (idle mode) 由 ai_window.py 自行啟動、監看並在當機時重啟，結束時一併關閉
+# 要改 mpv 參數請設定 AIWINDOW_MPV_COMMAND
 
-# 3. 啟動 AI UI
+# 啟動 AI UI
 echo "啟動 AI UI..."
 python3 ai_window.py
-
-# 4. 當 UI 結束時，清理後台進程
-echo "UI finished. Killing MPV PID: $MPV_PID"
-kill $MPV_PID
-echo "Kill command sent."
+echo "UI finished."